@@ -7,6 +7,15 @@ import traceback
 
 # Import routes
 from routes.chat_routes import chat_bp
+from routes.admin_routes import admin_bp
+from services.embedding_index import get_embedding_index
+from services.llm_client import get_llm_client
+from services.llm_dispatcher import get_llm_dispatcher
+from services.llm_extractor import get_llm_extractor
+from services.llm_triage import get_llm_triage
+from services.rule_cache import get_rule_cache
+from utils.deadline import deadline_stats
+from utils.text_normalizer import normalize_text
 
 # Khởi tạo Flask app
 app = Flask(__name__)
@@ -16,6 +25,7 @@ CORS(app, origins=config.CORS_ORIGINS)
 
 # Register blueprints with /api/v1 prefix
 app.register_blueprint(chat_bp, url_prefix='/api/v1')
+app.register_blueprint(admin_bp, url_prefix='/api/v1')
 
 # Root route - để test xem server có chạy không
 @app.route('/', methods=['GET'])
@@ -28,6 +38,7 @@ def index():
         'version': '1.0',
         'endpoints': {
             'health': '/api/health',
+            'llm_health': '/api/llm/health',
             'test_ollama': '/api/test-ollama'
         }
     })
@@ -40,7 +51,8 @@ def health_check():
     """
     return jsonify({
         'status': 'ok',
-        'message': 'Chatbot Triage API is running'
+        'message': 'Chatbot Triage API is running',
+        'deadline': deadline_stats()
     })
 
 # Test Ollama endpoint
@@ -50,26 +62,24 @@ def test_ollama():
     Endpoint để test xem Ollama có connect được không
     """
     try:
-        import ollama
-        
+        llm_client = get_llm_client()
+
         print("🤖 Testing Ollama connection...")
-        print(f"📦 Using model: {config.OLLAMA_MODEL}")
-        
-        # Test simple generation
-        response = ollama.chat(
-            model=config.OLLAMA_MODEL,
-            messages=[
-                {'role': 'user', 'content': 'Xin chào, trả lời ngắn gọn bằng tiếng Việt.'}
-            ]
-        )
-        
+        print(f"📦 Using model: {llm_client.model}")
+
+        # Test simple generation (dùng lại pool keep-alive của client dùng chung)
+        content = llm_client.chat([
+            {'role': 'user', 'content': 'Xin chào, trả lời ngắn gọn bằng tiếng Việt.'}
+        ])
+
         print("✅ Ollama test successful!")
-        
+
         return jsonify({
             'status': 'ok',
             'message': 'Ollama is working',
-            'model': config.OLLAMA_MODEL,
-            'test_response': response['message']['content']
+            'model': llm_client.model,
+            'test_response': content,
+            'latency_ms': llm_client.stats()['last_ms']
         })
     
     except Exception as e:
@@ -82,6 +92,21 @@ def test_ollama():
             'message': f'Ollama connection failed: {str(e)}'
         }), 500
 
+# LLM health endpoint
+@app.route('/api/llm/health', methods=['GET'])
+def llm_health():
+    """
+    Endpoint để check Ollama và model có đang nằm trong memory không,
+    kèm thống kê latency của LLM client
+    """
+    health = get_llm_client().health()
+    health['dispatcher'] = get_llm_dispatcher().stats()
+    llm_triage = get_llm_triage()
+    health['triage'] = llm_triage.stats() if llm_triage else None
+    llm_extractor = get_llm_extractor()
+    health['extraction'] = llm_extractor.stats() if llm_extractor else None
+    return jsonify(health), 200 if health['status'] == 'ok' else 503
+
 # Error handler cho 404
 @app.errorhandler(404)
 def not_found(error):
@@ -107,12 +132,24 @@ if __name__ == '__main__':
     print("\n📋 Available Endpoints:")
     print(f"  GET  /                    - API Info")
     print(f"  GET  /api/health          - Health Check")
+    print(f"  GET  /api/llm/health      - Ollama / Model Health")
     print(f"  GET  /api/test-ollama     - Test Ollama Connection")
     print(f"  POST /api/v1/chat         - Send chat message")
+    print(f"  POST /api/v1/chat/stream  - Send chat message (SSE stream)")
     print(f"  GET  /api/v1/chat/history - Get chat history")
     print(f"  POST /api/v1/chat/reset   - Reset chat session")
+    print(f"  POST /api/v1/admin/rules/import  - Bulk import rules (X-Admin-Token)")
+    print(f"  GET  /api/v1/admin/rules/version - Rule version (X-Admin-Token)")
     print("=" * 60)
+    print("\n💡 Async mode: uvicorn asgi:app --host 0.0.0.0 --port 5000")
     print("\n✨ Server is ready! Press CTRL+C to quit\n")
+
+    # Nạp sẵn model và embedding index (không chặn startup)
+    if config.OLLAMA_PRELOAD:
+        get_llm_client().preload(background=True)
+    embedding_index = get_embedding_index()
+    if embedding_index is not None:
+        embedding_index.preload(get_rule_cache(normalize_text), background=True)
     
     app.run(
         host=config.FLASK_HOST,
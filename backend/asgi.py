@@ -0,0 +1,103 @@
+# backend/asgi.py - Async (ASGI) entry point
+# Production: uvicorn asgi:app --host 0.0.0.0 --port 5000
+# Mot process phuc vu nhieu request (LLM await tren event loop); gioi han slot
+# LLM va connection pool la theo process, nen them worker se nhan cac gioi han do.
+from quart import Quart, jsonify
+from quart_cors import cors
+import config
+
+from routes.async_chat_routes import async_chat_bp
+from routes.async_admin_routes import async_admin_bp
+from services.db_executor import get_db_executor, run_blocking, shutdown_db_executor
+from services.embedding_index import get_embedding_index
+from services.llm_client import get_llm_client
+from services.llm_dispatcher import get_llm_dispatcher
+from services.llm_extractor import get_llm_extractor
+from services.llm_triage import get_llm_triage
+from services.rule_cache import get_rule_cache
+from utils.deadline import deadline_stats
+from utils.text_normalizer import normalize_text
+
+# Khởi tạo Quart app (API giống Flask, chạy trên event loop)
+app = Quart(__name__)
+
+# Enable CORS
+app = cors(app, allow_origin=config.CORS_ORIGINS)
+
+# Register blueprints with /api/v1 prefix
+app.register_blueprint(async_chat_bp, url_prefix='/api/v1')
+app.register_blueprint(async_admin_bp, url_prefix='/api/v1')
+
+
+@app.before_serving
+async def startup():
+    """Khởi tạo DB executor, nạp rule, model và embedding index trước khi nhận request"""
+    get_db_executor()
+    await run_blocking(get_rule_cache(normalize_text).get_snapshot)
+    if config.OLLAMA_PRELOAD:
+        get_llm_client().preload(background=True)
+    embedding_index = get_embedding_index()
+    if embedding_index is not None:
+        embedding_index.preload(get_rule_cache(normalize_text), background=True)
+
+
+@app.after_serving
+async def shutdown():
+    """Chờ các thao tác DB đang chạy rồi dừng executor, đóng client Ollama"""
+    shutdown_db_executor()
+    await get_llm_client().aclose()
+    get_llm_client().close()
+
+
+# Health check endpoint
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """
+    Endpoint để check xem server có đang chạy không
+    """
+    return jsonify({
+        'status': 'ok',
+        'message': 'Chatbot Triage API is running (async)',
+        'deadline': deadline_stats()
+    })
+
+
+# LLM health endpoint
+@app.route('/api/llm/health', methods=['GET'])
+async def llm_health():
+    """
+    Endpoint để check Ollama và model có đang nằm trong memory không
+    """
+    health = await get_llm_client().ahealth()
+    health['dispatcher'] = get_llm_dispatcher().stats()
+    llm_triage = get_llm_triage()
+    health['triage'] = llm_triage.stats() if llm_triage else None
+    llm_extractor = get_llm_extractor()
+    health['extraction'] = llm_extractor.stats() if llm_extractor else None
+    return jsonify(health), 200 if health['status'] == 'ok' else 503
+
+
+# Error handler cho 404
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({
+        'error': 'Endpoint không tồn tại',
+        'message': 'Vui lòng kiểm tra lại URL'
+    }), 404
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("=" * 60)
+    print("🚀 Async server (ASGI) đang chạy")
+    print(f"📍 Truy cập tại: http://{config.FLASK_HOST}:{config.FLASK_PORT}")
+    print(f"🧵 DB workers: {config.ASYNC_DB_WORKERS}")
+    print("=" * 60)
+
+    uvicorn.run(
+        'asgi:app',
+        host=config.FLASK_HOST,
+        port=config.FLASK_PORT,
+        workers=config.ASGI_WORKERS
+    )
@@ -0,0 +1,82 @@
+# bench_embedding_index.py - Benchmark for the embedding index
+# Builds an index over a synthetic rule set (hashing embedder, no Ollama),
+# then measures a cold build, a memory-mapped reload from disk and top-k
+# department lookups.
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import time
+import timeit
+from types import SimpleNamespace
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.embedding_index import EmbeddingIndex, HashingEmbedder
+
+
+WORDS = ['dau', 'sot', 'ho', 'hong', 'bung', 'nguc', 'dau dau', 'chong mat', 'buon non',
+         'kho tho', 'ngua', 'phat ban', 'tieu chay', 'te tay', 'mo mat', 'u tai', 'met moi']
+
+
+def make_snapshot(departments=40, rules_per_department=25, keywords_per_rule=6, seed=7):
+    """Stands in for RuleSnapshot: only version and scoring_rules are used"""
+    rng = random.Random(seed)
+    scoring_rules = []
+    for dept_id in range(1, departments + 1):
+        for _ in range(rules_per_department):
+            keywords = [' '.join(rng.sample(WORDS, 2)) for _ in range(keywords_per_rule)]
+            scoring_rules.append({
+                'department_id': dept_id,
+                'keywords': [(kw, kw) for kw in keywords],
+                'description': f'Nhom trieu chung {dept_id} - {rng.choice(WORDS)}'
+            })
+    return SimpleNamespace(version=1, scoring_rules=scoring_rules)
+
+
+def run_benchmark(number=2000):
+    snapshot = make_snapshot()
+    index_dir = tempfile.mkdtemp(prefix='embedding_index_')
+    try:
+        started = time.perf_counter()
+        index = EmbeddingIndex(HashingEmbedder(), index_dir)
+        index.ensure(snapshot)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        reloaded = EmbeddingIndex(HashingEmbedder(), index_dir)
+        reloaded.ensure(snapshot)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        matrix = reloaded._data[0]
+        print(f"{matrix.shape[0]} vectors x {matrix.shape[1]} dims, "
+              f"{len(reloaded._data[1])} departments")
+        print("-" * 60)
+        print(f"{'cold build + save':28} {build_ms:10.1f}ms")
+        print(f"{'mmap reload':28} {load_ms:10.1f}ms")
+
+        symptoms = ['dau hong', 'sot']
+        reloaded.top_departments(symptoms)
+        seconds = timeit.timeit(lambda: reloaded.top_departments(symptoms), number=number)
+        print(f"{'top-3 (cached query)':28} {seconds / number * 1e6:10.1f}us")
+
+        queries = [[f"{word} {i}"] for i, word in enumerate(WORDS * (number // len(WORDS)))]
+        started = time.perf_counter()
+        for query in queries:
+            reloaded.top_departments(query)
+        per_query = (time.perf_counter() - started) / len(queries)
+        print(f"{'top-3 (new query)':28} {per_query * 1e6:10.1f}us")
+
+        assert index.top_departments(symptoms) == reloaded.top_departments(symptoms)
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,117 @@
+# bench_llm_dispatch.py - Benchmark for the LLM dispatcher
+# Simulates a burst of concurrent sessions against a stub backend that
+# serializes generation like a single local Ollama model, then compares
+# calling the client directly with going through LLMDispatcher.
+
+import sys
+import os
+import random
+import threading
+import time
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.llm_dispatcher import LLMDispatcher, PRIORITY_ROUTINE, PRIORITY_URGENT
+
+
+class StubBackend:
+    """Stands in for LLMClient: num_parallel slots, fixed generation latency"""
+
+    model = 'stub-model'
+    cache = None
+
+    def __init__(self, latency=0.05, num_parallel=1):
+        self.latency = latency
+        self.calls = 0
+        self._slots = threading.Semaphore(num_parallel)
+        self._lock = threading.Lock()
+
+    def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+        with self._lock:
+            self.calls += 1
+        with self._slots:
+            time.sleep(self.latency)
+        return 'ok: ' + messages[-1]['content']
+
+
+# Popular messages repeat across sessions; the rest are unique
+POPULAR = ['toi bi dau hong', 'be bi sot', 'dau bung', 'ho nhieu', 'chong mat']
+
+
+def make_workload(requests=60, duplicate_ratio=0.5, urgent_ratio=0.1, seed=7):
+    rng = random.Random(seed)
+    workload = []
+    for i in range(requests):
+        if rng.random() < duplicate_ratio:
+            message = rng.choice(POPULAR)
+        else:
+            message = f'trieu chung so {i}'
+        priority = PRIORITY_URGENT if rng.random() < urgent_ratio else PRIORITY_ROUTINE
+        workload.append(([{'role': 'user', 'content': message}], priority))
+    return workload
+
+
+def run(workload, call):
+    """Fire every request at once; return per-lane latencies (ms) and wall time"""
+    latencies = {PRIORITY_URGENT: [], PRIORITY_ROUTINE: []}
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(workload))
+
+    def worker(messages, priority):
+        barrier.wait()
+        started = time.perf_counter()
+        call(messages, priority)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies[priority].append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=item) for item in workload]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(name, backend, latencies, wall):
+    print(f"{name:12} calls={backend.calls:3d} wall={wall:6.2f}s  "
+          f"urgent p95={percentile(latencies[PRIORITY_URGENT], 0.95):7.0f}ms  "
+          f"routine p95={percentile(latencies[PRIORITY_ROUTINE], 0.95):7.0f}ms")
+
+
+def run_benchmark(latency=0.05, num_parallel=1):
+    workload = make_workload()
+    print(f"{len(workload)} concurrent requests, {latency * 1000:.0f}ms per generation, "
+          f"OLLAMA_NUM_PARALLEL={num_parallel}")
+    print("-" * 80)
+
+    backend = StubBackend(latency, num_parallel)
+    latencies, wall = run(workload, lambda messages, priority: backend.chat(messages))
+    report('direct', backend, latencies, wall)
+
+    backend = StubBackend(latency, num_parallel)
+    dispatcher = LLMDispatcher(client=backend, num_parallel=num_parallel, queue_size=len(workload))
+    latencies, wall = run(
+        workload, lambda messages, priority: dispatcher.chat(messages, priority=priority)
+    )
+    report('dispatcher', backend, latencies, wall)
+
+    stats = dispatcher.stats()
+    print(f"\ncoalesced={stats['coalesced']} rejected={stats['rejected']} "
+          f"wait_ms={stats['wait_ms']}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
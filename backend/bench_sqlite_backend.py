@@ -0,0 +1,156 @@
+# bench_sqlite_backend.py - Benchmark for the embedded SQLite backend
+# Runs a mixed chat workload (session lookups + history reads, turn inserts
+# with a session upsert) from many threads against a scratch database file,
+# once with SQLite defaults (rollback journal, synchronous=FULL, a new
+# connection per request) and once with SQLiteBackend (WAL, synchronous=NORMAL,
+# one connection per thread with cached statements).
+
+import sys
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.backends.sqlite import SQLiteBackend
+
+SESSION_COLUMNS = ('session_id', 'turn_count', 'conversation_status')
+
+
+class DefaultsBackend(SQLiteBackend):
+    """SQLite out of the box: rollback journal, synchronous=FULL, no pool"""
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level='IMMEDIATE',
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+
+class NoPool:
+    """Opens and closes a connection for every request"""
+
+    def __init__(self, connect):
+        self._connect = connect
+
+    def acquire(self):
+        return self._connect()
+
+    def release(self, conn):
+        conn.close()
+
+
+def setup(backend, sessions):
+    dialect = backend.dialect
+    conn = backend.connect()
+    conn.execute(dialect.create_table('sessions', (
+        "session_id TEXT PRIMARY KEY, turn_count INTEGER, conversation_status TEXT, "
+        f"updated_at DATETIME DEFAULT {dialect.now_default}"
+    )))
+    conn.execute(dialect.create_table('conversations', (
+        f"id {dialect.identity_pk}, session_id TEXT, turn_number INTEGER, "
+        "user_message TEXT, bot_response TEXT"
+    )))
+    conn.execute(dialect.create_index('idx_bench_session', 'conversations', 'session_id, turn_number'))
+    conn.executemany(
+        "INSERT INTO sessions (session_id, turn_count, conversation_status) VALUES (?, 0, 'in_progress')",
+        [(f's{i}',) for i in range(sessions)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(backend, pool, threads=16, operations=200, write_ratio=0.2, sessions=50, seed=7):
+    """Every thread runs its share of operations; return (read_ms, write_ms, wall, errors)"""
+    dialect = backend.dialect
+    upsert = dialect.upsert('sessions', SESSION_COLUMNS, 'session_id',
+                            newer='turn_count', touch='updated_at')
+    history = ("SELECT turn_number, user_message, bot_response FROM conversations "
+               "WHERE session_id = ? ORDER BY turn_number DESC")
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        barrier.wait()
+        for _ in range(operations):
+            session_id = f's{rng.randrange(sessions)}'
+            is_write = rng.random() < write_ratio
+            started = time.perf_counter()
+            conn = pool.acquire()
+            raw = conn.raw if hasattr(conn, 'raw') else conn
+            try:
+                if is_write:
+                    backend.begin_write(conn)
+                    turn = raw.execute(
+                        "SELECT turn_count FROM sessions WHERE session_id = ?", (session_id,)
+                    ).fetchone()[0] + 1
+                    raw.execute(
+                        "INSERT INTO conversations (session_id, turn_number, user_message, bot_response) "
+                        "VALUES (?, ?, ?, ?)", (session_id, turn, 'toi bi dau dau', 'ban bi bao lau roi?')
+                    )
+                    raw.execute(upsert, (session_id, turn, 'in_progress'))
+                    raw.commit()
+                else:
+                    raw.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                    raw.execute(*dialect.limit(history, (session_id,), 10)).fetchall()
+            except sqlite3.Error as e:
+                raw.rollback()
+                with lock:
+                    errors.append(str(e))
+                continue
+            finally:
+                pool.release(conn)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                (writes if is_write else reads).append(elapsed)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return reads, writes, time.perf_counter() - started, errors
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(name, reads, writes, wall, errors):
+    total = len(reads) + len(writes)
+    print(f"{name:10} ops/s={total / wall:8.0f}  "
+          f"read p95={percentile(reads, 0.95):7.2f}ms  "
+          f"write p95={percentile(writes, 0.95):7.2f}ms  errors={len(errors)}")
+
+
+def run_benchmark(threads=16, operations=200):
+    print(f"{threads} threads x {operations} operations, 20% writes")
+    print("-" * 80)
+    with tempfile.TemporaryDirectory() as directory:
+        backend = DefaultsBackend(os.path.join(directory, 'defaults.db'))
+        setup(backend, sessions=50)
+        report('defaults', *run(backend, NoPool(backend.connect), threads, operations))
+
+        backend = SQLiteBackend(os.path.join(directory, 'tuned.db'))
+        setup(backend, sessions=50)
+        pool = backend.create_pool()
+        report('tuned', *run(backend, pool, threads, operations))
+        pool.close_all()
+
+
+if __name__ == '__main__':
+    run_benchmark()
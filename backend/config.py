@@ -18,6 +18,10 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DEBUG = True
 
+    # === Storage backend ===
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'sqlserver')  # 'sqlserver' hoặc 'sqlite' (chạy trên một máy, không cần SQL Server)
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', str(BASE_DIR / 'database' / 'chatbot.db'))  # File database khi DB_BACKEND='sqlite'
+
     # === SQL Server 2020 Configuration ===
     DB_CONFIG = {
         'server': 'localhost',                    # hoặc 'localhost\\SQLEXPRESS' nếu dùng Express
@@ -27,6 +31,15 @@ class Config:
         'password': 'Ntn@1997',
         'trusted_connection': True,               # Set True for Windows Authentication
     }
+
+    # Cấu hình Connection Pool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))                                    # Số connection tối đa
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))                             # Thời gian chờ connection rảnh (giây)
+    DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))                         # Đóng connection rảnh quá lâu (giây)
+    DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))  # Ping connection rảnh lâu hơn (giây)
+    DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 32))              # Số prepared statement cache mỗi connection
+    DB_LOGIN_TIMEOUT = int(os.environ.get('DB_LOGIN_TIMEOUT', 5))                             # Timeout khi mở connection mới (giây)
+    DB_QUERY_TIMEOUT = int(os.environ.get('DB_QUERY_TIMEOUT', 5))                             # Timeout mỗi câu SQL (giây), 0 = không giới hạn
     # Cấu hình CORS (cho phép Angular frontend truy cập)
     CORS_ORIGINS = [
         "http://localhost:4200",  # Angular development server
@@ -42,7 +55,53 @@ class Config:
 
     # Cấu hình Chatbot
     MAX_CONVERSATION_HISTORY = 10  # Số lượng tin nhắn tối đa lưu trong lịch sử
+    HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 20))          # Số turn mỗi trang lịch sử (mặc định)
+    HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 100))  # Số turn tối đa client được yêu cầu mỗi trang
     SESSION_TIMEOUT = 3600  # Timeout session (giây)
+    SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', 10000))  # Số session tối đa giữ trong memory
+
+    # Cấu hình Deadline (thời gian tối đa cho mỗi request chat)
+    REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 8))                       # Tổng thời gian cho một turn (giây), 0 = tắt
+    DEADLINE_RESERVE = float(os.environ.get('DEADLINE_RESERVE', 0.5))                     # Thời gian giữ lại để lưu turn (giây)
+    DEADLINE_LLM_MIN_REMAINING = float(os.environ.get('DEADLINE_LLM_MIN_REMAINING', 1))   # Bỏ qua bước LLM nếu còn ít hơn (giây)
+
+    # Cấu hình Async (ASGI) server
+    ASYNC_DB_WORKERS = int(os.environ.get('ASYNC_DB_WORKERS', DB_POOL_SIZE))  # Số thread chạy thao tác DB cho route async
+    ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 1))                     # Số process uvicorn
+    # Đối chiếu session cache với DB mỗi turn (cần khi nhiều process không có sticky session)
+    SESSION_CACHE_VALIDATE = os.environ.get('SESSION_CACHE_VALIDATE', str(ASGI_WORKERS > 1)).lower() == 'true'
+
+    # Cấu hình Write-behind (ghi conversation turn bất đồng bộ theo batch)
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'False').lower() == 'true'
+    WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 5000))        # Số turn tối đa chờ ghi
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 200))         # Số turn mỗi lần INSERT
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))  # Thời gian tối đa 1 turn nằm trong queue (giây)
+    WRITE_BEHIND_PUT_TIMEOUT = float(os.environ.get('WRITE_BEHIND_PUT_TIMEOUT', 0.2))     # Chờ khi queue đầy trước khi ghi đồng bộ (giây)
+    WRITE_BEHIND_FSYNC = os.environ.get('WRITE_BEHIND_FSYNC', 'True').lower() == 'true'
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get('WRITE_BEHIND_MAX_ATTEMPTS', 5))      # Số lần thử 1 batch trước khi ghi từng turn (turn lỗi vào <spool>.dead)
+    WRITE_BEHIND_SPOOL_MAX_BYTES = int(os.environ.get('WRITE_BEHIND_SPOOL_MAX_BYTES', 8 * 1024 * 1024))  # Kích thước 1 file spool trước khi mở file mới (file cũ bị xóa khi đã ghi hết)
+    WRITE_BEHIND_SPOOL_PATH = os.environ.get(                                          # Mỗi process ghi vào <tên>.<pid>.jsonl
+        'WRITE_BEHIND_SPOOL_PATH', str(BASE_DIR / 'backend' / 'spool' / 'conversations.jsonl')
+    )
+
+    # Cấu hình Retention (chuyển hội thoại cũ sang kho lưu trữ, không xóa)
+    RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 90))                    # Chuyển session không cập nhật trong số ngày này
+    RETENTION_STATUSES = tuple(
+        s.strip() for s in os.environ.get('RETENTION_STATUSES', 'completed').split(',') if s.strip()
+    )                                                                             # Trạng thái được coi là đã kết thúc
+    RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))       # Số session mỗi transaction (tối đa 1000)
+    RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', 0.2))   # Nghỉ giữa các batch (giây)
+    RETENTION_ARCHIVE_MODE = os.environ.get('RETENTION_ARCHIVE_MODE', 'table')    # 'table' (bảng *_archive) hoặc 'jsonl' (file .jsonl.gz)
+    RETENTION_ARCHIVE_DIR = os.environ.get(
+        'RETENTION_ARCHIVE_DIR', str(BASE_DIR / 'backend' / 'archive')
+    )
+
+    # Cấu hình Rule Cache (symptom_rules, red_flags, departments, quick_reply_rules)
+    RULE_CACHE_REFRESH_INTERVAL = int(os.environ.get('RULE_CACHE_REFRESH_INTERVAL', 30))  # Chu kỳ poll thay đổi (giây), 0 = tắt
+
+    # Cấu hình Admin API (import rule)
+    ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN', '')                        # Token cho header X-Admin-Token ('' = tắt admin API)
+    RULE_IMPORT_MAX_BYTES = int(os.environ.get('RULE_IMPORT_MAX_BYTES', 5 * 1024 * 1024))  # Kích thước tối đa của file rule (byte)
 
 # Module-level configuration for easy access
 FLASK_HOST = os.environ.get('FLASK_HOST', '0.0.0.0')
@@ -52,16 +111,100 @@ FLASK_DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
 # Ollama configuration - FIXED 
 OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'qwen3:4b-instruct-2507-q4_k_m')  
 OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '-1')                  # Thời gian Ollama giữ model trong memory ('30m', -1 = mãi mãi)
+OLLAMA_PRELOAD = os.environ.get('OLLAMA_PRELOAD', 'True').lower() == 'true'   # Nạp sẵn model khi server khởi động
+OLLAMA_TIMEOUT = float(os.environ.get('OLLAMA_TIMEOUT', 120))                 # Timeout mỗi request tới Ollama (giây)
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get('OLLAMA_MAX_CONNECTIONS', 10))    # Số HTTP connection tối đa tới Ollama
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OLLAMA_MAX_KEEPALIVE_CONNECTIONS', 10))  # Số connection rảnh giữ lại để dùng lại
+OLLAMA_KEEPALIVE_EXPIRY = float(os.environ.get('OLLAMA_KEEPALIVE_EXPIRY', 300))  # Đóng connection rảnh quá lâu (giây)
+
+# Hybrid triage: rule engine trước, chỉ gọi LLM khi không trích được triệu chứng hoặc điểm < ngưỡng
+LLM_TRIAGE_ENABLED = os.environ.get('LLM_TRIAGE_ENABLED', 'False').lower() == 'true'
+LLM_TRIAGE_TIMEOUT = float(os.environ.get('LLM_TRIAGE_TIMEOUT', 5))                  # Thời gian tối đa mỗi lần gọi LLM (giây)
+LLM_TRIAGE_MIN_CONFIDENCE = float(os.environ.get('LLM_TRIAGE_MIN_CONFIDENCE', 0.6))  # Ngưỡng tin cậy để nhận khoa LLM chọn
+LLM_TRIAGE_NUM_PREDICT = int(os.environ.get('LLM_TRIAGE_NUM_PREDICT', 96))           # Số token tối đa LLM sinh
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 3))                # Số lỗi liên tiếp để ngắt LLM
+LLM_BREAKER_RESET_TIMEOUT = float(os.environ.get('LLM_BREAKER_RESET_TIMEOUT', 30))   # Thời gian ngắt trước khi thử lại (giây)
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 768))         # Số token tối đa của prompt (tóm tắt session + lịch sử gần nhất)
+
+# Trích triệu chứng bằng LLM (JSON theo schema, map về keyword của symptom_rules)
+LLM_EXTRACTION_ENABLED = os.environ.get('LLM_EXTRACTION_ENABLED', 'False').lower() == 'true'
+LLM_EXTRACTION_TIMEOUT = float(os.environ.get('LLM_EXTRACTION_TIMEOUT', 3))         # Thời gian tối đa mỗi lần gọi (giây)
+LLM_EXTRACTION_NUM_PREDICT = int(os.environ.get('LLM_EXTRACTION_NUM_PREDICT', 64))  # Số token tối đa LLM sinh
+LLM_EXTRACTION_CACHE_SIZE = int(os.environ.get('LLM_EXTRACTION_CACHE_SIZE', 5000))  # Số tin nhắn giữ kết quả trong cache
+
+# Hàng đợi LLM (dispatcher): số request đồng thời khớp với OLLAMA_NUM_PARALLEL của Ollama server
+OLLAMA_NUM_PARALLEL = int(os.environ.get('OLLAMA_NUM_PARALLEL', 1))
+LLM_QUEUE_SIZE = int(os.environ.get('LLM_QUEUE_SIZE', 64))             # Số request tối đa chờ slot
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 30))     # Thời gian chờ slot tối đa (giây)
+
+# Embedding index: tìm khoa theo độ tương đồng vector khi keyword không khớp (cần numpy)
+EMBEDDING_INDEX_ENABLED = os.environ.get('EMBEDDING_INDEX_ENABLED', 'False').lower() == 'true'
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'hashing')                      # 'hashing' (cục bộ) hoặc 'ollama'
+OLLAMA_EMBED_MODEL = os.environ.get('OLLAMA_EMBED_MODEL', 'nomic-embed-text')       # Model embedding khi EMBEDDING_MODEL = 'ollama'
+EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', 256))                           # Số chiều của model 'hashing'
+EMBEDDING_TOP_K = int(os.environ.get('EMBEDDING_TOP_K', 3))                         # Số khoa trả về
+EMBEDDING_MIN_SIMILARITY = float(os.environ.get('EMBEDDING_MIN_SIMILARITY', 0.35))  # Ngưỡng cosine để nhận khoa
+EMBEDDING_INDEX_DIR = os.environ.get(
+    'EMBEDDING_INDEX_DIR', str(BASE_DIR / 'backend' / 'embeddings')
+)
+
+# Cache câu trả lời LLM (key = prompt đã bỏ dấu + model + options)
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 2000))   # Số câu trả lời tối đa trong memory
+LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', 86400))                # Thời gian sống của câu trả lời (giây)
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', '')                        # File sqlite giữ cache qua các lần restart ('' = chỉ memory)
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_DISK_MAX_ENTRIES', 50000))  # Số câu trả lời tối đa trong file sqlite (xóa cũ nhất)
+
+# Streaming: dùng LLM để viết lại câu trả lời (token-by-token qua SSE)
+LLM_STREAM_RESPONSES = os.environ.get('LLM_STREAM_RESPONSES', 'False').lower() == 'true'
+LLM_STREAM_NUM_PREDICT = int(os.environ.get('LLM_STREAM_NUM_PREDICT', 256))  # Số token tối đa LLM sinh khi viết lại câu trả lời
 
 # Export Config class attributes as module-level
 SECRET_KEY = Config.SECRET_KEY
+DB_BACKEND = Config.DB_BACKEND
+SQLITE_PATH = Config.SQLITE_PATH
 DB_CONFIG = Config.DB_CONFIG
+DB_POOL_SIZE = Config.DB_POOL_SIZE
+DB_POOL_TIMEOUT = Config.DB_POOL_TIMEOUT
+DB_POOL_MAX_IDLE = Config.DB_POOL_MAX_IDLE
+DB_POOL_HEALTH_CHECK_INTERVAL = Config.DB_POOL_HEALTH_CHECK_INTERVAL
+DB_STATEMENT_CACHE_SIZE = Config.DB_STATEMENT_CACHE_SIZE
+DB_LOGIN_TIMEOUT = Config.DB_LOGIN_TIMEOUT
+DB_QUERY_TIMEOUT = Config.DB_QUERY_TIMEOUT
 CORS_ORIGINS = Config.CORS_ORIGINS
 API_PREFIX = Config.API_PREFIX
 LLM_MODEL_NAME = Config.LLM_MODEL_NAME
 LLM_MODEL_PATH = Config.LLM_MODEL_PATH
 MAX_CONVERSATION_HISTORY = Config.MAX_CONVERSATION_HISTORY
+HISTORY_PAGE_SIZE = Config.HISTORY_PAGE_SIZE
+HISTORY_MAX_PAGE_SIZE = Config.HISTORY_MAX_PAGE_SIZE
 SESSION_TIMEOUT = Config.SESSION_TIMEOUT
+SESSION_CACHE_MAX_ENTRIES = Config.SESSION_CACHE_MAX_ENTRIES
+REQUEST_DEADLINE = Config.REQUEST_DEADLINE
+DEADLINE_RESERVE = Config.DEADLINE_RESERVE
+DEADLINE_LLM_MIN_REMAINING = Config.DEADLINE_LLM_MIN_REMAINING
+RULE_CACHE_REFRESH_INTERVAL = Config.RULE_CACHE_REFRESH_INTERVAL
+ADMIN_API_TOKEN = Config.ADMIN_API_TOKEN
+RULE_IMPORT_MAX_BYTES = Config.RULE_IMPORT_MAX_BYTES
+ASYNC_DB_WORKERS = Config.ASYNC_DB_WORKERS
+ASGI_WORKERS = Config.ASGI_WORKERS
+SESSION_CACHE_VALIDATE = Config.SESSION_CACHE_VALIDATE
+WRITE_BEHIND_ENABLED = Config.WRITE_BEHIND_ENABLED
+WRITE_BEHIND_QUEUE_SIZE = Config.WRITE_BEHIND_QUEUE_SIZE
+WRITE_BEHIND_BATCH_SIZE = Config.WRITE_BEHIND_BATCH_SIZE
+WRITE_BEHIND_FLUSH_INTERVAL = Config.WRITE_BEHIND_FLUSH_INTERVAL
+WRITE_BEHIND_PUT_TIMEOUT = Config.WRITE_BEHIND_PUT_TIMEOUT
+WRITE_BEHIND_FSYNC = Config.WRITE_BEHIND_FSYNC
+WRITE_BEHIND_MAX_ATTEMPTS = Config.WRITE_BEHIND_MAX_ATTEMPTS
+WRITE_BEHIND_SPOOL_MAX_BYTES = Config.WRITE_BEHIND_SPOOL_MAX_BYTES
+WRITE_BEHIND_SPOOL_PATH = Config.WRITE_BEHIND_SPOOL_PATH
+RETENTION_DAYS = Config.RETENTION_DAYS
+RETENTION_STATUSES = Config.RETENTION_STATUSES
+RETENTION_BATCH_SIZE = Config.RETENTION_BATCH_SIZE
+RETENTION_BATCH_PAUSE = Config.RETENTION_BATCH_PAUSE
+RETENTION_ARCHIVE_MODE = Config.RETENTION_ARCHIVE_MODE
+RETENTION_ARCHIVE_DIR = Config.RETENTION_ARCHIVE_DIR
 
 class DevelopmentConfig(Config):
     """Cấu hình cho môi trường Development"""
@@ -0,0 +1,83 @@
+# import_rules.py - Bulk import symptom_rules, red_flags and quick_reply_rules
+#
+#   python import_rules.py rules.json                  # {"symptom_rules": [...], "red_flags": [...], ...}
+#   python import_rules.py red_flags.csv               # CSV: one table, named after the file
+#   python import_rules.py rules.json --dry-run        # validate only
+#   python import_rules.py extra.csv --table quick_reply_rules --mode append
+#   python import_rules.py --version                   # latest rule version
+#
+# Running servers pick up the new rule version on their next rule cache poll
+# (RULE_CACHE_REFRESH_INTERVAL); conversations and sessions are not touched.
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+from services.rule_import import RULE_TABLES, RuleImportError, RuleImporter, get_rule_version, parse_rules
+
+
+def print_version():
+    """Print the latest rule import"""
+    latest = get_rule_version()
+    if not latest:
+        print("No rule set has been imported yet")
+        return
+    print(f"Rule version {latest['version']}: {latest['tables']} ({latest['row_count']} rows, "
+          f"{latest['mode']}) from {latest['source'] or '-'} at {latest['imported_at']}")
+
+
+def import_file(path, table=None, mode='replace', dry_run=False):
+    """Validate and import one JSON or CSV rule file"""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    fmt = ext.lower().lstrip('.')
+    if fmt == 'csv' and table is None and stem in RULE_TABLES:
+        table = stem
+
+    print("=" * 60)
+    print(f"Rule Import ({mode})" + (" - DRY RUN" if dry_run else ""))
+    print("=" * 60)
+
+    with open(path, encoding='utf-8-sig') as f:
+        text = f.read()
+
+    try:
+        rules = parse_rules(text, fmt, table)
+        result = RuleImporter(mode).run(rules, source=os.path.basename(path), dry_run=dry_run)
+    except RuleImportError as e:
+        print(f"Rejected {path}, nothing was written:")
+        for error in e.errors:
+            print(f"  - {error}")
+        return False
+
+    for name, count in result['tables'].items():
+        print(f"  {name:30} {count} rows")
+    print("-" * 60)
+    if dry_run:
+        print("Rule set is valid")
+    else:
+        print(f"Imported as rule version {result['version']}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk import triage rules from JSON or CSV')
+    parser.add_argument('path', nargs='?', help='Rule file (.json or .csv)')
+    parser.add_argument('--table', choices=RULE_TABLES,
+                        help='Target table for a CSV file or a JSON list (default: CSV file name)')
+    parser.add_argument('--mode', choices=RuleImporter.MODES, default='replace',
+                        help='Replace the tables in the file (default) or append to them')
+    parser.add_argument('--dry-run', action='store_true', help='Only validate the rule set')
+    parser.add_argument('--version', action='store_true', help='Print the latest rule version')
+    args = parser.parse_args()
+
+    if args.version:
+        print_version()
+    elif not args.path:
+        parser.error('a rule file is required')
+    else:
+        sys.exit(0 if import_file(args.path, args.table, args.mode, args.dry_run) else 1)
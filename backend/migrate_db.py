@@ -2,10 +2,96 @@
 
 import sys
 import os
+import argparse
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from models.database import Database
 
+def migrate_sessions(backfill=True):
+    """
+    Create the sessions table (one row per session) and backfill it from the
+    latest turn of every session in conversations. Safe to run again: the
+    table is only created if missing and only sessions without a row are
+    backfilled.
+    """
+    Database.execute_update("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='sessions' AND xtype='U')
+        CREATE TABLE sessions (
+            session_id NVARCHAR(100) PRIMARY KEY,
+            turn_count INT NOT NULL DEFAULT 0,
+            extracted_symptoms NVARCHAR(MAX),
+            patient_age INT,
+            patient_gender NVARCHAR(20),
+            collected_duration NVARCHAR(100),
+            collected_severity INT,
+            is_pregnant BIT DEFAULT 0,
+            is_pediatric BIT DEFAULT 0,
+            is_severe BIT DEFAULT 0,
+            current_score FLOAT DEFAULT 0,
+            current_esi_level INT,
+            recommended_department_id INT,
+            conversation_status NVARCHAR(50) DEFAULT 'in_progress',
+            last_question_type NVARCHAR(50),
+            created_at DATETIME DEFAULT GETDATE(),
+            updated_at DATETIME DEFAULT GETDATE(),
+            FOREIGN KEY (recommended_department_id) REFERENCES departments(id)
+        )
+    """)
+    print("   sessions table ready")
+
+    Database.execute_update("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'idx_sessions_status')
+        CREATE INDEX idx_sessions_status ON sessions(conversation_status, updated_at)
+    """)
+    print("   Created index on (conversation_status, updated_at)")
+
+    if not backfill:
+        return 0
+
+    copied = Database.execute_update("""
+        INSERT INTO sessions (
+            session_id, turn_count, extracted_symptoms,
+            patient_age, patient_gender, collected_duration, collected_severity,
+            is_pregnant, is_pediatric, is_severe,
+            current_score, current_esi_level, recommended_department_id,
+            conversation_status, last_question_type, created_at, updated_at
+        )
+        SELECT session_id, turn_number, extracted_symptoms,
+               patient_age, patient_gender, collected_duration, collected_severity,
+               is_pregnant, is_pediatric, is_severe,
+               current_score, current_esi_level, recommended_department_id,
+               conversation_status, last_question_type, first_turn_at, timestamp
+        FROM (
+            SELECT c.*,
+                   MIN(c.timestamp) OVER (PARTITION BY c.session_id) AS first_turn_at,
+                   ROW_NUMBER() OVER (PARTITION BY c.session_id ORDER BY c.turn_number DESC) AS rn
+            FROM conversations c
+            WHERE NOT EXISTS (SELECT 1 FROM sessions s WHERE s.session_id = c.session_id)
+        ) latest
+        WHERE rn = 1
+    """)
+    print(f"   Backfilled {copied} sessions from their latest turn")
+    return copied
+
+def migrate_rule_versions():
+    """
+    Create the rule_versions table (one row per rule import, id = rule
+    version). The rule cache signature reads MAX(id) from it, so running
+    servers reload rules after every import. Safe to run again.
+    """
+    Database.execute_update("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='rule_versions' AND xtype='U')
+        CREATE TABLE rule_versions (
+            id INT PRIMARY KEY IDENTITY(1,1),
+            tables NVARCHAR(200) NOT NULL,
+            row_count INT NOT NULL,
+            mode NVARCHAR(20) NOT NULL,
+            source NVARCHAR(200),
+            imported_at DATETIME DEFAULT GETDATE()
+        )
+    """)
+    print("   rule_versions table ready")
+
 def migrate_database():
     """Update database schema to match chatbot service requirements"""
     print("=" * 60)
@@ -52,6 +138,11 @@ def migrate_database():
         """)
         print("   Created index on session_id")
 
+        # Session state now lives in its own table (one row per session)
+        migrate_sessions(backfill=False)
+        Database.execute_update("DELETE FROM sessions")
+        print("   Cleared sessions of the dropped conversations")
+
         # 2. Add is_active column to symptom_rules if missing
         print("\n2. Updating 'symptom_rules' table...")
         try:
@@ -103,6 +194,10 @@ def migrate_database():
         Database.execute_update("UPDATE departments SET is_active = 1 WHERE is_active IS NULL")
         print("   Set all existing departments to active")
 
+        # 5. Rule versions (bulk rule import / hot reload)
+        print("\n5. Creating 'rule_versions' table...")
+        migrate_rule_versions()
+
         print("\n" + "=" * 60)
         print("Migration completed successfully!")
         print("=" * 60)
@@ -115,4 +210,18 @@ def migrate_database():
         return False
 
 if __name__ == '__main__':
-    migrate_database()
+    parser = argparse.ArgumentParser(description='Migrate database schema')
+    parser.add_argument('--sessions-only', action='store_true',
+                        help='Only create and backfill the sessions table (keeps conversations)')
+    parser.add_argument('--rule-versions-only', action='store_true',
+                        help='Only create the rule_versions table (needed by import_rules.py)')
+    args = parser.parse_args()
+
+    if args.sessions_only:
+        print("Migrating sessions table...")
+        migrate_sessions()
+    elif args.rule_versions_only:
+        print("Migrating rule_versions table...")
+        migrate_rule_versions()
+    else:
+        migrate_database()
@@ -0,0 +1,45 @@
+"""
+Storage backends - SQL Server (pyodbc) hoac SQLite, chon bang config.DB_BACKEND
+"""
+
+import threading
+
+import config
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name):
+    """
+    Tao backend theo ten
+
+    Args:
+        name (str): 'sqlserver' hoac 'sqlite'
+
+    Returns:
+        Backend: Backend tuong ung
+    """
+    name = (name or '').lower()
+    if name == 'sqlserver':
+        from models.backends.sqlserver import SQLServerBackend
+        return SQLServerBackend()
+    if name == 'sqlite':
+        from models.backends.sqlite import SQLiteBackend
+        return SQLiteBackend()
+    raise ValueError(f"Unknown DB_BACKEND '{name}', expected 'sqlserver' or 'sqlite'")
+
+
+def get_backend():
+    """
+    Lay backend dung chung cho toan process (theo config.DB_BACKEND)
+
+    Returns:
+        Backend: Backend dang dung
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(config.DB_BACKEND)
+    return _backend
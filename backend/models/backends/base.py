@@ -0,0 +1,177 @@
+"""
+base.py - Giao dien chung cua storage backend
+
+Backend lo phan phu thuoc engine: mo connection, pool, timeout cua cau SQL,
+lay ID vua INSERT, executemany. Dialect lo phan SQL khac nhau giua cac engine
+(TOP / LIMIT, MERGE / ON CONFLICT, GETDATE / datetime('now'), DDL...). Code
+goi Database chi viet SQL chung va hoi Database.dialect() cho phan con lai.
+"""
+
+from contextlib import contextmanager
+
+import config
+from models.connection_pool import ConnectionPool
+
+
+class Dialect:
+    """
+    Cac phan SQL phu thuoc engine; mac dinh theo cu phap chuan (LIMIT, ON CONFLICT)
+    """
+
+    name = None
+    now = 'CURRENT_TIMESTAMP'            # Thoi diem hien tai trong cau DML
+    now_default = 'CURRENT_TIMESTAMP'    # Gia tri DEFAULT cua cot DATETIME
+    text_type = 'TEXT'                   # Kieu chuoi khong gioi han do dai
+    identity_pk = 'INTEGER PRIMARY KEY'  # Khoa chinh tu tang
+    lock_hint = ''                       # Table hint khoa row den het transaction
+
+    def limit(self, query, params, limit):
+        """
+        Gioi han so row cua mot cau SELECT
+
+        Args:
+            query (str): Cau SELECT (chua co gioi han)
+            params (tuple): Params cua query
+            limit (int): So row toi da
+
+        Returns:
+            tuple: (query, params) da them gioi han
+        """
+        return f"{query.rstrip()}\nLIMIT ?", tuple(params or ()) + (limit,)
+
+    def upsert(self, table, columns, key, newer=None, touch=None):
+        """
+        INSERT hoac UPDATE theo khoa chinh trong mot cau lenh
+
+        Args:
+            table (str): Ten bang
+            columns (tuple): Cac cot, theo thu tu params (co ca key)
+            key (str): Cot khoa chinh
+            newer (str): Chi UPDATE khi gia tri moi cua cot nay >= gia tri cu
+            touch (str): Cot DATETIME duoc dat bang thoi diem hien tai khi UPDATE
+
+        Returns:
+            str: Cau SQL, params theo thu tu columns
+        """
+        updates = [f"{column} = excluded.{column}" for column in columns if column != key]
+        if touch:
+            updates.append(f"{touch} = {self.now}")
+        query = (
+            f"INSERT INTO {table} ({', '.join(columns)})\n"
+            f"VALUES ({', '.join('?' for _ in columns)})\n"
+            f"ON CONFLICT({key}) DO UPDATE SET {', '.join(updates)}"
+        )
+        if newer:
+            query += f"\nWHERE excluded.{newer} >= {table}.{newer}"
+        return query
+
+    def older_than_days(self, column):
+        """Dieu kien 'column cu hon ? ngay' (mot param: so ngay)"""
+        raise NotImplementedError
+
+    def create_table(self, table, columns):
+        """CREATE TABLE neu chua co (columns: phan dinh nghia cot)"""
+        return f"CREATE TABLE IF NOT EXISTS {table} (\n{columns}\n)"
+
+    def create_index(self, name, table, columns):
+        """CREATE INDEX neu chua co"""
+        return f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})"
+
+    def move_rows(self, source, target, columns, where):
+        """
+        Chuyen cac row thoa where tu source sang target (cung transaction)
+
+        Returns:
+            list: Cac cau lenh, moi cau dung cung params cua where; so row
+                  duoc chuyen la rowcount cua cau cuoi
+        """
+        column_list = ', '.join(columns)
+        return [
+            f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {source} WHERE {where}",
+            f"DELETE FROM {source} WHERE {where}"
+        ]
+
+    def table_exists(self, table):
+        """(query, params) tra ve mot row neu bang ton tai"""
+        raise NotImplementedError
+
+    def row_count(self, table):
+        """(query, params) dem so row cua bang, cot row_count"""
+        return f"SELECT COUNT(*) AS row_count FROM {table}", ()
+
+
+class Backend:
+    """
+    Ket noi toi mot engine database (connection, pool, cursor, loi cua driver)
+    """
+
+    name = None
+    dialect = Dialect()
+    health_check_query = 'SELECT 1'
+
+    def connect(self):
+        """Mo mot connection DB-API moi"""
+        raise NotImplementedError
+
+    def create_pool(self):
+        """Pool connection dung chung cho process"""
+        return ConnectionPool(
+            self.connect,
+            max_size=config.DB_POOL_SIZE,
+            acquire_timeout=config.DB_POOL_TIMEOUT,
+            max_idle=config.DB_POOL_MAX_IDLE,
+            health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL,
+            statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+            health_check_query=self.health_check_query
+        )
+
+    @property
+    def errors(self):
+        """Lop exception goc cua driver (dung trong except)"""
+        raise NotImplementedError
+
+    def is_disconnect(self, error):
+        """Loi lam hong connection (khong tra connection ve pool)"""
+        return False
+
+    @contextmanager
+    def cursor(self, conn, query, timeout):
+        """
+        Cursor cho mot cau lenh, gioi han boi timeout (giay)
+
+        Mac dinh dung cursor da cache cua query (prepared statement) va de
+        engine tu quan ly timeout; backend ghi de de ap dung timeout.
+
+        Args:
+            conn (PooledConnection): Connection tu pool
+            query (str): Cau SQL (None = cursor dung mot lan, vd executemany)
+            timeout (float): Thoi gian toi da cua cau lenh (None = mac dinh)
+        """
+        if query is not None:
+            yield conn.prepared(query)
+            return
+        cursor = conn.raw.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def insert_query(self, query):
+        """Cau INSERT se chay de lay duoc ID cua row moi (mac dinh: giu nguyen)"""
+        return query
+
+    def inserted_id(self, cursor):
+        """
+        ID cua row vua INSERT boi insert_query() tren cursor nay
+
+        Returns:
+            int: ID (None neu khong co row nao duoc INSERT)
+        """
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def executemany(self, cursor, query, params_list):
+        """Chay mot cau lenh cho nhieu bo params"""
+        cursor.executemany(query, params_list)
+
+    def begin_write(self, conn):
+        """Bat dau transaction ghi ngay (khoa truoc khi doc) neu engine can"""
@@ -0,0 +1,186 @@
+"""
+sqlite.py - Backend SQLite nhung (mot may, khong can SQL Server)
+
+Danh cho phong kham nho chay ca he thong tren mot may, va de chay test /
+benchmark tren may dev. Toi uu cho nhieu thread doc dong thoi:
+- journal_mode=WAL: reader khong chan writer va nguoc lai.
+- synchronous=NORMAL: chi fsync khi checkpoint (an toan voi WAL, mat toi da
+  cac transaction cuoi cung neu mat dien, khong hong file).
+- Moi thread mot connection (ThreadLocalPool) kem cache prepared statement
+  cua sqlite3 (cached_statements) va cursor theo cau SQL cua PooledConnection.
+- Transaction ghi bat dau bang BEGIN IMMEDIATE: writer xep hang theo
+  busy_timeout thay vi loi "database is locked" khi nang cap khoa.
+- Timeout cua cau SQL (deadline cua request) dung progress handler: cau lenh
+  bi ngat khi het thoi gian.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+from models.backends.base import Backend, Dialect
+from models.connection_pool import PooledConnection
+
+# So lenh VM giua hai lan kiem tra timeout
+PROGRESS_STEPS = 10000
+
+
+def _adapt_datetime(value):
+    return value.isoformat(' ')
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+# Cot DATETIME tra ve datetime nhu pyodbc
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+
+
+class SQLiteDialect(Dialect):
+    """SQLite: LIMIT, ON CONFLICT, datetime('now', 'localtime')"""
+
+    name = 'sqlite'
+    # Gio dia phuong nhu GETDATE() cua SQL Server
+    now = "datetime('now', 'localtime')"
+    now_default = "(datetime('now', 'localtime'))"
+    text_type = 'TEXT'
+    identity_pk = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    def older_than_days(self, column):
+        return f"{column} < datetime('now', 'localtime', '-' || ? || ' days')"
+
+    def table_exists(self, table):
+        return "SELECT 1 AS found FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+
+
+class ThreadLocalPool:
+    """
+    Moi thread giu mot connection rieng (khong tranh chap, khong can khoa)
+
+    Cung giao dien voi ConnectionPool. Mot thread can connection thu hai
+    (vd lay connection long nhau) se mo connection tam, dong khi tra lai.
+    """
+
+    def __init__(self, connect, statement_cache_size=32):
+        self._connect = connect
+        self.statement_cache_size = statement_cache_size
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Stats
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def acquire(self, timeout=None):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self.reused += 1
+            conn.last_used = time.monotonic()
+            return conn
+
+        conn = PooledConnection(self._connect(), self.statement_cache_size)
+        with self._lock:
+            self._connections.add(conn)
+            self.created += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if discard or self._closed or getattr(self._local, 'conn', None) is not None:
+            self.discarded += discard
+            conn.close()
+            return
+        conn.last_used = time.monotonic()
+        self._local.conn = conn
+
+    def close_all(self):
+        """Dong tat ca connection (chi goi khi tat process)"""
+        self._closed = True
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            open_connections = len(self._connections)
+        return {
+            'max_size': None,
+            'open': open_connections,
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded
+        }
+
+
+class SQLiteBackend(Backend):
+    """File SQLite (SQLITE_PATH) o che do WAL, moi thread mot connection"""
+
+    name = 'sqlite'
+    dialect = SQLiteDialect()
+
+    def __init__(self, path=None):
+        self.path = path or config.SQLITE_PATH
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=config.DB_QUERY_TIMEOUT or 5,          # cho khoa ghi (busy_timeout)
+            isolation_level='IMMEDIATE',                   # DML mo transaction bang BEGIN IMMEDIATE
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,                       # unit of work co the ket thuc o thread khac
+            cached_statements=max(config.DB_STATEMENT_CACHE_SIZE, 128)
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def create_pool(self):
+        return ThreadLocalPool(self.connect, statement_cache_size=config.DB_STATEMENT_CACHE_SIZE)
+
+    @property
+    def errors(self):
+        return sqlite3.Error
+
+    def is_disconnect(self, error):
+        # "Cannot operate on a closed database"
+        return isinstance(error, sqlite3.ProgrammingError)
+
+    @contextmanager
+    def cursor(self, conn, query, timeout):
+        raw = conn.raw if hasattr(conn, 'raw') else conn
+        cursor = conn.prepared(query) if query is not None else raw.cursor()
+        if timeout:
+            deadline = time.monotonic() + timeout
+            # Tra ve True = ngat cau lenh (sqlite3.OperationalError: interrupted)
+            raw.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        try:
+            yield cursor
+        finally:
+            if timeout:
+                raw.set_progress_handler(None, 0)
+            if query is None:
+                cursor.close()
+
+    def begin_write(self, conn):
+        raw = conn.raw if hasattr(conn, 'raw') else conn
+        if not raw.in_transaction:
+            raw.execute('BEGIN IMMEDIATE')
@@ -0,0 +1,207 @@
+"""
+sqlserver.py - Backend SQL Server (pyodbc)
+
+pyodbc chi duoc import khi mo connection dau tien, nen cac module khac (va
+backend SQLite) van import duoc models.database tren may khong co ODBC driver.
+"""
+
+import math
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+
+import config
+from models.backends.base import Backend, Dialect
+
+_pyodbc = None
+
+
+def _driver():
+    """Import pyodbc lan dau can den"""
+    global _pyodbc
+    if _pyodbc is None:
+        import pyodbc
+        # Connection pooling is handled by ConnectionPool, not the ODBC driver manager
+        pyodbc.pooling = False
+        _pyodbc = pyodbc
+    return _pyodbc
+
+
+@lru_cache(maxsize=256)
+def _with_output_id(query):
+    """Them OUTPUT INSERTED.id vao INSERT (neu chua co) de lay ID cung round trip"""
+    if re.search(r'\bOUTPUT\b', query, re.IGNORECASE):
+        return query
+    return re.sub(r'\)\s*(VALUES|SELECT)\b', r') OUTPUT INSERTED.id \1', query,
+                  count=1, flags=re.IGNORECASE)
+
+
+class SQLServerDialect(Dialect):
+    """T-SQL: TOP, MERGE, GETDATE(), OUTPUT, sysobjects"""
+
+    name = 'sqlserver'
+    now = 'GETDATE()'
+    now_default = 'GETDATE()'
+    text_type = 'NVARCHAR(MAX)'
+    identity_pk = 'INT PRIMARY KEY IDENTITY(1,1)'
+    lock_hint = ' WITH (UPDLOCK, ROWLOCK)'
+
+    def limit(self, query, params, limit):
+        query = re.sub(r'^\s*SELECT\b', 'SELECT TOP (?)', query, count=1, flags=re.IGNORECASE)
+        return query, (limit,) + tuple(params or ())
+
+    def upsert(self, table, columns, key, newer=None, touch=None):
+        updates = [f"t.{column} = src.{column}" for column in columns if column != key]
+        if touch:
+            updates.append(f"t.{touch} = {self.now}")
+        matched = f" AND src.{newer} >= t.{newer}" if newer else ""
+        return (
+            f"MERGE {table} WITH (HOLDLOCK) AS t\n"
+            f"USING (SELECT {', '.join(f'? AS {column}' for column in columns)}) AS src\n"
+            f"ON t.{key} = src.{key}\n"
+            f"WHEN MATCHED{matched} THEN\n"
+            f"    UPDATE SET {', '.join(updates)}\n"
+            f"WHEN NOT MATCHED THEN\n"
+            f"    INSERT ({', '.join(columns)})\n"
+            f"    VALUES ({', '.join(f'src.{column}' for column in columns)});"
+        )
+
+    def older_than_days(self, column):
+        return f"{column} < DATEADD(day, -?, GETDATE())"
+
+    def create_table(self, table, columns):
+        return (
+            f"IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U')\n"
+            f"CREATE TABLE {table} (\n{columns}\n)"
+        )
+
+    def create_index(self, name, table, columns):
+        return (
+            f"IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{name}')\n"
+            f"CREATE INDEX {name} ON {table}({columns})"
+        )
+
+    def move_rows(self, source, target, columns, where):
+        # Chuyen va xoa trong cung mot cau lenh
+        return [
+            f"DELETE FROM {source}\n"
+            f"OUTPUT {', '.join(f'DELETED.{column}' for column in columns)}\n"
+            f"INTO {target} ({', '.join(columns)})\n"
+            f"WHERE {where}"
+        ]
+
+    def table_exists(self, table):
+        return "SELECT 1 AS found FROM sysobjects WHERE name = ? AND xtype = 'U'", (table,)
+
+    def row_count(self, table):
+        # Dem qua metadata: khong quet bang lon
+        return (
+            "SELECT SUM(rows) AS row_count FROM sys.partitions "
+            "WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)",
+            (table,)
+        )
+
+
+class SQLServerBackend(Backend):
+    """SQL Server qua pyodbc, pool connection co health check"""
+
+    name = 'sqlserver'
+    dialect = SQLServerDialect()
+
+    @staticmethod
+    def get_connection_string():
+        """Build connection string"""
+        cfg = config.DB_CONFIG
+
+        # Windows Authentication
+        if cfg.get('trusted_connection'):
+            return (
+                f"DRIVER={{{cfg['driver']}}};"
+                f"SERVER={cfg['server']};"
+                f"DATABASE={cfg['database']};"
+                f"Trusted_Connection=yes;"
+            )
+
+        # SQL Server Authentication
+        return (
+            f"DRIVER={{{cfg['driver']}}};"
+            f"SERVER={cfg['server']};"
+            f"DATABASE={cfg['database']};"
+            f"UID={cfg['username']};"
+            f"PWD={cfg['password']};"
+        )
+
+    def connect(self):
+        """Open a new connection with a login timeout and a default query timeout"""
+        conn = _driver().connect(self.get_connection_string(), timeout=config.DB_LOGIN_TIMEOUT)
+        conn.timeout = config.DB_QUERY_TIMEOUT
+        return conn
+
+    @property
+    def errors(self):
+        return _driver().Error
+
+    def is_disconnect(self, error):
+        pyodbc = _driver()
+        return isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError))
+
+    @contextmanager
+    def cursor(self, conn, query, timeout):
+        """
+        A cursor keeps the query timeout it was created with, and ODBC
+        timeouts are whole seconds, so prepared cursors are cached per
+        (query, timeout in seconds): a request whose deadline leaves 3 s
+        reuses the 3 s cursor of that query instead of a one-off cursor.
+
+        The result set is always discarded when the statement finishes
+        (fetchone() leaves it open): without MARS a connection serves one
+        active result set, and the next statement on it would fail with
+        "Connection is busy with results for another hstmt".
+        """
+        raw = conn.raw if hasattr(conn, 'raw') else conn
+        seconds = max(1, math.ceil(timeout)) if timeout else config.DB_QUERY_TIMEOUT
+
+        if query is not None:
+            cursor = conn.prepared(query, seconds, lambda: self._new_cursor(raw, seconds))
+            try:
+                yield cursor
+            finally:
+                self._discard_results(cursor)
+            return
+
+        cursor = self._new_cursor(raw, seconds)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _new_cursor(raw, seconds):
+        """Cursor with the given query timeout"""
+        # pyodbc applies the connection timeout to cursors created afterwards
+        raw.timeout = seconds
+        try:
+            return raw.cursor()
+        finally:
+            raw.timeout = config.DB_QUERY_TIMEOUT
+
+    def _discard_results(self, cursor):
+        """Skip unread rows and result sets (pyodbc keeps the statement prepared)"""
+        try:
+            while cursor.nextset():
+                pass
+        except self.errors:
+            pass
+
+    def insert_query(self, query):
+        """INSERT ... OUTPUT INSERTED.id: ID tra ve trong cung round trip"""
+        return _with_output_id(query)
+
+    def inserted_id(self, cursor):
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def executemany(self, cursor, query, params_list):
+        # Gui params theo lo (array binding) thay vi mot round trip moi row
+        cursor.fast_executemany = True
+        cursor.executemany(query, params_list)
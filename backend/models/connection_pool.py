@@ -0,0 +1,225 @@
+# models/connection_pool.py
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class PooledConnection:
+    """
+    Wrapper quanh mot DB-API connection, giu cache cursor theo cau SQL
+
+    pyodbc tai su dung prepared statement khi cung mot cursor execute lai
+    dung cau SQL do, nen moi connection giu mot LRU cursor cho moi query.
+    Cac attribute khac (cursor, commit, rollback...) duoc chuyen thang
+    sang connection goc nen caller khong can thay doi.
+    """
+
+    def __init__(self, raw, statement_cache_size=32):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statement_cache_size = statement_cache_size
+        self._statements = OrderedDict()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def prepared(self, query, variant=None, factory=None):
+        """
+        Lay cursor dung rieng cho mot cau SQL (tai su dung prepared statement)
+
+        Args:
+            query (str): Cau SQL
+            variant: Phan biet cac cursor cua cung query (vd: timeout cua cursor)
+            factory (callable): Tao cursor moi (mac dinh raw.cursor)
+
+        Returns:
+            Cursor: Cursor da tung execute query nay (hoac cursor moi)
+        """
+        factory = factory or self.raw.cursor
+        if self.statement_cache_size <= 0:
+            return factory()
+
+        key = query if variant is None else (query, variant)
+        cursor = self._statements.get(key)
+        if cursor is not None:
+            self._statements.move_to_end(key)
+            return cursor
+
+        cursor = factory()
+        self._statements[key] = cursor
+        if len(self._statements) > self.statement_cache_size:
+            _, evicted = self._statements.popitem(last=False)
+            self._close_quietly(evicted)
+        return cursor
+
+    def close(self):
+        """Dong tat ca cursor da cache va connection goc"""
+        for cursor in self._statements.values():
+            self._close_quietly(cursor)
+        self._statements.clear()
+        self._close_quietly(self.raw)
+
+    @staticmethod
+    def _close_quietly(resource):
+        try:
+            resource.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool connection thread-safe, co gioi han so connection
+
+    - Toi da max_size connection dang mo (dang dung + dang ranh)
+    - Connection ranh qua max_idle giay bi dong (eviction)
+    - Connection ranh lau hon health_check_interval duoc ping truoc khi dung
+    """
+
+    def __init__(self, connect, max_size=10, acquire_timeout=5, max_idle=300,
+                 health_check_interval=30, statement_cache_size=32,
+                 health_check_query='SELECT 1'):
+        """
+        Args:
+            connect (callable): Ham tao connection moi
+            max_size (int): So connection toi da
+            acquire_timeout (float): So giay cho connection ranh
+            max_idle (float): So giay toi da mot connection duoc ranh
+            health_check_interval (float): Ping connection ranh lau hon muc nay
+            statement_cache_size (int): So cursor/prepared statement cache moi connection
+            health_check_query (str): Cau SQL dung de ping
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self.health_check_query = health_check_query
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+        # Stats
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.discarded = 0
+
+    def acquire(self, timeout=None):
+        """
+        Lay mot connection tu pool (hoac tao moi neu chua du max_size)
+
+        Args:
+            timeout (float): Ghi de acquire_timeout
+
+        Returns:
+            PooledConnection: Connection san sang su dung
+        """
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(
+                f"No database connection available after {timeout}s (pool size {self.max_size})"
+            )
+
+        try:
+            while True:
+                conn = self._pop_idle()
+                if conn is None:
+                    break
+                if self._is_usable(conn):
+                    self.reused += 1
+                    conn.last_used = time.monotonic()
+                    return conn
+                self._discard(conn)
+
+            conn = PooledConnection(self._connect(), self.statement_cache_size)
+            self.created += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """
+        Tra connection ve pool
+
+        Args:
+            conn (PooledConnection): Connection lay tu acquire()
+            discard (bool): Dong connection thay vi dua lai pool (vd: loi mang)
+        """
+        try:
+            if discard or self._closed:
+                self._discard(conn)
+                return
+            conn.last_used = time.monotonic()
+            with self._lock:
+                # LIFO: connection vua dung nam tren cung, connection cu o day se het han
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Dong tat ca connection ranh va khong cho acquire them"""
+        self._closed = True
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Thong ke pool"""
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            'max_size': self.max_size,
+            'idle': idle,
+            'created': self.created,
+            'reused': self.reused,
+            'evicted': self.evicted,
+            'discarded': self.discarded
+        }
+
+    def _pop_idle(self):
+        """Lay connection ranh moi nhat, dong cac connection ranh qua max_idle"""
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            while self._idle and now - self._idle[0].last_used > self.max_idle:
+                expired.append(self._idle.popleft())
+            if self._idle:
+                conn = self._idle.pop()
+        for stale in expired:
+            self.evicted += 1
+            stale.close()
+        return conn
+
+    def _is_usable(self, conn):
+        """Ping connection neu da ranh lau hon health_check_interval"""
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.prepared(self.health_check_query)
+            cursor.execute(self.health_check_query)
+            cursor.fetchall()
+            return True
+        except Exception as e:
+            print(f"[ConnectionPool] Health check failed, discarding connection: {str(e)}")
+            return False
+
+    def _discard(self, conn):
+        self.discarded += 1
+        conn.close()
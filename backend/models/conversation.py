@@ -5,9 +5,17 @@ Quản lý lịch sử hội thoại của người dùng
 
 import json
 from models.database import Database
+from models.session import Session
 from datetime import datetime
 
 
+# Thay cau tra loi da luu cua mot turn, params (bot_response, session_id, turn_number)
+UPDATE_RESPONSE_QUERY = """
+UPDATE conversations SET bot_response = ?
+WHERE session_id = ? AND turn_number = ?
+"""
+
+
 class Conversation:
     """
     Model đại diện cho một cuộc hội thoại
@@ -15,11 +23,12 @@ class Conversation:
 
     @staticmethod
     def create(session_id, turn_number, user_message, bot_response,
-               extracted_symptoms=None, opqrst_data=None, current_esi_level=None,
-               matched_red_flags=None, recommended_department_id=None,
-               conversation_status='in_progress', patient_age=None, patient_gender=None):
+               extracted_symptoms=None, current_esi_level=None,
+               recommended_department_id=None, conversation_status='in_progress',
+               current_score=0, context=None):
         """
-        Tạo một record conversation mới
+        Tạo một record conversation mới và cập nhật row của session
+        Thông tin bệnh nhân nằm ở bảng sessions, conversations chỉ ghi thêm turn.
 
         Args:
             session_id (str): ID của session
@@ -27,13 +36,11 @@ class Conversation:
             user_message (str): Tin nhắn từ người dùng
             bot_response (str): Phản hồi từ bot
             extracted_symptoms (list): Danh sách triệu chứng đã trích xuất
-            opqrst_data (dict): Dữ liệu OPQRST
             current_esi_level (int): Mức ESI hiện tại
-            matched_red_flags (list): Danh sách red flags đã match
             recommended_department_id (int): ID khoa được đề xuất
             conversation_status (str): Trạng thái hội thoại
-            patient_age (int): Tuổi bệnh nhân
-            patient_gender (str): Giới tính bệnh nhân
+            current_score (float): Điểm hiện tại
+            context (dict): Thông tin bệnh nhân (age, gender, duration...)
 
         Returns:
             int: ID của conversation vừa tạo
@@ -41,10 +48,9 @@ class Conversation:
         query = """
         INSERT INTO conversations (
             session_id, turn_number, user_message, bot_response,
-            extracted_symptoms, opqrst_data, current_esi_level,
-            matched_red_flags, recommended_department_id,
-            conversation_status, patient_age, patient_gender
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            extracted_symptoms, current_esi_level, recommended_department_id,
+            conversation_status, current_score
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
 
         params = (
@@ -53,16 +59,19 @@ class Conversation:
             user_message,
             bot_response,
             json.dumps(extracted_symptoms, ensure_ascii=False) if extracted_symptoms else None,
-            json.dumps(opqrst_data, ensure_ascii=False) if opqrst_data else None,
             current_esi_level,
-            json.dumps(matched_red_flags, ensure_ascii=False) if matched_red_flags else None,
             recommended_department_id,
             conversation_status,
-            patient_age,
-            patient_gender
+            current_score
+        )
+        session_params = Session.build_params(
+            session_id, turn_number, extracted_symptoms, context or {}, current_esi_level,
+            recommended_department_id, conversation_status, current_score
         )
 
-        return Database.execute_update(query, params)
+        with Database.unit_of_work():
+            Session.upsert(session_params)
+            return Database.execute_insert(query, params)
 
     @staticmethod
     def get_by_session(session_id, limit=10):
@@ -76,13 +85,12 @@ class Conversation:
         Returns:
             list: Danh sách các conversation
         """
-        query = """
+        query, params = Database.dialect().limit("""
         SELECT * FROM conversations
         WHERE session_id = ?
         ORDER BY turn_number ASC
-        LIMIT ?
-        """
-        return Database.execute_query(query, (session_id, limit))
+        """, (session_id,), limit)
+        return Database.execute_query(query, params)
 
     @staticmethod
     def get_latest_turn(session_id):
@@ -95,13 +103,12 @@ class Conversation:
         Returns:
             dict: Turn mới nhất hoặc None
         """
-        query = """
+        query, params = Database.dialect().limit("""
         SELECT * FROM conversations
         WHERE session_id = ?
         ORDER BY turn_number DESC
-        LIMIT 1
-        """
-        return Database.execute_query(query, (session_id,), fetch_one=True)
+        """, (session_id,), 1)
+        return Database.execute_query(query, params, fetch_one=True)
 
     @staticmethod
     def get_turn_count(session_id):
@@ -121,6 +128,21 @@ class Conversation:
         result = Database.execute_query(query, (session_id,), fetch_one=True)
         return result['count'] if result else 0
 
+    @staticmethod
+    def update_response(session_id, turn_number, bot_response):
+        """
+        Thay câu trả lời đã lưu của một turn (vd: câu viết lại đã stream cho bệnh nhân)
+
+        Args:
+            session_id (str): ID của session
+            turn_number (int): Số thứ tự của turn
+            bot_response (str): Câu trả lời bệnh nhân đã thấy
+
+        Returns:
+            int: Số row bị ảnh hưởng
+        """
+        return Database.execute_update(UPDATE_RESPONSE_QUERY, (bot_response, session_id, turn_number))
+
     @staticmethod
     def delete_by_session(session_id):
         """
@@ -139,6 +161,7 @@ class Conversation:
     def update_status(session_id, status):
         """
         Cập nhật trạng thái của conversation
+        Trạng thái nằm ở bảng sessions (một row), các turn không bị sửa.
 
         Args:
             session_id (str): ID của session
@@ -147,9 +170,4 @@ class Conversation:
         Returns:
             int: Số row bị ảnh hưởng
         """
-        query = """
-        UPDATE conversations
-        SET conversation_status = ?
-        WHERE session_id = ?
-        """
-        return Database.execute_update(query, (status, session_id))
+        return Session.update_status(session_id, status)
@@ -1,84 +1,246 @@
 # models/database.py
+#
+# Engine-specific work (driver, pool, query timeouts, inserted IDs) lives in
+# models/backends; config.DB_BACKEND picks SQL Server or SQLite.
 
-import pyodbc
+import threading
 from contextlib import contextmanager
+from contextvars import ContextVar
 import config
+from models.backends import get_backend
+from utils.deadline import remaining_timeout
+
+# Unit of work active in the current thread/task (if any)
+_active_unit = ContextVar('active_unit', default=None)
+
+
+class _UnitOfWork:
+    """One lazily acquired pooled connection shared by a block of queries"""
+
+    def __init__(self, write=False):
+        self.write = write
+        self._context = None
+        self._conn = None
+        self.after_commit = []
+
+    def connection(self):
+        if self._conn is None:
+            self._context = Database._pooled_connection()
+            self._conn = self._context.__enter__()
+            if self.write:
+                try:
+                    get_backend().begin_write(self._conn)
+                except Exception as e:
+                    self.finish(e)
+                    raise
+        return self._conn
+
+    def finish(self, error=None):
+        """Commit (or roll back on error) and release the connection, if one was used"""
+        if self._context is None:
+            return
+        context, self._context, self._conn = self._context, None, None
+        if error is None:
+            context.__exit__(None, None, None)
+        else:
+            context.__exit__(type(error), error, error.__traceback__)
+
 
 class Database:
-    
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @staticmethod
+    def dialect():
+        """SQL dialect of the configured backend (LIMIT/TOP, upsert, now...)"""
+        return get_backend().dialect
+
     @staticmethod
-    def get_connection_string():
-        """Build connection string"""
-        cfg = config.DB_CONFIG
-        
-        # Windows Authentication
-        if cfg.get('trusted_connection'):
-            return (
-                f"DRIVER={{{cfg['driver']}}};"
-                f"SERVER={cfg['server']};"
-                f"DATABASE={cfg['database']};"
-                f"Trusted_Connection=yes;"
-            )
-        
-        # SQL Server Authentication
-        return (
-            f"DRIVER={{{cfg['driver']}}};"
-            f"SERVER={cfg['server']};"
-            f"DATABASE={cfg['database']};"
-            f"UID={cfg['username']};"
-            f"PWD={cfg['password']};"
-        )
-    
+    def get_pool():
+        """Get the shared connection pool (created on first use)"""
+        if Database._pool is None:
+            with Database._pool_lock:
+                if Database._pool is None:
+                    Database._pool = get_backend().create_pool()
+        return Database._pool
+
     @staticmethod
     @contextmanager
     def get_connection():
-        """Context manager for database connection"""
-        conn = None
+        """
+        Context manager for a database connection
+
+        Inside a unit of work the unit's connection is reused and the commit
+        is left to the unit; otherwise a pooled connection is committed and
+        released when the block exits.
+        """
+        unit = _active_unit.get()
+        if unit is not None:
+            yield unit.connection()
+            return
+
+        with Database._pooled_connection() as conn:
+            yield conn
+
+    @staticmethod
+    @contextmanager
+    def unit_of_work(write=False, detached=False):
+        """
+        Context manager grouping several queries into one connection and one
+        transaction (e.g. one chat turn). The connection is acquired lazily on
+        the first query, every Database call made inside the block reuses it,
+        and the transaction is committed once at the end, or rolled back if
+        the block raises. Nested units join the outer one.
+
+        write=True takes the write lock before the first query on engines
+        that lock per database (SQLite), so rows read in the block cannot
+        change before the block writes.
+
+        detached=True always starts a unit of its own (own connection, own
+        commit when the block exits), even inside another unit: for writes
+        that must not depend on the caller's commit.
+        """
+        if _active_unit.get() is not None and not detached:
+            yield
+            return
+
+        unit = _UnitOfWork(write)
+        token = _active_unit.set(unit)
+        try:
+            yield
+        except Exception as e:
+            unit.finish(e)
+            raise
+        else:
+            unit.finish()
+        finally:
+            _active_unit.reset(token)
+        for callback in unit.after_commit:
+            callback()
+
+    @staticmethod
+    def after_commit(callback):
+        """
+        Run callback once the active unit of work has committed (dropped if it
+        rolls back); with no unit active the caller's writes are already
+        committed, so it runs right away. For caches that must not see a
+        write before other connections can.
+        """
+        unit = _active_unit.get()
+        if unit is None:
+            callback()
+        else:
+            unit.after_commit.append(callback)
+
+    @staticmethod
+    @contextmanager
+    def _pooled_connection():
+        """Acquire a pooled connection, commit on success, always release"""
+        backend = get_backend()
+        pool = Database.get_pool()
+        conn = pool.acquire(timeout=remaining_timeout(config.DB_POOL_TIMEOUT, 'db_pool'))
+        discard = False
         try:
-            conn = pyodbc.connect(Database.get_connection_string())
             yield conn
             conn.commit()
         except Exception as e:
-            if conn:
+            try:
                 conn.rollback()
+            except backend.errors:
+                # Connection is broken, do not return it to the pool
+                discard = True
+            if backend.is_disconnect(e):
+                discard = True
             raise e
         finally:
-            if conn:
-                conn.close()
-    
+            pool.release(conn, discard=discard)
+
     @staticmethod
     def execute_query(query, params=None, fetch_one=False):
         """Execute SELECT query"""
-        with Database.get_connection() as conn:
-            cursor = conn.cursor()
-            
+        with Database.get_connection() as conn, Database._cursor(conn, query) as cursor:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            
+
             # Get column names
             columns = [column[0] for column in cursor.description]
-            
+
             if fetch_one:
                 row = cursor.fetchone()
                 return dict(zip(columns, row)) if row else None
             else:
                 rows = cursor.fetchall()
                 return [dict(zip(columns, row)) for row in rows]
-    
+
     @staticmethod
     def execute_update(query, params=None):
-        """Execute INSERT/UPDATE/DELETE"""
-        with Database.get_connection() as conn:
-            cursor = conn.cursor()
-            
+        """
+        Execute UPDATE/DELETE (or DDL)
+
+        Returns:
+            int: Number of affected rows (-1 when the driver cannot tell, e.g. DDL)
+        """
+        with Database.get_connection() as conn, Database._cursor(conn, query) as cursor:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            
-            # Get last inserted ID (SQL Server)
-            cursor.execute("SELECT @@IDENTITY")
-            result = cursor.fetchone()
-            return result[0] if result else None
\ No newline at end of file
+
+            return cursor.rowcount
+
+    @staticmethod
+    def execute_insert(query, params=None):
+        """
+        Execute a plain INSERT (INSERT INTO t (a, b) VALUES (?, ?)) and return
+        the new ID in the same round trip: the SQL Server backend adds
+        OUTPUT INSERTED.id, SQLite reads the cursor's lastrowid.
+
+        Returns:
+            int: ID of the inserted row (None if nothing was inserted)
+        """
+        backend = get_backend()
+        query = backend.insert_query(query)
+        with Database.get_connection() as conn, Database._cursor(conn, query) as cursor:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+
+            return backend.inserted_id(cursor)
+
+    @staticmethod
+    def execute_many(query, params_list):
+        """
+        Execute one statement for many parameter sets in a single transaction
+        (SQL Server sends the parameters in bulk with fast_executemany)
+
+        Args:
+            query (str): INSERT/UPDATE/DELETE statement
+            params_list (list): List of parameter tuples
+
+        Returns:
+            int: Number of parameter sets executed
+        """
+        params_list = list(params_list)
+        if not params_list:
+            return 0
+
+        with Database.get_connection() as conn, Database._cursor(conn) as cursor:
+            get_backend().executemany(cursor, query, params_list)
+            return len(params_list)
+
+    @staticmethod
+    @contextmanager
+    def _cursor(conn, query=None):
+        """
+        Cursor for one statement, bounded by the request deadline
+        (utils/deadline.py) as well as DB_QUERY_TIMEOUT. The backend reuses
+        the prepared cursor of the query when it can and applies the
+        timeout its own way.
+        """
+        timeout = remaining_timeout(config.DB_QUERY_TIMEOUT, 'db_query')
+        with get_backend().cursor(conn, query, timeout) as cursor:
+            yield cursor
@@ -0,0 +1,171 @@
+"""
+session.py - Model cho bảng sessions
+Mỗi session một row: trạng thái bệnh nhân và trạng thái hội thoại hiện tại.
+Bảng conversations chỉ còn ghi thêm (append-only) từng turn.
+"""
+
+import json
+from models.database import Database
+
+
+# Cac cot trang thai cua session, theo dung thu tu params cua upsert_session_query()
+SESSION_COLUMNS = (
+    'session_id', 'turn_count', 'extracted_symptoms',
+    'patient_age', 'patient_gender', 'collected_duration', 'collected_severity',
+    'is_pregnant', 'is_pediatric', 'is_severe',
+    'current_score', 'current_esi_level', 'recommended_department_id',
+    'conversation_status', 'last_question_type'
+)
+
+
+def upsert_session_query():
+    """
+    Upsert theo primary key (MERGE / ON CONFLICT tuy backend); khong ghi de
+    trang thai moi hon bang turn cu hon (vd: replay spool cua write-behind)
+
+    Returns:
+        str: Cau SQL, params theo thu tu SESSION_COLUMNS
+    """
+    return Database.dialect().upsert(
+        'sessions', SESSION_COLUMNS, 'session_id', newer='turn_count', touch='updated_at'
+    )
+
+
+class Session:
+    """
+    Model đại diện cho trạng thái của một session
+    """
+
+    @staticmethod
+    def build_params(session_id, turn_count, symptoms, context, esi_level,
+                     department_id, status, score):
+        """
+        Tạo params cho upsert_session_query() từ trạng thái sau một turn
+
+        Args:
+            session_id (str): ID của session
+            turn_count (int): Số turn đã có (turn_number của turn vừa lưu)
+            symptoms (list): Triệu chứng đã thu thập
+            context (dict): Thông tin bệnh nhân (age, gender, duration...)
+            esi_level (int): Mức ESI hiện tại
+            department_id (int): ID khoa được đề xuất
+            status (str): Trạng thái hội thoại
+            score (float): Điểm hiện tại
+
+        Returns:
+            tuple: Giá trị các cột theo thứ tự SESSION_COLUMNS
+        """
+        return (
+            session_id,
+            turn_count,
+            json.dumps(symptoms, ensure_ascii=False) if symptoms else None,
+            context.get('age'),
+            context.get('gender'),
+            context.get('duration'),
+            context.get('severity'),
+            context.get('is_pregnant', False),
+            context.get('is_pediatric', False),
+            context.get('is_severe', False),
+            score,
+            esi_level,
+            department_id,
+            status,
+            context.get('last_question_type')
+        )
+
+    @staticmethod
+    def upsert(params):
+        """
+        Tạo hoặc cập nhật row của session
+
+        Args:
+            params (tuple): Giá trị các cột theo thứ tự SESSION_COLUMNS
+
+        Returns:
+            int: Số row bị ảnh hưởng
+        """
+        return Database.execute_update(upsert_session_query(), params)
+
+    @staticmethod
+    def get(session_id):
+        """
+        Lấy trạng thái session (seek theo primary key)
+
+        Args:
+            session_id (str): ID của session
+
+        Returns:
+            dict: Row của session hoặc None
+        """
+        query = """
+        SELECT turn_count, extracted_symptoms, patient_age, patient_gender,
+               collected_duration, collected_severity, is_pregnant, is_pediatric,
+               is_severe, current_score, conversation_status, last_question_type
+        FROM sessions
+        WHERE session_id = ?
+        """
+        return Database.execute_query(query, (session_id,), fetch_one=True)
+
+    @staticmethod
+    def get_turn_count(session_id):
+        """
+        Lấy số turn đã lưu của session (seek theo primary key, một cột)
+
+        Args:
+            session_id (str): ID của session
+
+        Returns:
+            int: turn_count hoặc None nếu session chưa có
+        """
+        query = "SELECT turn_count FROM sessions WHERE session_id = ?"
+        row = Database.execute_query(query, (session_id,), fetch_one=True)
+        return row['turn_count'] if row else None
+
+    @staticmethod
+    def get_revision(session_id):
+        """
+        Phiên bản dữ liệu của session, giống nhau giữa các process: đổi khi có
+        turn mới (turn_count) hoặc khi session bị reset rồi tạo lại (created_at)
+
+        Args:
+            session_id (str): ID của session
+
+        Returns:
+            tuple: (turn_count, created_at), (0, None) nếu session chưa có
+        """
+        query = "SELECT turn_count, created_at FROM sessions WHERE session_id = ?"
+        row = Database.execute_query(query, (session_id,), fetch_one=True)
+        return (row['turn_count'], row['created_at']) if row else (0, None)
+
+    @staticmethod
+    def update_status(session_id, status):
+        """
+        Cập nhật trạng thái hội thoại (một row)
+
+        Args:
+            session_id (str): ID của session
+            status (str): Trạng thái mới
+
+        Returns:
+            int: Số row bị ảnh hưởng
+        """
+        query = f"""
+        UPDATE sessions
+        SET conversation_status = ?, updated_at = {Database.dialect().now}
+        WHERE session_id = ?
+        """
+        return Database.execute_update(query, (status, session_id))
+
+    @staticmethod
+    def delete(session_id):
+        """
+        Xóa session
+
+        Args:
+            session_id (str): ID của session
+
+        Returns:
+            int: Số row bị xóa
+        """
+        query = "DELETE FROM sessions WHERE session_id = ?"
+        return Database.execute_update(query, (session_id,))
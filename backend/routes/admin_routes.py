@@ -0,0 +1,112 @@
+"""
+admin_routes.py - Routes quản trị (import rule set, xem phiên bản rule)
+Mọi endpoint cần header X-Admin-Token khớp ADMIN_API_TOKEN
+"""
+
+from flask import Blueprint, request, jsonify
+import config
+from services.rule_cache import get_rule_cache
+from services.rule_import import RuleImportError, RuleImporter, get_rule_version, parse_rules
+from utils.text_normalizer import normalize_text
+from utils.validators import is_admin_request, parse_rule_import
+
+# Tạo Blueprint cho admin routes
+admin_bp = Blueprint('admin', __name__)
+
+
+@admin_bp.before_request
+def require_admin_token():
+    """Từ chối request không có token hợp lệ (hoặc khi admin API bị tắt)"""
+    if not is_admin_request(request.headers, config.ADMIN_API_TOKEN):
+        return jsonify({
+            'error': 'Forbidden',
+            'message': 'A valid X-Admin-Token header is required'
+        }), 403
+
+
+@admin_bp.route('/admin/rules/import', methods=['POST'])
+def import_rules():
+    """
+    Import hàng loạt symptom_rules, red_flags, quick_reply_rules trong một transaction
+
+    Query string:
+        table:  bảng đích (bắt buộc với CSV hoặc JSON dạng list)
+        mode:   'replace' (mặc định, thay toàn bộ bảng) hoặc 'append'
+        dryRun: 'true' để chỉ kiểm tra, không ghi
+
+    Request body (application/json):
+    {
+        "symptom_rules": [{"rule_name": "...", "department_id": 1, "symptom_keywords": ["..."]}],
+        "red_flags": [...],
+        "quick_reply_rules": [...]
+    }
+    hoặc text/csv (một bảng, dòng đầu là tên cột)
+
+    Returns:
+        JSON response với số row mỗi bảng và phiên bản rule mới,
+        400 kèm danh sách lỗi nếu rule set không hợp lệ (không ghi gì)
+    """
+    try:
+        if request.content_length and request.content_length > config.RULE_IMPORT_MAX_BYTES:
+            return jsonify({
+                'error': 'Rule file too large',
+                'message': f'Maximum size is {config.RULE_IMPORT_MAX_BYTES} bytes'
+            }), 413
+
+        try:
+            fmt, table, mode, dry_run = parse_rule_import(request.args, request.content_type)
+            rules = parse_rules(request.get_data(as_text=True), fmt, table)
+            importer = RuleImporter(mode, rule_cache=get_rule_cache(normalize_text))
+            result = importer.run(rules, source=f'api:{request.remote_addr}', dry_run=dry_run)
+        except RuleImportError as e:
+            return jsonify({
+                'error': 'Invalid rule set',
+                'details': e.errors
+            }), 400
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid parameter',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'mode': result['mode'],
+            'tables': result['tables'],
+            'version': result['version'],
+            'dryRun': result['dry_run']
+        }), 200
+
+    except Exception as e:
+        print(f"Error in rule import endpoint: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@admin_bp.route('/admin/rules/version', methods=['GET'])
+def get_rules_version():
+    """
+    Phiên bản rule trong database và phiên bản snapshot worker này đang dùng
+
+    Returns:
+        JSON response với lần import gần nhất và snapshot hiện tại
+    """
+    try:
+        latest = get_rule_version()
+        snapshot = get_rule_cache(normalize_text).get_snapshot()
+        return jsonify({
+            'latest': latest,
+            'snapshot': {
+                'version': snapshot.version,
+                'ruleVersion': snapshot.rule_version,
+                'loadedAt': snapshot.loaded_at
+            }
+        }), 200
+
+    except Exception as e:
+        print(f"Error in rule version endpoint: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,97 @@
+"""
+async_admin_routes.py - Async routes quan tri (chay tren ASGI server)
+Cung API voi admin_routes.py; import va doc DB chay tren DB executor rieng.
+"""
+
+from quart import Blueprint, request, jsonify
+import config
+from services.db_executor import run_blocking
+from services.rule_cache import get_rule_cache
+from services.rule_import import RuleImportError, RuleImporter, get_rule_version, parse_rules
+from utils.text_normalizer import normalize_text
+from utils.validators import is_admin_request, parse_rule_import
+
+# Tạo Blueprint cho async admin routes
+async_admin_bp = Blueprint('async_admin', __name__)
+
+
+@async_admin_bp.before_request
+async def require_admin_token():
+    """Từ chối request không có token hợp lệ (hoặc khi admin API bị tắt)"""
+    if not is_admin_request(request.headers, config.ADMIN_API_TOKEN):
+        return jsonify({
+            'error': 'Forbidden',
+            'message': 'A valid X-Admin-Token header is required'
+        }), 403
+
+
+@async_admin_bp.route('/admin/rules/import', methods=['POST'])
+async def import_rules():
+    """
+    Import hàng loạt rule trong một transaction (async)
+
+    Query string, request body và response: giống /admin/rules/import của admin_routes.py
+    """
+    try:
+        if request.content_length and request.content_length > config.RULE_IMPORT_MAX_BYTES:
+            return jsonify({
+                'error': 'Rule file too large',
+                'message': f'Maximum size is {config.RULE_IMPORT_MAX_BYTES} bytes'
+            }), 413
+
+        try:
+            fmt, table, mode, dry_run = parse_rule_import(request.args, request.content_type)
+            rules = parse_rules(await request.get_data(as_text=True), fmt, table)
+            importer = RuleImporter(mode, rule_cache=get_rule_cache(normalize_text))
+            result = await run_blocking(
+                importer.run, rules, source=f'api:{request.remote_addr}', dry_run=dry_run
+            )
+        except RuleImportError as e:
+            return jsonify({
+                'error': 'Invalid rule set',
+                'details': e.errors
+            }), 400
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid parameter',
+                'message': str(e)
+            }), 400
+
+        return jsonify({
+            'mode': result['mode'],
+            'tables': result['tables'],
+            'version': result['version'],
+            'dryRun': result['dry_run']
+        }), 200
+
+    except Exception as e:
+        print(f"Error in rule import endpoint: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@async_admin_bp.route('/admin/rules/version', methods=['GET'])
+async def get_rules_version():
+    """
+    Phiên bản rule trong database và snapshot worker này đang dùng (async)
+    """
+    try:
+        latest = await run_blocking(get_rule_version)
+        snapshot = await run_blocking(get_rule_cache(normalize_text).get_snapshot)
+        return jsonify({
+            'latest': latest,
+            'snapshot': {
+                'version': snapshot.version,
+                'ruleVersion': snapshot.rule_version,
+                'loadedAt': snapshot.loaded_at
+            }
+        }), 200
+
+    except Exception as e:
+        print(f"Error in rule version endpoint: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,210 @@
+"""
+async_chat_routes.py - Async routes cho chat (chay tren ASGI server)
+Cung API voi chat_routes.py nhung moi request la mot coroutine tren event
+loop: LLM (Ollama) duoc await bang client async, chi cac thao tac DB chay
+tren DB executor rieng.
+"""
+
+from quart import Blueprint, Response, request, jsonify
+import config
+from services.chatbot_service import ChatbotService
+from services.db_executor import run_blocking
+from utils.deadline import deadline_scope
+from utils.helpers import deadline_error, format_sse
+from utils.validators import parse_history_page
+
+# Tạo Blueprint cho async chat routes
+async_chat_bp = Blueprint('async_chat', __name__)
+
+# Initialize chatbot service
+chatbot_service = ChatbotService()
+
+
+@async_chat_bp.route('/chat', methods=['POST'])
+async def chat():
+    """
+    Endpoint xử lý tin nhắn từ người dùng (async)
+
+    Request body:
+    {
+        "message": "Tôi bị đau đầu",
+        "sessionId": "uuid-string"
+    }
+
+    Returns:
+        JSON response với câu trả lời của bot
+    """
+    try:
+        data = await request.get_json()
+
+        if not data:
+            return jsonify({
+                'error': 'Request body is required'
+            }), 400
+
+        message = data.get('message', '').strip()
+        session_id = data.get('sessionId')
+
+        if not message:
+            return jsonify({
+                'error': 'Message is required'
+            }), 400
+
+        if not session_id:
+            return jsonify({
+                'error': 'Session ID is required'
+            }), 400
+
+        # Process message through triage service under the request deadline:
+        # LLM calls are awaited here, DB steps run on the DB executor
+        with deadline_scope(config.REQUEST_DEADLINE) as deadline:
+            try:
+                result = await chatbot_service.aprocess_message(message, session_id)
+            except Exception as e:
+                if deadline is None or not deadline.expired():
+                    raise
+                print(f"[Deadline] Chat turn exceeded its budget: {deadline.summary()}")
+                return jsonify(deadline_error(deadline, e)), 503
+
+        response = jsonify(result)
+        if deadline is not None:
+            response.headers['Server-Timing'] = deadline.server_timing()
+        return response, 200
+
+    except Exception as e:
+        print(f"Error in chat endpoint: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@async_chat_bp.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """
+    Endpoint xử lý tin nhắn, trả về câu trả lời dạng Server-Sent Events (async)
+
+    Request body và events: giống /chat/stream của chat_routes.py
+    """
+    data = await request.get_json(silent=True)
+
+    if not data:
+        return jsonify({
+            'error': 'Request body is required'
+        }), 400
+
+    message = data.get('message', '').strip()
+    session_id = data.get('sessionId')
+
+    if not message:
+        return jsonify({
+            'error': 'Message is required'
+        }), 400
+
+    if not session_id:
+        return jsonify({
+            'error': 'Session ID is required'
+        }), 400
+
+    async def generate():
+        try:
+            events = chatbot_service.astream_message(message, session_id)
+            async for event, payload in events:
+                if event in ('token', 'replace'):
+                    yield format_sse(event, {'text': payload})
+                else:
+                    yield format_sse(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            yield format_sse('error', {
+                'error': 'Internal server error',
+                'message': str(e)
+            })
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+
+@async_chat_bp.route('/chat/history/<session_id>', methods=['GET'])
+async def get_chat_history(session_id):
+    """
+    Lấy lịch sử hội thoại của một session (async)
+
+    Args:
+        session_id (str): ID của session
+
+    Query string và response: giống /chat/history của chat_routes.py
+    """
+    try:
+        if not session_id:
+            return jsonify({
+                'error': 'Session ID is required'
+            }), 400
+
+        try:
+            after_turn, limit = parse_history_page(request.args, config.HISTORY_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({
+                'error': str(e)
+            }), 400
+
+        # Formatted page from the per-session history cache
+        etag, payload = await run_blocking(
+            chatbot_service.get_history_page, session_id, after_turn, limit
+        )
+
+        # Client already has this exact page: 304 without a body
+        if request.if_none_match.contains(etag):
+            response = Response('', status=304)
+        else:
+            response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    except Exception as e:
+        print(f"Error getting chat history: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
+
+
+@async_chat_bp.route('/chat/reset', methods=['POST'])
+async def reset_chat():
+    """
+    Reset cuộc hội thoại (async)
+
+    Request body:
+    {
+        "sessionId": "uuid-string"
+    }
+
+    Returns:
+        JSON response xác nhận reset thành công
+    """
+    try:
+        data = await request.get_json()
+        session_id = data.get('sessionId') if data else None
+
+        if not session_id:
+            return jsonify({
+                'error': 'Session ID is required'
+            }), 400
+
+        await run_blocking(chatbot_service.reset_conversation, session_id)
+
+        return jsonify({
+            'message': 'Đã reset cuộc hội thoại',
+            'sessionId': session_id
+        }), 200
+
+    except Exception as e:
+        print(f"Error resetting chat: {str(e)}")
+        return jsonify({
+            'error': 'Internal server error',
+            'message': str(e)
+        }), 500
@@ -3,8 +3,12 @@ chat_routes.py - Routes xử lý chat với người dùng
 Chứa các endpoint cho tương tác chatbot
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import config
 from services.chatbot_service import ChatbotService
+from utils.deadline import deadline_scope
+from utils.helpers import deadline_error, format_sse
+from utils.validators import parse_history_page
 
 # Tạo Blueprint cho chat routes
 chat_bp = Blueprint('chat', __name__)
@@ -48,10 +52,20 @@ def chat():
                 'error': 'Session ID is required'
             }), 400
 
-        # Process message through triage service
-        result = chatbot_service.process_message(message, session_id)
-
-        return jsonify(result), 200
+        # Process message through triage service under the request deadline
+        with deadline_scope(config.REQUEST_DEADLINE) as deadline:
+            try:
+                result = chatbot_service.process_message(message, session_id)
+            except Exception as e:
+                if deadline is None or not deadline.expired():
+                    raise
+                print(f"[Deadline] Chat turn exceeded its budget: {deadline.summary()}")
+                return jsonify(deadline_error(deadline, e)), 503
+
+        response = jsonify(result)
+        if deadline is not None:
+            response.headers['Server-Timing'] = deadline.server_timing()
+        return response, 200
 
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
@@ -61,6 +75,61 @@ def chat():
         }), 500
 
 
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Endpoint xử lý tin nhắn, trả về câu trả lời dạng Server-Sent Events
+
+    Request body: giống /chat
+
+    Events:
+        token   - {"text": "..."} từng đoạn câu trả lời
+        replace - {"text": "..."} câu trả lời thay cho các token đã gửi
+                  (khi LLM dừng giữa chừng)
+        result  - các trường triage (alertLevel, departmentRecommendation, ...)
+        error   - {"error": "...", "message": "..."}
+    """
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({
+            'error': 'Request body is required'
+        }), 400
+
+    message = data.get('message', '').strip()
+    session_id = data.get('sessionId')
+
+    if not message:
+        return jsonify({
+            'error': 'Message is required'
+        }), 400
+
+    if not session_id:
+        return jsonify({
+            'error': 'Session ID is required'
+        }), 400
+
+    def generate():
+        try:
+            for event, payload in chatbot_service.stream_message(message, session_id):
+                if event in ('token', 'replace'):
+                    yield format_sse(event, {'text': payload})
+                else:
+                    yield format_sse(event, payload)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            yield format_sse('error', {
+                'error': 'Internal server error',
+                'message': str(e)
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @chat_bp.route('/chat/history/<session_id>', methods=['GET'])
 def get_chat_history(session_id):
     """
@@ -69,8 +138,13 @@ def get_chat_history(session_id):
     Args:
         session_id (str): ID của session
 
+    Query string:
+        after: turn_number cuối cùng client đã có (mặc định 0 = từ đầu)
+        limit: số turn mỗi trang (mặc định HISTORY_PAGE_SIZE)
+
     Returns:
-        JSON response với lịch sử hội thoại
+        JSON response với lịch sử hội thoại và nextCursor (None nếu hết),
+        hoặc 304 nếu If-None-Match khớp ETag của trang
     """
     try:
         if not session_id:
@@ -78,28 +152,24 @@ def get_chat_history(session_id):
                 'error': 'Session ID is required'
             }), 400
 
-        history = chatbot_service.get_conversation_history(session_id)
-
-        # Format history for frontend
-        formatted_history = []
-        for turn in history:
-            if turn['user_message']:
-                formatted_history.append({
-                    'type': 'user',
-                    'text': turn['user_message'],
-                    'timestamp': turn['timestamp']
-                })
-            if turn['bot_response']:
-                formatted_history.append({
-                    'type': 'bot',
-                    'text': turn['bot_response'],
-                    'timestamp': turn['timestamp']
-                })
+        try:
+            after_turn, limit = parse_history_page(request.args, config.HISTORY_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({
+                'error': str(e)
+            }), 400
 
-        return jsonify({
-            'sessionId': session_id,
-            'history': formatted_history
-        }), 200
+        # Formatted page from the per-session history cache
+        etag, payload = chatbot_service.get_history_page(session_id, after_turn, limit)
+
+        # Client already has this exact page: 304 without a body
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         print(f"Error getting chat history: {str(e)}")
@@ -0,0 +1,86 @@
+# run_retention.py - Move old completed sessions out of the hot tables
+#
+#   python run_retention.py report               # hot / archive sizes, eligible sessions
+#   python run_retention.py run --dry-run        # only count what would be moved
+#   python run_retention.py run [--days 90] [--mode table|jsonl] [--max-batches N]
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+from services.retention import RetentionJob
+
+
+def print_report(job):
+    """Print hot table, eligible and archive sizes"""
+    report = job.report()
+    policy = report['policy']
+    print("=" * 60)
+    print("Retention Report")
+    print("=" * 60)
+    print(f"Policy: status in {policy['statuses']}, idle > {policy['days']} days, mode={policy['mode']}")
+
+    print("\nHot tables:")
+    print(f"  {'conversations':30} {report['hot']['conversations']} rows")
+    print(f"  {'sessions':30} {report['hot']['sessions']} rows")
+    print(f"  {'oldest turn':30} {report['hot']['oldest_turn']}")
+
+    print("\nEligible for archiving:")
+    print(f"  {'sessions':30} {report['eligible']['sessions']}")
+    print(f"  {'turns':30} {report['eligible']['turns']}")
+
+    print("\nArchive:")
+    for key, value in report['archive'].items():
+        print(f"  {key:30} {value}")
+
+
+def run_job(job, dry_run=False, max_batches=None):
+    """Archive eligible sessions (or only count them with --dry-run)"""
+    print("=" * 60)
+    print(f"Retention Job ({job.mode}, idle > {job.days} days)" + (" - DRY RUN" if dry_run else ""))
+    print("=" * 60)
+
+    if dry_run:
+        eligible = job.count_eligible()
+        print(f"Would archive {eligible['sessions']} sessions ({eligible['turns']} turns)")
+        return True
+
+    result = job.run(max_batches=max_batches)
+    print("-" * 60)
+    print(f"Archived {result['sessions']} sessions ({result['turns']} turns) "
+          f"in {result['batches']} batches, {result['elapsed_s']}s")
+    for path in result['files']:
+        print(f"  {path}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive old completed conversations')
+    parser.add_argument('command', choices=['run', 'report'], help='Run the job or print a report')
+    parser.add_argument('--days', type=int, help='Archive sessions idle for more than this many days')
+    parser.add_argument('--mode', choices=RetentionJob.MODES, help='Archive tables or JSONL.gz files')
+    parser.add_argument('--archive-dir', help='Directory for JSONL.gz files (--mode jsonl)')
+    parser.add_argument('--batch-size', type=int, help='Sessions per transaction')
+    parser.add_argument('--status', action='append', dest='statuses',
+                        help='Conversation status to archive (repeatable, default: completed)')
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    parser.add_argument('--dry-run', action='store_true', help='Only count eligible sessions')
+    args = parser.parse_args()
+
+    job = RetentionJob(
+        days=args.days,
+        batch_size=args.batch_size,
+        mode=args.mode,
+        archive_dir=args.archive_dir,
+        statuses=args.statuses
+    )
+
+    if args.command == 'report':
+        print_report(job)
+    else:
+        run_job(job, dry_run=args.dry_run, max_batches=args.max_batches)
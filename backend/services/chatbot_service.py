@@ -5,7 +5,23 @@ Following the spec: 5 turns max, red flags first, score threshold = 7
 
 import json
 import re
+import config
+from models.conversation import Conversation
 from models.database import Database
+from models.session import Session
+from services.context_builder import append_history
+from services.embedding_index import get_embedding_index
+from services.history_cache import get_history_cache
+from services.io_steps import Step, arun_steps, blocking, run_steps
+from services.llm_dispatcher import PRIORITY_ROUTINE, PRIORITY_URGENT, get_llm_dispatcher
+from services.llm_extractor import get_llm_extractor
+from services.llm_triage import get_llm_triage
+from services.rule_cache import get_rule_cache
+from services.session_store import get_session_store
+from services.turn_writer import get_turn_writer
+from utils.deadline import deadline_scope, stage, stage_budget
+from utils.helpers import format_history
+from utils.text_normalizer import normalize_text
 
 
 class ChatbotService:
@@ -15,62 +31,83 @@ class ChatbotService:
 
     def __init__(self):
         """Initialize with Vietnamese keyword mappings"""
-        # Vietnamese text normalization
-        self.accent_map = {
-            'à': 'a', 'á': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a',
-            'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ẳ': 'a', 'ẵ': 'a', 'ặ': 'a',
-            'â': 'a', 'ầ': 'a', 'ấ': 'a', 'ẩ': 'a', 'ẫ': 'a', 'ậ': 'a',
-            'è': 'e', 'é': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
-            'ê': 'e', 'ề': 'e', 'ế': 'e', 'ể': 'e', 'ễ': 'e', 'ệ': 'e',
-            'ì': 'i', 'í': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
-            'ò': 'o', 'ó': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o',
-            'ô': 'o', 'ồ': 'o', 'ố': 'o', 'ổ': 'o', 'ỗ': 'o', 'ộ': 'o',
-            'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ở': 'o', 'ỡ': 'o', 'ợ': 'o',
-            'ù': 'u', 'ú': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
-            'ư': 'u', 'ừ': 'u', 'ứ': 'u', 'ử': 'u', 'ữ': 'u', 'ự': 'u',
-            'ỳ': 'y', 'ý': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
-            'đ': 'd',
-            'À': 'A', 'Á': 'A', 'Ả': 'A', 'Ã': 'A', 'Ạ': 'A',
-            'Ă': 'A', 'Ằ': 'A', 'Ắ': 'A', 'Ẳ': 'A', 'Ẵ': 'A', 'Ặ': 'A',
-            'Â': 'A', 'Ầ': 'A', 'Ấ': 'A', 'Ẩ': 'A', 'Ẫ': 'A', 'Ậ': 'A',
-            'È': 'E', 'É': 'E', 'Ẻ': 'E', 'Ẽ': 'E', 'Ẹ': 'E',
-            'Ê': 'E', 'Ề': 'E', 'Ế': 'E', 'Ể': 'E', 'Ễ': 'E', 'Ệ': 'E',
-            'Ì': 'I', 'Í': 'I', 'Ỉ': 'I', 'Ĩ': 'I', 'Ị': 'I',
-            'Ò': 'O', 'Ó': 'O', 'Ỏ': 'O', 'Õ': 'O', 'Ọ': 'O',
-            'Ô': 'O', 'Ồ': 'O', 'Ố': 'O', 'Ổ': 'O', 'Ỗ': 'O', 'Ộ': 'O',
-            'Ơ': 'O', 'Ờ': 'O', 'Ớ': 'O', 'Ở': 'O', 'Ỡ': 'O', 'Ợ': 'O',
-            'Ù': 'U', 'Ú': 'U', 'Ủ': 'U', 'Ũ': 'U', 'Ụ': 'U',
-            'Ư': 'U', 'Ừ': 'U', 'Ứ': 'U', 'Ử': 'U', 'Ữ': 'U', 'Ự': 'U',
-            'Ỳ': 'Y', 'Ý': 'Y', 'Ỷ': 'Y', 'Ỹ': 'Y', 'Ỵ': 'Y',
-            'Đ': 'D'
-        }
-
         # Keywords for context detection
         self.pregnant_keywords = ['mang thai', 'co thai', 'bau', 'thai nghen']
         self.severity_keywords = ['du doi', 'rat dau', 'qua dau', 'khong chiu noi', 'nang', 'rat nang']
 
+        # Shared snapshot of rule tables (loaded once, refreshed in background)
+        self.rule_cache = get_rule_cache(normalize_text)
+
+        # Shared session state cache (read-through to the sessions table)
+        self.session_store = get_session_store()
+
+        # Optional write-behind persistence of turns (None = synchronous INSERT)
+        self.turn_writer = get_turn_writer()
+
+        # Rendered history pages (ETag), invalidated when a turn is saved
+        self.history_cache = get_history_cache()
+
+        # Ollama requests go through the shared dispatcher (priority lanes, single-flight)
+        self.llm_dispatcher = get_llm_dispatcher()
+
+        # Optional LLM fallback when the rules are not confident (None = rules only)
+        self.llm_triage = get_llm_triage()
+
+        # Optional LLM symptom extraction for paraphrases (None = keywords only)
+        self.llm_extractor = get_llm_extractor()
+
+        # Optional vector retrieval when no keyword overlaps (None = disabled)
+        self.embedding_index = get_embedding_index()
+
     # =========================================================================
     # HELPER METHODS
     # =========================================================================
 
     def normalize_text(self, text):
-        """Remove Vietnamese accents for matching"""
-        if not text:
-            return ''
-        text = text.lower()
-        return ''.join(self.accent_map.get(c, c) for c in text)
-
-    def get_last_turn(self, session_id):
-        """Get the last conversation turn for this session"""
-        query = """
-        SELECT TOP 1 turn_number, extracted_symptoms, patient_age, patient_gender,
-               collected_duration, collected_severity, is_pregnant, is_pediatric,
-               is_severe, current_score, conversation_status, last_question_type
-        FROM conversations
-        WHERE session_id = ?
-        ORDER BY turn_number DESC
+        """Remove Vietnamese accents for matching (precomputed translation table)"""
+        return normalize_text(text)
+
+    def load_session_state(self, session_id):
+        """
+        Get the session state (turn number, symptoms, patient context).
+        Served from the session store (checked against the sessions row when
+        SESSION_CACHE_VALIDATE is on); falls back to the full sessions row.
+        """
+        validate = self._session_state_is_current if config.SESSION_CACHE_VALIDATE else None
+        with stage('session'), Database.unit_of_work():
+            return self.session_store.get(session_id, self._load_session_state_from_db, validate)
+
+    def _session_state_is_current(self, session_id, state):
         """
-        return Database.execute_query(query, (session_id,), fetch_one=True)
+        The session store is per process: another worker may have saved a
+        later turn of the session, or reset it, since this one cached it
+        """
+        turn_count = Session.get_turn_count(session_id)
+        if turn_count is None:
+            # Not saved yet is fine while this process still has it queued
+            return self.turn_writer is not None and self.turn_writer.has_pending(session_id)
+        return turn_count <= state['turn_number']
+
+    def _load_session_state_from_db(self, session_id):
+        """Rebuild the session state from its sessions row (primary key seek)"""
+        last_turn = Session.get(session_id)
+        if not last_turn:
+            return None
+
+        return {
+            'turn_number': last_turn['turn_count'],
+            'symptoms': json.loads(last_turn['extracted_symptoms']) if last_turn['extracted_symptoms'] else [],
+            'context': {
+                'age': last_turn['patient_age'],
+                'gender': last_turn['patient_gender'],
+                'duration': last_turn['collected_duration'],
+                'severity': last_turn['collected_severity'],
+                'is_pregnant': last_turn['is_pregnant'] or False,
+                'is_pediatric': last_turn['is_pediatric'] or False,
+                'is_severe': last_turn['is_severe'] or False,
+                'last_question_type': last_turn.get('last_question_type')
+            }
+        }
 
     def extract_age(self, message):
         """Extract age from message"""
@@ -142,69 +179,30 @@ class ChatbotService:
         """
         STEP 1: Check red_flags table for emergency situations
         Returns red_flag info if matched, None otherwise
-        """
-        query = """
-        SELECT id, flag_name, symptom_pattern, esi_level, warning_message,
-               recommended_department
-        FROM red_flags
-        WHERE is_active = 1
-        ORDER BY esi_level ASC
-        """
-        red_flags = Database.execute_query(query)
-
-        # Combine current message with all accumulated symptoms
-        combined_text = message + ' ' + ' '.join(all_symptoms)
-
-        for flag in red_flags:
-            pattern = json.loads(flag['symptom_pattern'])
-            primary_keywords = pattern.get('primary', [])
-            secondary_keywords = pattern.get('secondary', [])
-
-            # Check primary keywords
-            primary_match = False
-            for kw in primary_keywords:
-                if self.normalize_text(kw) in combined_text:
-                    primary_match = True
-                    break
-
-            if not primary_match:
-                continue
-
-            # ESI 1: Primary match is enough
-            if flag['esi_level'] == 1:
-                return flag
-
-            # ESI 2: Need secondary match too
-            if flag['esi_level'] == 2:
-                for kw in secondary_keywords:
-                    if self.normalize_text(kw) in combined_text:
-                        return flag
 
-        return None
+        All flags are compiled into one matcher, so the message and the
+        accumulated symptoms are scanned once regardless of the flag count.
+        """
+        matcher = self.rule_cache.get_snapshot().red_flag_matcher
+        norm_symptoms = [self.normalize_text(s) for s in all_symptoms]
+        return matcher.match(message, norm_symptoms)
 
     def extract_symptoms_from_rules(self, message):
         """
         Extract symptoms by matching against symptom_rules keywords
         """
-        query = """
-        SELECT DISTINCT symptom_keywords
-        FROM symptom_rules
-        WHERE is_active = 1
-        """
-        rules = Database.execute_query(query)
+        snapshot = self.rule_cache.get_snapshot()
 
-        if not rules:
+        if not snapshot.keywords:
             print(f"[DEBUG] No symptom rules found in database!")
             return []
 
+        # Single pass over the message with the keyword automaton
         found_symptoms = []
-        for rule in rules:
-            keywords = json.loads(rule['symptom_keywords'])
-            for kw in keywords:
-                norm_kw = self.normalize_text(kw)
-                if norm_kw in message and kw not in found_symptoms:
-                    found_symptoms.append(kw)
-                    print(f"[DEBUG] Matched keyword '{kw}' in message")
+        for start, end, kw in snapshot.find_keyword_matches(message):
+            if kw not in found_symptoms:
+                found_symptoms.append(kw)
+                print(f"[DEBUG] Matched keyword '{kw}' in message at [{start}:{end}]")
 
         return found_symptoms
 
@@ -219,71 +217,28 @@ class ChatbotService:
         - OB/GYN (Khoa San Phu Khoa): Only for female patients
         - ENT (Khoa Tai Mui Hong): For all patients
         """
+        return run_steps(self._department_score_steps(all_symptoms, context))
+
+    def _department_score_steps(self, all_symptoms, context):
+        """calculate_department_scores as a step generator (services/io_steps.py)"""
         if not all_symptoms:
             return {}
 
-        query = """
-        SELECT sr.department_id, sr.symptom_keywords, d.name_vi, d.name_en
-        FROM symptom_rules sr
-        JOIN departments d ON sr.department_id = d.id
-        WHERE sr.is_active = 1 AND d.is_active = 1
-        """
-        rules = Database.execute_query(query)
+        index = self.rule_cache.get_snapshot().department_index
 
-        if not rules:
+        if not index.departments:
             return {}
 
-        # Get patient context
-        is_pediatric = context.get('is_pediatric', False)
-        patient_age = context.get('age')
-        patient_gender = context.get('gender')
-        is_pregnant = context.get('is_pregnant', False)
+        # Filter departments based on patient context
+        dept_names = self.filter_departments(index.departments, context)
+        allowed_departments = set(dept_names)
 
         # Normalize symptoms for matching
         norm_symptoms = [self.normalize_text(s) for s in all_symptoms]
 
-        # Track which keywords have been matched for each department (avoid double counting)
-        dept_matched_keywords = {}
-        dept_names = {}
-
-        for rule in rules:
-            dept_id = rule['department_id']
-            dept_name = rule['name_vi']
-            dept_name_en = rule.get('name_en', '')
-            keywords = json.loads(rule['symptom_keywords'])
-
-            # =========================================================
-            # FILTER DEPARTMENTS BASED ON PATIENT CONTEXT
-            # =========================================================
-
-            # Pediatrics (Khoa Nhi) - Only for children (age < 15)
-            if 'Nhi' in dept_name or 'Pediatric' in dept_name_en:
-                if patient_age is not None and patient_age >= 15:
-                    print(f"[DEBUG] Skipping Pediatrics for adult patient (age={patient_age})")
-                    continue  # Skip this rule for adult patients
-
-            # OB/GYN (Khoa San Phu Khoa) - Only for female patients
-            if 'San' in dept_name or 'Phu Khoa' in dept_name or 'Obstetric' in dept_name_en or 'Gynecology' in dept_name_en:
-                if patient_gender == 'nam':  # Male
-                    print(f"[DEBUG] Skipping OB/GYN for male patient")
-                    continue  # Skip this rule for male patients
-
-            # =========================================================
-
-            dept_names[dept_id] = dept_name
-
-            if dept_id not in dept_matched_keywords:
-                dept_matched_keywords[dept_id] = set()
-
-            # Check each keyword in this rule
-            for kw in keywords:
-                norm_kw = self.normalize_text(kw)
-                # Check if this keyword matches any symptom
-                for norm_sym in norm_symptoms:
-                    # Exact match OR keyword contains symptom OR symptom contains keyword
-                    if norm_kw == norm_sym or norm_kw in norm_sym or norm_sym in norm_kw:
-                        dept_matched_keywords[dept_id].add(kw)
-                        break
+        # Inverted index lookup: exact match OR keyword contains symptom OR
+        # symptom contains keyword, one lookup per symptom
+        dept_matched_keywords = index.match(norm_symptoms, allowed_departments)
 
         # Calculate final scores
         dept_scores = {}
@@ -298,52 +253,100 @@ class ChatbotService:
                     'matched_keywords': list(matched_kws)
                 }
 
+        # No keyword overlap at all: fall back to embedding similarity
+        if (not dept_scores and self.embedding_index is not None
+                and stage_budget('embedding', reserve=config.DEADLINE_RESERVE) is not None):
+            similar = yield from self._similar_department_steps(all_symptoms, allowed_departments)
+            for dept_id, similarity in similar:
+                # A similar department counts as one keyword match
+                dept_scores[dept_id] = {
+                    'department_id': dept_id,
+                    'name_vi': dept_names[dept_id],
+                    'score': 2,
+                    'match_count': 0,
+                    'matched_keywords': [],
+                    'similarity': round(similarity, 3)
+                }
+
         return dept_scores
 
-    def get_department_info(self, department_id):
-        """Query full department information"""
-        query = """
-        SELECT id, name_vi, name_en, room_number, floor, building,
-               doctor_name, description, working_hours
-        FROM departments
-        WHERE id = ? AND is_active = 1
+    def find_similar_departments(self, symptoms, allowed_departments):
         """
-        return Database.execute_query(query, (department_id,), fetch_one=True)
+        Top-k departments by embedding similarity (services/embedding_index.py)
 
-    def get_quick_replies(self, trigger_type, trigger_value):
-        """Query quick replies from database"""
-        query = """
-        SELECT replies_json
-        FROM quick_reply_rules
-        WHERE trigger_type = ? AND trigger_value = ? AND is_active = 1
-        ORDER BY priority DESC
+        Returns:
+            list: [(department_id, similarity)] above EMBEDDING_MIN_SIMILARITY
+        """
+        return run_steps(self._similar_department_steps(symptoms, allowed_departments))
+
+    def _similar_department_steps(self, symptoms, allowed_departments):
+        """find_similar_departments as a step generator"""
+        index = self.embedding_index
+        if not index.refresh(self.rule_cache.get_snapshot()):
+            # Index is (re)building in the background: keyword matching only
+            print("[DEBUG] Embedding index not ready, keyword matching only")
+            return []
+        try:
+            with stage('embedding'):
+                ranked = yield Step(
+                    index.top_departments, index.atop_departments,
+                    symptoms, config.EMBEDDING_TOP_K, allowed_departments
+                )
+        except Exception as e:
+            print(f"[DEBUG] Embedding retrieval failed: {str(e)}")
+            return []
+        print(f"[DEBUG] Embedding similarity: {ranked}")
+        return [
+            (dept_id, similarity) for dept_id, similarity in ranked
+            if similarity >= config.EMBEDDING_MIN_SIMILARITY
+        ]
+
+    def filter_departments(self, departments, context):
+        """
+        Departments a patient may be sent to:
+        - Pediatrics (Khoa Nhi): Only for age < 15
+        - OB/GYN (Khoa San Phu Khoa): Only for female patients
+
+        Args:
+            departments (dict): {department_id: (name_vi, name_en)}
+            context (dict): Patient context
+
+        Returns:
+            dict: {department_id: name_vi} of the allowed departments
         """
-        result = Database.execute_query(query, (trigger_type, trigger_value), fetch_one=True)
+        # Get patient context
+        patient_age = context.get('age')
+        patient_gender = context.get('gender')
 
-        if result and result.get('replies_json'):
-            try:
-                return json.loads(result['replies_json'])
-            except:
-                pass
-        return []
+        dept_names = {}
+        for dept_id, (dept_name, dept_name_en) in departments.items():
+            # Pediatrics (Khoa Nhi) - Only for children (age < 15)
+            if 'Nhi' in dept_name or 'Pediatric' in dept_name_en:
+                if patient_age is not None and patient_age >= 15:
+                    print(f"[DEBUG] Skipping Pediatrics for adult patient (age={patient_age})")
+                    continue  # Skip this department for adult patients
+
+            # OB/GYN (Khoa San Phu Khoa) - Only for female patients
+            if 'San' in dept_name or 'Phu Khoa' in dept_name or 'Obstetric' in dept_name_en or 'Gynecology' in dept_name_en:
+                if patient_gender == 'nam':  # Male
+                    print(f"[DEBUG] Skipping OB/GYN for male patient")
+                    continue  # Skip this department for male patients
+
+            dept_names[dept_id] = dept_name
+
+        return dept_names
+
+    def get_department_info(self, department_id):
+        """Get full department information from the rule snapshot"""
+        return self.rule_cache.get_snapshot().get_department(department_id)
+
+    def get_quick_replies(self, trigger_type, trigger_value):
+        """Get quick replies from the rule snapshot"""
+        return self.rule_cache.get_snapshot().get_quick_replies(trigger_type, trigger_value)
 
     def get_follow_up_question(self, department_id):
-        """Get follow-up questions from symptom_rules"""
-        query = """
-        SELECT follow_up_questions
-        FROM symptom_rules
-        WHERE department_id = ? AND is_active = 1 AND follow_up_questions IS NOT NULL
-        """
-        result = Database.execute_query(query, (department_id,), fetch_one=True)
-
-        if result and result.get('follow_up_questions'):
-            try:
-                questions = json.loads(result['follow_up_questions'])
-                if questions:
-                    return questions[0]  # Return first question
-            except:
-                pass
-        return None
+        """Get the first follow-up question of a department from the rule snapshot"""
+        return self.rule_cache.get_snapshot().get_follow_up_question(department_id)
 
     # =========================================================================
     # ESI CLASSIFICATION
@@ -401,17 +404,50 @@ class ChatbotService:
     # =========================================================================
 
     def save_turn(self, session_id, turn_number, user_message, bot_response,
-                  symptoms, context, esi_level, department_id, status, score):
-        """Save one conversation turn as new row"""
+                  symptoms, context, esi_level, department_id, status, score,
+                  history=None):
+        """
+        Save one conversation turn as new row
+
+        history (recent patient messages for LLM prompts) is only kept in
+        the session store, it is not a column of conversations.
+        """
+        with stage('save'):
+            return self._save_turn(
+                session_id, turn_number, user_message, bot_response, symptoms,
+                context, esi_level, department_id, status, score, history
+            )
+
+    def save_response(self, session_id, turn_number, bot_response):
+        """
+        Replace the saved answer of a turn with the text the patient was
+        shown (a streamed paraphrase); best effort, the turn itself is saved
+        """
+        try:
+            with stage('save'):
+                if self.turn_writer:
+                    # Queued behind the turn itself
+                    self.turn_writer.amend(session_id, turn_number, bot_response)
+                else:
+                    with Database.unit_of_work():
+                        Conversation.update_response(session_id, turn_number, bot_response)
+                Database.after_commit(lambda: self.history_cache.invalidate(session_id))
+        except Exception as e:
+            print(f"[DEBUG] Could not save the streamed response: {str(e)}")
+
+    def _save_turn(self, session_id, turn_number, user_message, bot_response,
+                   symptoms, context, esi_level, department_id, status, score, history):
+        """
+        Append the turn and upsert the sessions row in one transaction (or hand
+        both to the write-behind queue), then update the session store
+        """
         query = """
         INSERT INTO conversations (
             session_id, turn_number, user_message, bot_response,
-            extracted_symptoms, patient_age, patient_gender,
-            collected_duration, collected_severity,
-            is_pregnant, is_pediatric, is_severe,
-            current_esi_level, recommended_department_id,
-            conversation_status, current_score, last_question_type
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            extracted_symptoms, current_esi_level, recommended_department_id,
+            conversation_status, current_score
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
 
         params = (
@@ -420,30 +456,270 @@ class ChatbotService:
             user_message,
             bot_response,
             json.dumps(symptoms, ensure_ascii=False) if symptoms else None,
-            context.get('age'),
-            context.get('gender'),
-            context.get('duration'),
-            context.get('severity'),
-            context.get('is_pregnant', False),
-            context.get('is_pediatric', False),
-            context.get('is_severe', False),
             esi_level,
             department_id,
             status,
-            score,
-            context.get('last_question_type')
+            score
+        )
+        session_params = Session.build_params(
+            session_id, turn_number, symptoms, context, esi_level, department_id, status, score
         )
 
-        return Database.execute_update(query, params)
+        if self.turn_writer:
+            # Acknowledge now, the turn is spooled and written in the next batch
+            self.turn_writer.submit(params, session_params)
+            row_id = None
+        else:
+            with Database.unit_of_work():
+                Session.upsert(session_params)
+                row_id = Database.execute_insert(query, params)
+
+        state = {
+            'turn_number': turn_number,
+            'symptoms': list(symptoms) if symptoms else [],
+            'context': dict(context),
+            'history': list(history) if history else []
+        }
+
+        def update_caches():
+            # Keep the cached session state in step with the saved turn
+            self.session_store.put(session_id, state)
+            self.history_cache.invalidate(session_id)
+
+        # Only once the turn is visible to other connections (the outer unit
+        # of work commits); with write-behind the turn is acknowledged now
+        Database.after_commit(update_caches)
+
+        return row_id
 
     # =========================================================================
     # MAIN PROCESSING LOGIC
     # =========================================================================
 
     def process_message(self, user_message, session_id):
+        """
+        Process one chat turn. The state read and the turn write each run in
+        a short unit of work of their own, so no pooled connection is held
+        while the LLM stages in between wait on Ollama.
+
+        The turn runs under the request deadline (REQUEST_DEADLINE, or the
+        caller's deadline_scope): DB waits are bounded by the time left and
+        the optional LLM stages are skipped when it is nearly spent.
+        """
+        try:
+            with deadline_scope(config.REQUEST_DEADLINE):
+                return run_steps(self._turn_steps(user_message, session_id))
+        except Exception:
+            # The turn was rolled back, the cached state may be ahead of the DB
+            self.session_store.invalidate(session_id)
+            raise
+
+    async def aprocess_message(self, user_message, session_id):
+        """
+        process_message for the ASGI server: the turn runs on the event loop,
+        LLM calls are awaited on the async Ollama client and only the DB
+        steps go to the DB executor (services/db_executor.py)
+        """
+        try:
+            with deadline_scope(config.REQUEST_DEADLINE):
+                return await arun_steps(self._turn_steps(user_message, session_id))
+        except Exception:
+            self.session_store.invalidate(session_id)
+            raise
+
+    def stream_message(self, user_message, session_id):
+        """
+        Streaming variant of process_message
+
+        The triage decision is made by the rule engine as usual. The answer
+        text is then streamed: paraphrased token by token by the LLM when
+        LLM_STREAM_RESPONSES is enabled, otherwise (or if the LLM fails, the
+        request deadline is nearly spent, or for red-flag alerts, which are
+        always shown verbatim) sent as is. The stream runs under the same
+        request deadline: it gets what is left of it (minus DEADLINE_RESERVE)
+        and at most LLM_STREAM_NUM_PREDICT tokens.
+
+        A finished paraphrase replaces the saved answer of the turn, so the
+        history shows what the patient saw. One cut off mid-stream (LLM
+        error, deadline) is not kept: the rule text stays the response and
+        ('replace', text) tells the client to swap it in for the tokens
+        already sent.
+
+        Yields:
+            tuple: ('token', text) for each text chunk, ('replace', text) after
+                   a broken paraphrase, then ('result', dict) with the
+                   structured triage fields
+        """
+        with deadline_scope(config.REQUEST_DEADLINE):
+            result = self.process_message(user_message, session_id)
+            text = result['response']
+            timeout = self._paraphrase_budget(result)
+
+            if timeout is not None:
+                chunks = []
+                finished = False
+                try:
+                    with stage('llm_stream'):
+                        tokens = self.llm_dispatcher.stream_chat(
+                            self._paraphrase_messages(text),
+                            options={'num_predict': config.LLM_STREAM_NUM_PREDICT},
+                            priority=self.get_llm_priority(session_id, user_message),
+                            timeout=timeout
+                        )
+                        for token in tokens:
+                            chunks.append(token)
+                            yield 'token', token
+                    finished = True
+                except Exception as e:
+                    print(f"[DEBUG] LLM streaming failed, sending rule response: {str(e)}")
+                if finished and chunks:
+                    result = dict(result, response=''.join(chunks))
+                    self.save_response(session_id, result['turnNumber'], result['response'])
+                    yield 'result', result
+                    return
+                if chunks:
+                    yield 'replace', text
+                    yield 'result', result
+                    return
+
+            yield 'token', text
+            yield 'result', result
+
+    async def astream_message(self, user_message, session_id):
+        """stream_message for the ASGI server (async generator, same events)"""
+        with deadline_scope(config.REQUEST_DEADLINE):
+            result = await self.aprocess_message(user_message, session_id)
+            text = result['response']
+            timeout = self._paraphrase_budget(result)
+
+            if timeout is not None:
+                chunks = []
+                finished = False
+                try:
+                    with stage('llm_stream'):
+                        tokens = self.llm_dispatcher.astream_chat(
+                            self._paraphrase_messages(text),
+                            options={'num_predict': config.LLM_STREAM_NUM_PREDICT},
+                            priority=self.get_llm_priority(session_id, user_message),
+                            timeout=timeout
+                        )
+                        async for token in tokens:
+                            chunks.append(token)
+                            yield 'token', token
+                    finished = True
+                except Exception as e:
+                    print(f"[DEBUG] LLM streaming failed, sending rule response: {str(e)}")
+                if finished and chunks:
+                    result = dict(result, response=''.join(chunks))
+                    await blocking(
+                        self.save_response, session_id, result['turnNumber'], result['response']
+                    ).arun()
+                    yield 'result', result
+                    return
+                if chunks:
+                    yield 'replace', text
+                    yield 'result', result
+                    return
+
+            yield 'token', text
+            yield 'result', result
+
+    def _paraphrase_budget(self, result):
+        """
+        Time the paraphrase stream may take: what is left of the request
+        deadline minus DEADLINE_RESERVE (None = send the rule text as is)
+        """
+        if not config.LLM_STREAM_RESPONSES or result.get('alertLevel'):
+            return None
+        return stage_budget(
+            'llm_stream', self.llm_dispatcher.queue_timeout,
+            config.DEADLINE_RESERVE, config.DEADLINE_LLM_MIN_REMAINING
+        )
+
+    def get_llm_priority(self, session_id, user_message):
+        """
+        LLM queue lane for a session: urgent when the patient reports severe
+        pain, is pregnant or is a child, so their requests never wait behind
+        routine ones
+
+        Returns:
+            int: PRIORITY_URGENT or PRIORITY_ROUTINE
+        """
+        state = self.session_store.get(session_id)
+        context = state['context'] if state else {}
+        return self._llm_priority_for(context, self.normalize_text(user_message))
+
+    def _llm_priority_for(self, context, norm_message):
+        """LLM queue lane from a patient context and a normalized message"""
+        if context.get('is_severe') or context.get('is_pregnant') or context.get('is_pediatric'):
+            return PRIORITY_URGENT
+        if any(keyword in norm_message for keyword in self.severity_keywords):
+            return PRIORITY_URGENT
+        return PRIORITY_ROUTINE
+
+    def escalate_to_llm(self, user_message, norm_message, symptoms, context, history=None,
+                        escalated=False):
+        """
+        Hybrid triage: ask the LLM for a department when the rules could not
+        decide (strict timeout, circuit breaker, see services/llm_triage.py).
+        The prompt is a session summary plus the recent patient messages,
+        trimmed to LLM_PROMPT_TOKEN_BUDGET (services/context_builder.py).
+        escalated=True when the turn already asked once (counted once).
+
+        Returns:
+            dict: {'department_id', 'confidence', 'symptoms'} or None
+        """
+        return run_steps(self._escalate_steps(
+            user_message, norm_message, symptoms, context, history, escalated
+        ))
+
+    def _escalate_steps(self, user_message, norm_message, symptoms, context, history,
+                        escalated=False):
+        """Departments allowed for the patient, then LLMTriage.classify (step generator)"""
+        with stage('llm_triage'):
+            return (yield from self._classify_steps(
+                user_message, norm_message, symptoms, context, history, escalated
+            ))
+
+    def _classify_steps(self, user_message, norm_message, symptoms, context, history, escalated):
+        snapshot = self.rule_cache.get_snapshot()
+        departments = self.filter_departments(
+            {
+                dept_id: (dept['name_vi'], dept.get('name_en') or '')
+                for dept_id, dept in snapshot.departments.items()
+            },
+            context
+        )
+        return (yield from self.llm_triage.classify_steps(
+            user_message, symptoms, context, departments,
+            priority=self._llm_priority_for(context, norm_message),
+            history=history,
+            escalated=escalated
+        ))
+
+    def _paraphrase_messages(self, text):
+        """Prompt asking the LLM to rephrase a rule-based answer for the patient"""
+        return [
+            {
+                'role': 'system',
+                'content': (
+                    'Ban la tro ly tiep don cua benh vien. Viet lai cau tra loi duoi day '
+                    'bang tieng Viet than thien, ngan gon. Giu nguyen moi thong tin '
+                    '(ten khoa, phong, tang, toa, bac si, gio lam viec, cau hoi). '
+                    'Khong them chan doan hay loi khuyen moi.'
+                )
+            },
+            {'role': 'user', 'content': text}
+        ]
+
+    def _turn_steps(self, user_message, session_id):
         """
         Main triage logic - 5 turns max, red flags first, threshold = 7
 
+        A step generator (services/io_steps.py): the session read, the LLM
+        stages and the turn write are yielded as steps, so the same logic
+        runs blocking (process_message) or on the event loop (aprocess_message).
+
         Flow (5 turns):
         Turn 1: Symptoms
         Turn 2: Age
@@ -454,33 +730,27 @@ class ChatbotService:
         # Normalize message
         norm_message = self.normalize_text(user_message)
 
-        # Get last turn context
-        last_turn = self.get_last_turn(session_id)
+        # Get session context (cached, read-through to the last turn)
+        state = yield blocking(self.load_session_state, session_id)
 
-        if last_turn:
-            turn_number = last_turn['turn_number'] + 1
-            prev_symptoms = json.loads(last_turn['extracted_symptoms']) if last_turn['extracted_symptoms'] else []
-            # Check if pregnancy was already asked (last_question_type was 'pregnancy' in ANY previous turn)
-            last_q_type = last_turn.get('last_question_type')
-            context = {
-                'age': last_turn['patient_age'],
-                'gender': last_turn['patient_gender'],
-                'duration': last_turn['collected_duration'],
-                'severity': last_turn['collected_severity'],
-                'is_pregnant': last_turn['is_pregnant'] or False,
-                'is_pediatric': last_turn['is_pediatric'] or False,
-                'is_severe': last_turn['is_severe'] or False,
-                'last_question_type': last_q_type
-            }
+        if state:
+            turn_number = state['turn_number'] + 1
+            prev_symptoms = state['symptoms']
+            context = state['context']
+            history = state.get('history') or []
         else:
             turn_number = 1
             prev_symptoms = []
+            history = []
             context = {
                 'age': None, 'gender': None, 'duration': None, 'severity': None,
                 'is_pregnant': False, 'is_pediatric': False, 'is_severe': False,
                 'last_question_type': None
             }
 
+        # Recent patient messages for LLM prompts (capped at MAX_CONVERSATION_HISTORY)
+        history = append_history(history, user_message)
+
         # Extract new information from current message
         new_age = self.extract_age(norm_message)
         new_gender = self.extract_gender(norm_message)
@@ -511,8 +781,23 @@ class ChatbotService:
 
         # Extract symptoms from current message
         new_symptoms = self.extract_symptoms_from_rules(norm_message)
+
+        # LLM extraction catches paraphrases, only while the patient describes symptoms
+        if (self.llm_extractor
+                and context['last_question_type'] in (None, 'symptoms', 'follow_up')
+                and len(norm_message.split()) >= 2):
+            with stage('llm_extraction'):
+                llm_symptoms = yield from self.llm_extractor.extract_steps(
+                    norm_message, self.rule_cache.get_snapshot(),
+                    priority=self._llm_priority_for(context, norm_message)
+                )
+            new_symptoms += [s for s in llm_symptoms if s not in new_symptoms]
+
         all_symptoms = list(set(prev_symptoms + new_symptoms))
 
+        if self.llm_triage:
+            self.llm_triage.record_turn()
+
         # =====================================================================
         # STEP 1: CHECK RED FLAGS (Highest Priority)
         # =====================================================================
@@ -521,15 +806,18 @@ class ChatbotService:
         if red_flag:
             response = red_flag['warning_message']
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
                 all_symptoms, context, red_flag['esi_level'],
-                None, 'completed', 10
+                None, 'completed', 10,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': 'danger' if red_flag['esi_level'] == 1 else 'warning',
                 'suggestedDepartment': red_flag['recommended_department'],
                 'confidence': 1.0,
@@ -538,10 +826,23 @@ class ChatbotService:
                 'conversationStatus': 'completed'
             }
 
+        # LLM fallback: the patient described symptoms but no keyword matched
+        llm_result = None
+        escalated = False
+        if (self.llm_triage and not all_symptoms
+                and context['last_question_type'] in (None, 'symptoms')
+                and len(norm_message.split()) >= 2):
+            llm_result = yield from self._escalate_steps(
+                user_message, norm_message, all_symptoms, context, history
+            )
+            escalated = True
+            if llm_result and llm_result['department_id'] is not None:
+                all_symptoms = [self.normalize_text(s) for s in llm_result['symptoms']]
+
         # =====================================================================
         # STEP 2: CALCULATE SCORES (with patient context filtering)
         # =====================================================================
-        dept_scores = self.calculate_department_scores(all_symptoms, context)
+        dept_scores = yield from self._department_score_steps(all_symptoms, context)
 
         # Debug: Print scoring info
         print(f"[DEBUG] Turn {turn_number}")
@@ -600,6 +901,22 @@ class ChatbotService:
                 context['severity'] is not None
             )
 
+        # =====================================================================
+        # LLM FALLBACK: at a decision point the rules are below threshold
+        # =====================================================================
+        triage_source = 'rules'
+        at_decision_point = has_all_required_info or turn_number >= MAX_TURNS
+        if self.llm_triage and best_score < THRESHOLD and at_decision_point:
+            # At most one answer per turn: reuse the department the first call chose
+            if not (llm_result and llm_result['department_id'] is not None):
+                llm_result = yield from self._escalate_steps(
+                    user_message, norm_message, all_symptoms, context, history, escalated
+                )
+            if llm_result and llm_result['department_id'] is not None:
+                best_dept = {'department_id': llm_result['department_id'], 'score': THRESHOLD}
+                best_score = THRESHOLD
+                triage_source = 'llm'
+
         # =====================================================================
         # CASE 1: Missing required info AND turn < 5 - Ask for missing info
         # =====================================================================
@@ -641,14 +958,17 @@ class ChatbotService:
                 quick_replies = self.get_quick_replies('default', 'initial')
                 context['last_question_type'] = 'follow_up'
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
-                all_symptoms, context, None, None, 'in_progress', best_score
+                all_symptoms, context, None, None, 'in_progress', best_score,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': None,
                 'suggestedDepartment': None,
                 'confidence': min(best_score / 10, 1.0) if best_score else 0.0,
@@ -669,15 +989,18 @@ class ChatbotService:
 
             response = self.generate_recommendation_response(dept_info, esi_level)
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
                 all_symptoms, context, esi_level,
-                best_dept['department_id'], 'completed', best_score
+                best_dept['department_id'], 'completed', best_score,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': None,
                 'suggestedDepartment': dept_info['name_vi'],
                 'confidence': min(best_score / 10, 1.0),
@@ -691,7 +1014,8 @@ class ChatbotService:
                     'doctorName': dept_info['doctor_name'],
                     'workingHours': dept_info['working_hours']
                 },
-                'conversationStatus': 'completed'
+                'conversationStatus': 'completed',
+                'triageSource': triage_source
             }
 
         # =====================================================================
@@ -709,14 +1033,17 @@ class ChatbotService:
             quick_replies = self.get_quick_replies('default', 'initial')
             context['last_question_type'] = 'follow_up'
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
-                all_symptoms, context, None, None, 'in_progress', best_score
+                all_symptoms, context, None, None, 'in_progress', best_score,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': None,
                 'suggestedDepartment': None,
                 'confidence': min(best_score / 10, 1.0) if best_score else 0.0,
@@ -738,15 +1065,18 @@ class ChatbotService:
 
             response = self.generate_recommendation_response(dept_info, esi_level)
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
                 all_symptoms, context, esi_level,
-                best_dept['department_id'], 'completed', best_score
+                best_dept['department_id'], 'completed', best_score,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': None,
                 'suggestedDepartment': dept_info['name_vi'],
                 'confidence': min(best_score / 10, 1.0),
@@ -760,20 +1090,24 @@ class ChatbotService:
                     'doctorName': dept_info['doctor_name'],
                     'workingHours': dept_info['working_hours']
                 },
-                'conversationStatus': 'completed'
+                'conversationStatus': 'completed',
+                'triageSource': triage_source
             }
         else:
             # Score = 0, cannot suggest
             response = "Toi khong the de xuat khoa kham dua tren mo ta cua ban. Chung toi se goi y ta den ho tro ban."
 
-            self.save_turn(
+            yield blocking(
+                self.save_turn,
                 session_id, turn_number, user_message, response,
-                all_symptoms, context, None, None, 'completed', 0
+                all_symptoms, context, None, None, 'completed', 0,
+                history=history
             )
 
             return {
                 'response': response,
                 'session_id': session_id,
+                'turnNumber': turn_number,
                 'alertLevel': None,
                 'suggestedDepartment': None,
                 'confidence': 0.0,
@@ -788,17 +1122,73 @@ class ChatbotService:
 
     def reset_conversation(self, session_id):
         """Reset/delete conversation for a session"""
+        self.session_store.invalidate(session_id)
+        if self.turn_writer:
+            # Pending turns must land before the DELETE or they would reappear
+            self.turn_writer.flush()
         query = "DELETE FROM conversations WHERE session_id = ?"
-        return Database.execute_update(query, (session_id,))
-
-    def get_conversation_history(self, session_id, limit=10):
-        """Get conversation history"""
-        query = f"""
-        SELECT TOP {limit} turn_number, user_message, bot_response,
-               extracted_symptoms, current_esi_level, conversation_status,
-               timestamp
+        with Database.unit_of_work():
+            deleted = Database.execute_update(query, (session_id,))
+            Session.delete(session_id)
+        self.history_cache.invalidate(session_id)
+        return deleted
+
+    def get_conversation_history(self, session_id, limit=10, after_turn=0):
+        """
+        Get conversation turns after a turn number (keyset pagination on
+        session_id, turn_number), only the columns the frontend renders
+        """
+        self._wait_for_queued_turns(session_id)
+        query, params = Database.dialect().limit("""
+        SELECT turn_number, user_message, bot_response, timestamp
         FROM conversations
-        WHERE session_id = ?
+        WHERE session_id = ? AND turn_number > ?
         ORDER BY turn_number ASC
+        """, (session_id, after_turn), limit)
+        return Database.execute_query(query, params)
+
+    def _wait_for_queued_turns(self, session_id):
+        """
+        Let write-behind turns land before a history read, for at most
+        DB_QUERY_TIMEOUT (or what is left of the request deadline); past
+        that the committed turns are served
+        """
+        if not self.turn_writer or not self.turn_writer.has_pending(session_id):
+            return
+        timeout = stage_budget('history_flush', cap=config.DB_QUERY_TIMEOUT)
+        if not timeout or not self.turn_writer.flush(timeout):
+            print(f"[History] Write-behind queue not flushed in time, serving committed turns for {session_id}")
+
+    def get_history_page(self, session_id, after_turn=0, limit=None):
+        """
+        One page of the formatted history, served from the history cache
+
+        Args:
+            session_id (str): Session ID
+            after_turn (int): Cursor - return turns after this turn number
+            limit (int): Max turns in the page (default HISTORY_PAGE_SIZE)
+
+        Returns:
+            tuple: (etag, payload) - payload has sessionId, history,
+                   nextCursor (None on the last page)
         """
-        return Database.execute_query(query, (session_id,))
+        limit = limit or config.HISTORY_PAGE_SIZE
+        self._wait_for_queued_turns(session_id)
+        # The page only changes until it is full (turns are append-only) or
+        # the session is reset. Read before the page: a turn committed in
+        # between only makes the cached page newer than its version.
+        turn_count, created_at = Session.get_revision(session_id)
+        version = (min(turn_count, after_turn + limit), created_at)
+
+        def load():
+            # One extra row tells whether there is a next page
+            turns = self.get_conversation_history(session_id, limit + 1, after_turn)
+            has_more = len(turns) > limit
+            turns = turns[:limit]
+            return {
+                'sessionId': session_id,
+                'history': format_history(turns),
+                'nextCursor': turns[-1]['turn_number'] if has_more else None
+            }
+
+        return self.history_cache.get(session_id, (after_turn, limit), load, version)
@@ -0,0 +1,182 @@
+"""
+context_builder.py - Dung prompt cho LLM trong gioi han token
+
+Thay vi gui lai toan bo hoi thoai, trang thai session (trieu chung, tuoi,
+gioi tinh, thoi gian, muc do dau, co thai...) duoc tom tat thanh vai dong
+co cau truc, kem toi da MAX_CONVERSATION_HISTORY tin nhan gan nhat cua
+benh nhan. Tong prompt bi gioi han boi LLM_PROMPT_TOKEN_BUDGET: tin nhan cu
+nhat bi bo truoc, tin nhan hien tai bi cat sau cung.
+
+Prompt luon bat dau bang phan on dinh (system prompt + danh sach khoa), phan
+thay doi theo turn nam cuoi: Ollama dung lai KV cache cua prefix trung nhau
+giua cac turn, nen chi phan tom tat + tin nhan moi phai xu ly lai.
+"""
+
+import threading
+
+import config
+
+# Uoc luong tho: tieng Viet khong dau ~3 ky tu / token
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    """
+    Uoc luong so token cua mot doan text
+
+    Args:
+        text (str): Text
+
+    Returns:
+        int: So token (lam tron len)
+    """
+    return -(-len(text or '') // CHARS_PER_TOKEN)
+
+
+def append_history(history, user_message, max_history=None):
+    """
+    Them tin nhan benh nhan vao lich su, chi giu max_history tin gan nhat
+
+    Args:
+        history (list): Lich su hien tai (khong bi sua)
+        user_message (str): Tin nhan moi
+        max_history (int): So tin toi da (mac dinh config.MAX_CONVERSATION_HISTORY)
+
+    Returns:
+        list: Lich su moi
+    """
+    max_history = max_history if max_history is not None else config.MAX_CONVERSATION_HISTORY
+    if max_history <= 0:
+        return []
+    return (list(history or []) + [user_message])[-max_history:]
+
+
+class ContextBuilder:
+    """
+    Tom tat session va cat prompt theo token budget
+    """
+
+    def __init__(self, max_history=None, token_budget=None):
+        """
+        Args:
+            max_history (int): So tin nhan cu toi da dua vao prompt
+            token_budget (int): So token toi da cua toan bo prompt
+        """
+        self.max_history = (
+            max_history if max_history is not None else config.MAX_CONVERSATION_HISTORY
+        )
+        self.token_budget = token_budget or config.LLM_PROMPT_TOKEN_BUDGET
+        self._lock = threading.Lock()
+
+        # Stats
+        self.prompts = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.history_dropped = 0
+        self.truncated = 0
+
+    def summarize(self, symptoms, context):
+        """
+        Tom tat trang thai session thanh cac dong ngan
+
+        Args:
+            symptoms (list): Trieu chung da thu thap
+            context (dict): age, gender, duration, severity, is_pregnant...
+
+        Returns:
+            str: Tom tat (moi thong tin mot dong)
+        """
+        context = context or {}
+        lines = [f'Trieu chung da ghi nhan: {", ".join(symptoms) if symptoms else "chua co"}']
+        if context.get('age') is not None:
+            lines.append(f'Tuoi: {context["age"]}')
+        if context.get('gender'):
+            lines.append(f'Gioi tinh: {context["gender"]}')
+        if context.get('duration'):
+            lines.append(f'Thoi gian: {context["duration"]}')
+        if context.get('severity') is not None:
+            lines.append(f'Muc do dau: {context["severity"]}/10')
+        flags = [
+            label for field, label in (
+                ('is_pregnant', 'dang mang thai'),
+                ('is_pediatric', 'tre em'),
+                ('is_severe', 'dau nang')
+            )
+            if context.get(field)
+        ]
+        if flags:
+            lines.append(f'Luu y: {", ".join(flags)}')
+        return '\n'.join(lines)
+
+    def build(self, system, user_message, symptoms=None, context=None, history=None):
+        """
+        Dung messages cho chat API trong gioi han token
+
+        Args:
+            system (str): Phan on dinh cua prompt (system prompt, danh sach khoa)
+            user_message (str): Tin nhan hien tai
+            symptoms (list): Trieu chung da thu thap
+            context (dict): Thong tin benh nhan
+            history (list): Cac tin nhan truoc cua benh nhan (cu -> moi)
+
+        Returns:
+            list: [{'role': 'system'}, {'role': 'user'}]
+        """
+        summary = self.summarize(symptoms, context)
+        history = [m for m in (history or []) if m][-self.max_history:] if self.max_history > 0 else []
+
+        # Tin nhan hien tai thuong da nam cuoi lich su
+        if history and history[-1] == user_message:
+            history = history[:-1]
+
+        fixed = estimate_tokens(system) + estimate_tokens(summary) + 8
+        remaining = self.token_budget - fixed
+
+        # Cat tin nhan hien tai neu mot minh no da vuot budget
+        truncated = False
+        if estimate_tokens(user_message) > max(remaining, 0):
+            user_message = user_message[:max(remaining, 0) * CHARS_PER_TOKEN]
+            truncated = True
+        remaining -= estimate_tokens(user_message)
+
+        # Giu cac tin gan nhat vua budget, bo tin cu nhat truoc
+        kept = []
+        for message in reversed(history):
+            cost = estimate_tokens(message) + 1
+            if cost > remaining:
+                break
+            kept.append(message)
+            remaining -= cost
+        kept.reverse()
+
+        parts = [summary]
+        if kept:
+            parts.append('Tin nhan truoc:\n' + '\n'.join(f'- {m}' for m in kept))
+        parts.append(f'Tin nhan: {user_message}')
+        content = '\n'.join(parts)
+
+        tokens = estimate_tokens(system) + estimate_tokens(content)
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.history_dropped += len(history) - len(kept)
+            self.truncated += truncated
+
+        return [
+            {'role': 'system', 'content': system},
+            {'role': 'user', 'content': content}
+        ]
+
+    def stats(self):
+        """Thong ke kich thuoc prompt (token uoc luong)"""
+        with self._lock:
+            return {
+                'token_budget': self.token_budget,
+                'max_history': self.max_history,
+                'prompts': self.prompts,
+                'avg_tokens': round(self.total_tokens / self.prompts, 1) if self.prompts else None,
+                'max_tokens': self.max_tokens,
+                'history_dropped': self.history_dropped,
+                'truncated': self.truncated
+            }
@@ -0,0 +1,66 @@
+"""
+db_executor.py - Thread pool rieng cho cac thao tac blocking (DB) tu event loop
+
+Cac route async chay tren event loop, con pyodbc la blocking, nen moi lan
+goi DB duoc day sang mot ThreadPoolExecutor co kich thuoc bang connection
+pool. So connection mo (kiosk, dien thoai) khong con gan voi so thread.
+Chi dua thao tac DB vao day: LLM duoc await tren event loop (client async),
+neu khong thoi gian cho Ollama se chiem het worker cua DB.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """
+    Lay executor dung chung cho cac thao tac DB
+
+    Returns:
+        ThreadPoolExecutor: Executor co ASYNC_DB_WORKERS thread
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.ASYNC_DB_WORKERS,
+                    thread_name_prefix='db-worker'
+                )
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Chay ham blocking tren DB executor va await ket qua
+
+    Context (contextvars) cua task hien tai duoc copy sang thread worker.
+
+    Args:
+        func (callable): Ham blocking
+        *args, **kwargs: Tham so cho func
+
+    Returns:
+        Ket qua cua func
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), call)
+
+
+def shutdown_db_executor():
+    """Dung executor (goi khi ASGI server shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
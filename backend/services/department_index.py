@@ -0,0 +1,127 @@
+"""
+department_index.py - Inverted index keyword -> department cho scoring
+
+Thay vong lap rules x keywords x symptoms cua calculate_department_scores
+bang index tinh san tu rule snapshot. Moi symptom chi can mot lan tra cuu:
+- keyword nam trong symptom: tim bang keyword automaton
+- symptom nam trong keyword: tra n-gram index (n <= 3) roi xac nhan
+Ket qua cho moi symptom duoc memo lai vi symptom lap lai qua cac turn.
+"""
+
+from utils.keyword_matcher import KeywordAutomaton
+
+NGRAM_SIZE = 3
+LOOKUP_CACHE_SIZE = 10000
+
+
+class DepartmentKeywordIndex:
+    """
+    Index tu keyword da normalize sang (department_id, keyword goc)
+    """
+
+    def __init__(self, scoring_rules):
+        """
+        Args:
+            scoring_rules (list): Rules cua cac khoa dang hoat dong, moi rule co
+                'department_id', 'name_vi', 'name_en', 'keywords' [(kw, norm_kw)]
+        """
+        self.departments = {}
+        self._keywords = []
+        self._postings = []
+        self._keyword_ids = {}
+        self._empty_keyword_ids = []
+
+        for rule in scoring_rules:
+            dept_id = rule['department_id']
+            self.departments.setdefault(dept_id, (rule['name_vi'], rule['name_en']))
+            for kw, norm_kw in rule['keywords']:
+                keyword_id = self._keyword_ids.get(norm_kw)
+                if keyword_id is None:
+                    keyword_id = len(self._keywords)
+                    self._keyword_ids[norm_kw] = keyword_id
+                    self._keywords.append(norm_kw)
+                    self._postings.append([])
+                if (dept_id, kw) not in self._postings[keyword_id]:
+                    self._postings[keyword_id].append((dept_id, kw))
+
+        # Keyword nam trong symptom
+        self._automaton = KeywordAutomaton()
+        for keyword_id, norm_kw in enumerate(self._keywords):
+            if norm_kw:
+                self._automaton.add(norm_kw, keyword_id)
+            else:
+                self._empty_keyword_ids.append(keyword_id)
+        self._automaton.build()
+
+        # Symptom nam trong keyword: moi substring do dai 1..NGRAM_SIZE cua keyword
+        self._ngrams = {}
+        for keyword_id, norm_kw in enumerate(self._keywords):
+            for size in range(1, NGRAM_SIZE + 1):
+                for start in range(len(norm_kw) - size + 1):
+                    self._ngrams.setdefault(norm_kw[start:start + size], set()).add(keyword_id)
+
+        self._lookup_cache = {}
+
+    def _keywords_containing(self, norm_sym):
+        """Tap keyword ID ma keyword chua norm_sym"""
+        if not norm_sym:
+            return set(range(len(self._keywords)))
+        if len(norm_sym) <= NGRAM_SIZE:
+            # Moi substring ngan deu da duoc index -> ket qua chinh xac
+            return set(self._ngrams.get(norm_sym, ()))
+
+        candidates = None
+        for start in range(len(norm_sym) - NGRAM_SIZE + 1):
+            posting = self._ngrams.get(norm_sym[start:start + NGRAM_SIZE])
+            if not posting:
+                return set()
+            candidates = set(posting) if candidates is None else candidates & posting
+            if not candidates:
+                return set()
+        return {kid for kid in candidates if norm_sym in self._keywords[kid]}
+
+    def lookup(self, norm_sym):
+        """
+        Tim cac keyword match voi mot symptom da normalize
+        (bang nhau, keyword chua symptom, hoac symptom chua keyword)
+
+        Args:
+            norm_sym (str): Symptom da normalize
+
+        Returns:
+            tuple: Cac (department_id, keyword goc) match
+        """
+        cached = self._lookup_cache.get(norm_sym)
+        if cached is not None:
+            return cached
+
+        keyword_ids = self._keywords_containing(norm_sym)
+        for _, _, _, payloads in self._automaton.find_all(norm_sym):
+            keyword_ids.update(payloads)
+        keyword_ids.update(self._empty_keyword_ids)
+
+        result = tuple(
+            entry for keyword_id in sorted(keyword_ids) for entry in self._postings[keyword_id]
+        )
+        if len(self._lookup_cache) >= LOOKUP_CACHE_SIZE:
+            self._lookup_cache.clear()
+        self._lookup_cache[norm_sym] = result
+        return result
+
+    def match(self, norm_symptoms, allowed_departments=None):
+        """
+        Gom cac keyword match theo khoa
+
+        Args:
+            norm_symptoms (iterable): Cac symptom da normalize
+            allowed_departments (set): Chi tinh cac khoa nay (None = tat ca)
+
+        Returns:
+            dict: department_id -> set keyword goc da match
+        """
+        matched = {}
+        for norm_sym in norm_symptoms:
+            for dept_id, kw in self.lookup(norm_sym):
+                if allowed_departments is None or dept_id in allowed_departments:
+                    matched.setdefault(dept_id, set()).add(kw)
+        return matched
@@ -0,0 +1,396 @@
+"""
+embedding_index.py - Tim khoa kham theo do tuong dong embedding (tuy chon)
+
+Moi keyword va mo ta (rule_name, additional_notes) cua symptom_rules duoc
+embed mot lan thanh mot ma tran float32 (moi dong mot vector da chuan hoa L2),
+luu ra file .npy va memory-map khi khoi dong. Khi tim kiem, cac trieu chung
+duoc embed, cong lai thanh mot vector truy van va cham diem bang MOT phep
+nhan ma tran-vector; diem cua khoa la diem cao nhat trong cac dong cua khoa
+do. Khong co round trip toi DB.
+
+Index duoc dung luc khoi dong (preload) va, khi rule doi version, tren mot
+thread nen (refresh): request khong bao gio cho embed. Trong luc index chua
+khop snapshot, chatbot chi dung keyword matching.
+
+Embedder:
+- 'hashing': model thay the cuc bo (n-gram ky tu + tu, bam vao EMBEDDING_DIM
+  chieu), khong can mang.
+- 'ollama': Ollama embed API (config.OLLAMA_EMBED_MODEL).
+
+numpy la dependency tuy chon: neu khong co, get_embedding_index() tra ve None.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy la tuy chon
+    np = None
+
+import config
+from utils.text_normalizer import normalize_text
+
+
+class HashingEmbedder:
+    """
+    Model thay the cuc bo: bam n-gram ky tu (3-gram) va tu vao vector co dinh
+    """
+
+    def __init__(self, dim=None):
+        """
+        Args:
+            dim (int): So chieu cua vector
+        """
+        self.dim = dim or config.EMBEDDING_DIM
+        self.name = f'hashing-{self.dim}'
+
+    def embed(self, texts):
+        """
+        Args:
+            texts (list): Danh sach text
+
+        Returns:
+            numpy.ndarray: Ma tran (len(texts), dim) float32, moi dong chuan hoa L2
+        """
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            norm = ' '.join(normalize_text(text).split())
+            for word in norm.split():
+                matrix[row, zlib.crc32(word.encode('utf-8')) % self.dim] += 2.0
+            padded = f' {norm} '
+            for i in range(len(padded) - 2):
+                matrix[row, zlib.crc32(padded[i:i + 3].encode('utf-8')) % self.dim] += 1.0
+        return _l2_normalize(matrix)
+
+
+class OllamaEmbedder:
+    """
+    Embedding bang Ollama embed API
+    """
+
+    def __init__(self, client=None, model=None):
+        """
+        Args:
+            client (LLMClient): Client Ollama (mac dinh client dung chung)
+            model (str): Model embedding
+        """
+        from services.llm_client import get_llm_client
+        self.client = client or get_llm_client()
+        self.model = model or config.OLLAMA_EMBED_MODEL
+        self.name = f'ollama-{self.model}'
+
+    def embed(self, texts):
+        """Embed mot batch text trong mot request"""
+        vectors = self.client.embed([normalize_text(text) for text in texts], model=self.model)
+        return _l2_normalize(np.asarray(vectors, dtype=np.float32))
+
+    async def aembed(self, texts):
+        """Ban async cua embed() (ASGI)"""
+        vectors = await self.client.aembed([normalize_text(text) for text in texts], model=self.model)
+        return _l2_normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def _l2_normalize(matrix):
+    """Chuan hoa L2 tung dong (dong toan 0 giu nguyen)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class EmbeddingIndex:
+    """
+    Ma tran embedding cua symptom_rules, sap xep theo department_id
+    """
+
+    # So vector truy van giu lai (embed bang Ollama ton mot request)
+    QUERY_CACHE_SIZE = 2048
+
+    # Thoi gian cho truoc khi thu dung lai sau mot lan build loi (giay)
+    RETRY_INTERVAL = 30
+
+    def __init__(self, embedder, index_dir=None):
+        """
+        Args:
+            embedder: HashingEmbedder hoac OllamaEmbedder
+            index_dir (str): Thu muc luu vectors.npy va meta.json
+        """
+        self.embedder = embedder
+        self.index_dir = index_dir or config.EMBEDDING_INDEX_DIR
+        self.version = None
+        self.texts = []
+        # (matrix, department_ids, department_starts) - thay ca bo mot lan (atomic)
+        self._data = (None, [], None)
+        self._query_cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Build chay ngoai _lock: truy van van doc duoc index cu trong luc build
+        self._build_lock = threading.Lock()
+        self._builder = None
+        self._retry_at = 0.0
+
+    def ensure(self, snapshot):
+        """
+        Dam bao index khop voi snapshot rule: load tu disk neu fingerprint
+        trung, neu khong thi embed lai va ghi ra disk (blocking)
+
+        Args:
+            snapshot (RuleSnapshot): Snapshot rule hien tai
+        """
+        if self.version == snapshot.version:
+            return
+        with self._build_lock:
+            if self.version == snapshot.version:
+                return
+            entries = self._entries(snapshot)
+            fingerprint = hashlib.sha1(
+                json.dumps([self.embedder.name, entries], ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            if not self._load(fingerprint):
+                self._build(entries, fingerprint)
+            with self._lock:
+                self._query_cache.clear()
+                self.version = snapshot.version
+
+    def refresh(self, snapshot):
+        """
+        Khong blocking: index co khop snapshot khong; neu khong thi dung lai
+        tren thread nen (moi luc toi da mot thread)
+
+        Args:
+            snapshot (RuleSnapshot): Snapshot rule hien tai
+
+        Returns:
+            bool: True neu dung duoc index cho snapshot nay
+        """
+        if self.version == snapshot.version:
+            return True
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return False
+            if time.monotonic() < self._retry_at:
+                return False
+            self._builder = threading.Thread(
+                target=self._build_in_background, args=(snapshot,),
+                name='embedding-index', daemon=True
+            )
+            self._builder.start()
+        return False
+
+    def preload(self, rule_cache, background=False):
+        """
+        Dung index cho snapshot hien tai luc khoi dong
+
+        Args:
+            rule_cache (RuleCache): Cache rule (lay snapshot hien tai)
+            background (bool): Chay tren daemon thread (khong chan startup)
+
+        Returns:
+            bool: True neu index san sang (luon True khi background)
+        """
+        if background:
+            threading.Thread(
+                target=self.preload, args=(rule_cache,), name='embedding-preload', daemon=True
+            ).start()
+            return True
+        try:
+            self.ensure(rule_cache.get_snapshot())
+        except Exception as e:
+            print(f"[EmbeddingIndex] Preload failed: {str(e)}")
+            return False
+        return True
+
+    def top_departments(self, symptoms, k=3, allowed_departments=None):
+        """
+        Top-k khoa gan nhat voi tap trieu chung
+
+        Args:
+            symptoms (list): Trieu chung (text)
+            k (int): So khoa tra ve
+            allowed_departments (set): Chi xet cac khoa nay (None = tat ca)
+
+        Returns:
+            list: [(department_id, similarity)] giam dan theo similarity
+        """
+        if not self._searchable(symptoms):
+            return []
+        return self._rank(self._query_vector(symptoms), k, allowed_departments)
+
+    async def atop_departments(self, symptoms, k=3, allowed_departments=None):
+        """Ban async cua top_departments(): embed truy van tren event loop"""
+        if not self._searchable(symptoms):
+            return []
+        key = self._query_key(symptoms)
+        vector = self._cached_query(key)
+        if vector is None:
+            aembed = getattr(self.embedder, 'aembed', None)
+            matrix = await aembed(list(symptoms)) if aembed else self.embedder.embed(list(symptoms))
+            vector = self._store_query(key, matrix)
+        return self._rank(vector, k, allowed_departments)
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _build_in_background(self, snapshot):
+        """Thread nen cua refresh(): loi thi cho RETRY_INTERVAL roi moi thu lai"""
+        try:
+            self.ensure(snapshot)
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.RETRY_INTERVAL
+            print(f"[EmbeddingIndex] Background build failed: {str(e)}")
+
+    def _searchable(self, symptoms):
+        matrix = self._data[0]
+        return matrix is not None and len(matrix) and symptoms
+
+    def _rank(self, query, k, allowed_departments):
+        """Cham diem moi dong bang mot phep nhan ma tran-vector, gom theo khoa"""
+        matrix, department_ids, department_starts = self._data
+        scores = matrix @ query
+        dept_scores = np.maximum.reduceat(scores, department_starts)
+
+        ranked = []
+        for i in np.argsort(-dept_scores):
+            dept_id = department_ids[i]
+            if allowed_departments is not None and dept_id not in allowed_departments:
+                continue
+            ranked.append((dept_id, float(dept_scores[i])))
+            if len(ranked) >= k:
+                break
+        return ranked
+
+    def _entries(self, snapshot):
+        """(department_id, text) cho moi keyword va mo ta, sap xep theo khoa"""
+        entries = []
+        for rule in snapshot.scoring_rules:
+            texts = [kw for kw, _ in rule['keywords']]
+            if rule.get('description'):
+                texts.append(rule['description'])
+            entries.extend((rule['department_id'], text) for text in texts if text)
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def _query_vector(self, symptoms):
+        """Tong cac vector trieu chung (chuan hoa L2), co cache theo text"""
+        key = self._query_key(symptoms)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = self._store_query(key, self.embedder.embed(list(symptoms)))
+        return vector
+
+    @staticmethod
+    def _query_key(symptoms):
+        return '\x00'.join(sorted(normalize_text(s) for s in symptoms))
+
+    def _cached_query(self, key):
+        with self._lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+            return vector
+
+    def _store_query(self, key, matrix):
+        """Cong cac vector trieu chung thanh vector truy van va cache lai"""
+        vector = _l2_normalize(matrix.sum(axis=0, keepdims=True))[0]
+        with self._lock:
+            self._query_cache[key] = vector
+            while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return vector
+
+    def _paths(self):
+        """Duong dan file ma tran va metadata"""
+        return (
+            os.path.join(self.index_dir, 'vectors.npy'),
+            os.path.join(self.index_dir, 'meta.json')
+        )
+
+    def _load(self, fingerprint):
+        """Memory-map index da luu neu fingerprint khop"""
+        vectors_path, meta_path = self._paths()
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return False
+        try:
+            with open(meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            if meta.get('fingerprint') != fingerprint:
+                return False
+            matrix = np.load(vectors_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"[EmbeddingIndex] Cannot load index: {str(e)}")
+            return False
+        self._set(matrix, meta['department_ids'], meta['texts'])
+        print(f"[EmbeddingIndex] Memory-mapped {len(matrix)} vectors from {vectors_path}")
+        return True
+
+    def _build(self, entries, fingerprint):
+        """Embed toan bo entry va ghi ra disk (ghi file tam roi rename)"""
+        department_ids = [dept_id for dept_id, _ in entries]
+        texts = [text for _, text in entries]
+        if texts:
+            matrix = self.embedder.embed(texts).astype(np.float32)
+        else:
+            matrix = np.zeros((0, getattr(self.embedder, 'dim', 0)), dtype=np.float32)
+
+        vectors_path, meta_path = self._paths()
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(vectors_path + '.tmp', 'wb') as vectors_file:
+                np.save(vectors_file, matrix)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as meta_file:
+                json.dump({
+                    'fingerprint': fingerprint,
+                    'embedder': self.embedder.name,
+                    'department_ids': department_ids,
+                    'texts': texts
+                }, meta_file, ensure_ascii=False)
+            os.replace(vectors_path + '.tmp', vectors_path)
+            os.replace(meta_path + '.tmp', meta_path)
+            matrix = np.load(vectors_path, mmap_mode='r')
+        except OSError as e:
+            print(f"[EmbeddingIndex] Cannot persist index, keeping it in memory: {str(e)}")
+        self._set(matrix, department_ids, texts)
+        print(f"[EmbeddingIndex] Built {len(texts)} vectors with {self.embedder.name}")
+
+    def _set(self, matrix, department_ids, texts):
+        """Gom cac dong theo khoa: department_starts dung cho reduceat"""
+        starts, dept_ids = [], []
+        for row, dept_id in enumerate(department_ids):
+            if not dept_ids or dept_ids[-1] != dept_id:
+                starts.append(row)
+                dept_ids.append(dept_id)
+        self.texts = texts
+        self._data = (matrix, dept_ids, np.asarray(starts, dtype=np.intp))
+
+
+_embedding_index = None
+_embedding_index_lock = threading.Lock()
+
+
+def get_embedding_index():
+    """
+    Lay EmbeddingIndex dung chung (None neu tat hoac khong co numpy)
+
+    Returns:
+        EmbeddingIndex: Index dung chung (chi tim khi refresh(snapshot) tra ve True)
+    """
+    global _embedding_index
+    if not config.EMBEDDING_INDEX_ENABLED:
+        return None
+    if np is None:
+        print("[EmbeddingIndex] numpy is not installed, vector retrieval disabled")
+        return None
+    if _embedding_index is None:
+        with _embedding_index_lock:
+            if _embedding_index is None:
+                if config.EMBEDDING_MODEL == 'ollama':
+                    embedder = OllamaEmbedder()
+                else:
+                    embedder = HashingEmbedder()
+                _embedding_index = EmbeddingIndex(embedder)
+    return _embedding_index
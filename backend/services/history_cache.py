@@ -0,0 +1,160 @@
+"""
+history_cache.py - Cache ban render lich su hoi thoai theo session
+
+Frontend tai lai lich su moi lan reload trang. Moi trang lich su (session,
+after_turn, limit) da format san cho frontend duoc cache cung ETag, nen
+request lap lai khong doc lai cac turn va tra 304 neu client da co ban do.
+
+Cache nam rieng trong tung process nen moi trang gan voi phien ban cua no
+trong database (so turn trang do chua duoc, created_at cua session): worker
+khac luu turn moi hoac reset session thi phien ban doi, trang cu khong con
+duoc dung. ETag tinh tu phien ban nen giong nhau giua cac process. Cache cua session cung
+bi xoa sau khi turn moi commit (save_turn) hoac khi reset. Gioi han bang TTL
+(SESSION_TIMEOUT) va so session toi da (LRU).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+def make_etag(session_id, version, page):
+    """
+    ETag cua mot trang lich su: hash cua phien ban trang,
+    giong nhau giua cac process
+
+    Args:
+        session_id (str): ID cua session
+        version (tuple): Phien ban cua trang trong database
+        page (tuple): (after_turn, limit)
+
+    Returns:
+        str: ETag (khong co dau nhay)
+    """
+    body = json.dumps([session_id, version, page], ensure_ascii=False, default=str)
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class HistoryCache:
+    """
+    Cache LRU + TTL cua cac trang lich su, nhom theo session_id
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        """
+        Args:
+            ttl (float): So giay mot session het han ke tu lan truy cap cuoi
+            max_entries (int): So session toi da giu trong memory
+        """
+        self.ttl = ttl if ttl is not None else config.SESSION_TIMEOUT
+        self.max_entries = max_entries if max_entries is not None else config.SESSION_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Tang moi lan invalidate: trang doc truoc do khong duoc ghi vao cache
+        self._epoch = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, session_id, page, loader, version=None):
+        """
+        Lay mot trang lich su; neu khong co trong cache thi goi loader
+
+        Args:
+            session_id (str): ID cua session
+            page (tuple): (after_turn, limit)
+            loader (callable): Ham tra ve trang da format (dict)
+            version (tuple): Phien ban cua trang trong database, doc truoc
+                khi goi loader; trang cache o phien ban khac bi bo
+
+        Returns:
+            tuple: (etag, payload) - payload dung chung, khong duoc sua
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                pages, last_access = entry
+                cached = pages.get(page)
+                if now - last_access <= self.ttl and cached is not None and cached[0] == version:
+                    self._entries[session_id] = (pages, now)
+                    self._entries.move_to_end(session_id)
+                    self.hits += 1
+                    return cached[1:]
+            self.misses += 1
+            epoch = self._epoch
+
+        payload = loader()
+        etag = make_etag(session_id, version, page)
+
+        with self._lock:
+            # Mot turn moi duoc luu trong luc doc: khong cache ban cu
+            if epoch == self._epoch:
+                entry = self._entries.get(session_id)
+                pages = entry[0] if entry is not None and now - entry[1] <= self.ttl else {}
+                pages[page] = (version, etag, payload)
+                self._entries[session_id] = (pages, now)
+                self._entries.move_to_end(session_id)
+                self._evict(now)
+        return etag, payload
+
+    def invalidate(self, session_id):
+        """Xoa lich su da cache cua session (khi co turn moi hoac reset)"""
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(session_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Xoa toan bo cache"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Thong ke cache"""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def _evict(self, now):
+        """Loai session het han (o dau LRU) va session vuot qua max_entries"""
+        while self._entries:
+            _, (_, last_access) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_entries or now - last_access > self.ttl:
+                self._entries.popitem(last=False)
+            else:
+                break
+
+
+_history_cache = None
+_history_cache_lock = threading.Lock()
+
+
+def get_history_cache():
+    """
+    Lay HistoryCache dung chung cho toan process
+
+    Returns:
+        HistoryCache: Cache dung chung
+    """
+    global _history_cache
+    if _history_cache is None:
+        with _history_cache_lock:
+            if _history_cache is None:
+                _history_cache = HistoryCache()
+    return _history_cache
@@ -0,0 +1,101 @@
+"""
+io_steps.py - Mot logic co I/O, chay duoc blocking hoac tren event loop
+
+Logic cua mot turn (DB + LLM) duoc viet mot lan duoi dang generator: moi
+khi can I/O, generator yield mot Step va nhan lai ket qua (hoac exception).
+- run_steps(): chay tung Step ngay tren thread hien tai (Flask, CLI, test).
+- arun_steps(): await tung Step tren event loop (ASGI): LLM goi bang client
+  async (httpx), chi thao tac DB moi chay tren DB executor, nen thoi gian
+  cho Ollama khong chiem thread / connection cua DB.
+Generator con duoc ghep bang `yield from`. Neu Step bi huy (CancelledError
+khi client ngat ket noi, KeyboardInterrupt...), generator duoc close() ngay de
+cac khoi finally (tra slot, luot thu cua breaker) chay truoc khi loi di tiep.
+"""
+
+import functools
+
+from services.db_executor import run_blocking
+
+
+class Step:
+    """
+    Mot thao tac I/O: ham blocking va ham async tuong ung
+    """
+
+    def __init__(self, func, afunc, *args, **kwargs):
+        """
+        Args:
+            func (callable): Ban blocking
+            afunc (callable): Ban async (coroutine function), cung tham so
+            *args, **kwargs: Tham so cho ca hai ban
+        """
+        self.func = func
+        self.afunc = afunc
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+    async def arun(self):
+        return await self.afunc(*self.args, **self.kwargs)
+
+
+def blocking(func, *args, **kwargs):
+    """
+    Step chi co ban blocking (DB...): tren event loop chay tren DB executor
+
+    Returns:
+        Step: Step goi func(*args, **kwargs)
+    """
+    return Step(func, functools.partial(run_blocking, func), *args, **kwargs)
+
+
+def run_steps(steps):
+    """
+    Chay generator, thuc hien moi Step tren thread hien tai
+
+    Args:
+        steps (generator): Generator yield Step, return ket qua
+
+    Returns:
+        Gia tri return cua generator
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = step.run(), None
+        except Exception as e:
+            value, error = None, e
+        except BaseException:
+            steps.close()
+            raise
+
+
+async def arun_steps(steps):
+    """
+    Chay generator tren event loop, await moi Step
+
+    Args:
+        steps (generator): Generator yield Step, return ket qua
+
+    Returns:
+        Gia tri return cua generator
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = await step.arun(), None
+        except Exception as e:
+            value, error = None, e
+        except BaseException:
+            steps.close()
+            raise
@@ -0,0 +1,253 @@
+"""
+llm_cache.py - Cache cau tra loi cua LLM theo prompt da chuan hoa
+
+Benh nhan gui rat nhieu tin nhan giong nhau ("toi bi dau hong", "Tôi bị
+đau họng"), nen key cua cache la prompt da bo dau / chu thuong (normalize_text)
+cong voi ten model va options. Tang memory la LRU + TTL; tang disk (sqlite3,
+tuy chon) giu cau tra loi qua cac lan khoi dong lai. Tang disk cung co gioi
+han: moi lan ghi xoa cac row het han, va khi vuot LLM_CACHE_DISK_MAX_ENTRIES
+thi xoa cac row cu nhat (het han som nhat) xuong con DISK_LOW_WATER.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from utils.text_normalizer import normalize_text
+
+
+def make_cache_key(model, messages, options=None, format=None):
+    """
+    Tao key cho mot request LLM
+
+    Args:
+        model (str): Ten model
+        messages (list): Danh sach message {'role', 'content'} (hoac prompt str)
+        options (dict): Options cua Ollama
+        format: Format cua structured output
+
+    Returns:
+        str: SHA-1 hex cua (model, prompt da chuan hoa, options, format)
+    """
+    if isinstance(messages, str):
+        messages = [{'role': 'user', 'content': messages}]
+    prompt = [
+        (message.get('role', 'user'), ' '.join(normalize_text(message.get('content', '')).split()))
+        for message in messages
+    ]
+    payload = json.dumps(
+        [model, prompt, options or {}, format or ''],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache hai tang (memory LRU + TTL, sqlite tuy chon) cho cau tra loi LLM
+    """
+
+    # Khi tang disk vuot gioi han, xoa xuong con ti le nay (khong xoa moi lan ghi)
+    DISK_LOW_WATER = 0.9
+
+    def __init__(self, max_entries=None, ttl=None, disk_path=None, disk_max_entries=None):
+        """
+        Args:
+            max_entries (int): So cau tra loi toi da giu trong memory
+            ttl (float): Thoi gian song cua mot cau tra loi (giay)
+            disk_path (str): File sqlite cho tang disk (None = chi dung memory)
+            disk_max_entries (int): So cau tra loi toi da trong file sqlite
+        """
+        self.max_entries = max_entries if max_entries is not None else config.LLM_CACHE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else config.LLM_CACHE_TTL
+        self.disk_path = disk_path
+        self.disk_max_entries = (
+            disk_max_entries if disk_max_entries is not None else config.LLM_CACHE_DISK_MAX_ENTRIES
+        )
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        # Uoc luong so row tren disk (dem thua khi INSERT OR REPLACE ghi de)
+        self._disk_rows = 0
+
+        # Stats
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def get(self, key):
+        """
+        Lay cau tra loi da cache
+
+        Args:
+            key (str): Key tu make_cache_key
+
+        Returns:
+            str: Cau tra loi, hoac None neu miss / het han
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if now < expires_at:
+                        self._store(key, value, expires_at)
+                        self.disk_hits += 1
+                        return value
+                    self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._disk.commit()
+                    self._disk_rows -= 1
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Luu cau tra loi
+
+        Args:
+            key (str): Key tu make_cache_key
+            value (str): Cau tra loi
+        """
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self._disk_rows += 1
+                self._disk_rows -= self._disk.execute(
+                    "DELETE FROM llm_cache WHERE expires_at <= ?", (now,)
+                ).rowcount
+                if self._disk_rows > self.disk_max_entries:
+                    self._trim_disk()
+                self._disk.commit()
+
+    def clear(self):
+        """Xoa toan bo cache (ca tang disk)"""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+                self._disk_rows = 0
+
+    def stats(self):
+        """Thong ke cache (hit rate tinh ca tang memory va disk)"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'disk': self.disk_path,
+                'disk_entries': self._disk_rows if self._disk is not None else None,
+                'disk_max_entries': self.disk_max_entries,
+                'disk_evictions': self.disk_evictions
+            }
+
+    def close(self):
+        """Dong file sqlite"""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _store(self, key, value, expires_at):
+        """Ghi vao tang memory va evict LRU (goi khi dang giu lock)"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        """
+        Dem lai so row va xoa cac row het han som nhat (ghi som nhat, vi TTL
+        bang nhau) xuong con DISK_LOW_WATER * disk_max_entries (goi khi dang giu lock)
+        """
+        rows = self._disk.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if rows > self.disk_max_entries:
+            keep = int(self.disk_max_entries * self.DISK_LOW_WATER)
+            deleted = self._disk.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY expires_at LIMIT ?
+                )
+            """, (rows - keep,)).rowcount
+            self.disk_evictions += deleted
+            rows -= deleted
+        self._disk_rows = rows
+
+    def _open_disk(self, path):
+        """Mo (hoac tao) file sqlite va don cac cau tra loi da het han"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._disk = sqlite3.connect(path, check_same_thread=False)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._disk.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache (expires_at)"
+        )
+        self._disk.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        self._trim_disk()
+        self._disk.commit()
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Lay LLMResponseCache dung chung (None neu cache bi tat)
+
+    Returns:
+        LLMResponseCache: Cache dung chung
+    """
+    global _llm_cache
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(disk_path=config.LLM_CACHE_PATH or None)
+    return _llm_cache
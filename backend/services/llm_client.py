@@ -0,0 +1,500 @@
+"""
+llm_client.py - Client goi Ollama (chat thuong va streaming)
+
+Mot client dung chung cho ca process: giu pool HTTP keep-alive toi
+OLLAMA_HOST, nap san (preload) model luc khoi dong va gui keep_alive voi
+moi request de model luon nam trong memory cua Ollama. Thong ke health va
+latency de theo doi qua /api/llm/health. Cau tra loi chat duoc cache
+(LLMResponseCache) theo prompt da chuan hoa neu client co cache.
+
+Cac ham a* (achat, astream_chat, aembed) la ban async cho ASGI server: dung
+ollama.AsyncClient (pool httpx async rieng) va chay tren event loop.
+"""
+
+import threading
+import time
+from collections import deque
+
+import config
+from services.llm_cache import get_llm_cache, make_cache_key
+
+
+def parse_keep_alive(value):
+    """
+    Chuyen gia tri keep_alive tu config sang dang Ollama nhan
+
+    Args:
+        value: '30m', '1h', '-1', 300...
+
+    Returns:
+        int/float/str: So giay (-1 = giu model mai mai) hoac chuoi duration
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class LLMClient:
+    """
+    Client cho Ollama chat API
+    """
+
+    # So request gan nhat dung de tinh percentile latency
+    LATENCY_WINDOW = 500
+
+    def __init__(self, host=None, model=None, keep_alive=None, timeout=None,
+                 max_connections=None, max_keepalive_connections=None, cache=None):
+        """
+        Args:
+            host (str): Dia chi Ollama server (mac dinh config.OLLAMA_HOST)
+            model (str): Ten model (mac dinh config.OLLAMA_MODEL)
+            keep_alive: Thoi gian Ollama giu model sau request ('30m', -1 = mai mai)
+            timeout (float): Timeout moi request (giay)
+            max_connections (int): So HTTP connection toi da toi Ollama
+            max_keepalive_connections (int): So connection rang giu lai de dung lai
+            cache (LLMResponseCache): Cache cau tra loi (None = khong cache)
+        """
+        self.host = host or config.OLLAMA_HOST
+        self.model = model or config.OLLAMA_MODEL
+        self.keep_alive = parse_keep_alive(
+            keep_alive if keep_alive is not None else config.OLLAMA_KEEP_ALIVE
+        )
+        self.timeout = timeout if timeout is not None else config.OLLAMA_TIMEOUT
+        self.max_connections = max_connections or config.OLLAMA_MAX_CONNECTIONS
+        self.max_keepalive_connections = (
+            max_keepalive_connections or config.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+        )
+        self.cache = cache
+        self._client = None
+        self._async_client = None
+        # Transport httpx (pool connection) do client tao va tu dong
+        self._transport = None
+        self._async_transport = None
+        self._client_lock = threading.Lock()
+
+        # Stats
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.last_latency_ms = None
+        self.last_error = None
+        self.first_token_ms = None
+        self.preloaded = False
+        self.preload_ms = None
+
+    def _get_client(self):
+        """Tao ollama.Client (pool HTTP keep-alive) mot lan va dung lai"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    import ollama
+                    self._transport = httpx.HTTPTransport(limits=self._http_limits())
+                    self._client = ollama.Client(
+                        host=self.host, timeout=self._http_timeout(), transport=self._transport
+                    )
+        return self._client
+
+    def _get_async_client(self):
+        """Tao ollama.AsyncClient (pool httpx async, gan voi event loop cua process)"""
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    import httpx
+                    import ollama
+                    self._async_transport = httpx.AsyncHTTPTransport(limits=self._http_limits())
+                    self._async_client = ollama.AsyncClient(
+                        host=self.host, timeout=self._http_timeout(), transport=self._async_transport
+                    )
+        return self._async_client
+
+    def _http_timeout(self):
+        """Timeout moi request cho httpx"""
+        import httpx
+        return httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0))
+
+    def _http_limits(self):
+        """Gioi han pool keep-alive cua transport"""
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=config.OLLAMA_KEEPALIVE_EXPIRY
+        )
+
+    # =========================================================================
+    # REQUESTS
+    # =========================================================================
+
+    def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+        """
+        Goi chat va tra ve toan bo cau tra loi
+
+        Args:
+            messages (list): Danh sach message {'role', 'content'}
+            options (dict): Options cua Ollama (temperature, num_predict...)
+            format: '' / 'json' / JSON schema cho structured output
+            use_cache (bool): Doc / ghi cache cau tra loi
+            usage (dict): Neu co, duoc dien so token va thoi gian cua request
+                (prompt_tokens, completion_tokens, latency_ms); cache hit de trong
+
+        Returns:
+            str: Noi dung cau tra loi
+        """
+        cache_key = self._cache_key(messages, options, format) if use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        started = time.perf_counter()
+        try:
+            response = self._get_client().chat(
+                model=self.model,
+                messages=messages,
+                options=options,
+                format=format,
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        return self._chat_content(response, started, cache_key, usage)
+
+    async def achat(self, messages, options=None, format=None, use_cache=True, usage=None):
+        """Ban async cua chat() (tham so va ket qua giong chat)"""
+        cache_key = self._cache_key(messages, options, format) if use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        started = time.perf_counter()
+        try:
+            response = await self._get_async_client().chat(
+                model=self.model,
+                messages=messages,
+                options=options,
+                format=format,
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        return self._chat_content(response, started, cache_key, usage)
+
+    def _chat_content(self, response, started, cache_key, usage):
+        """Ghi nhan stats / usage cua mot response chat, cache va tra ve noi dung"""
+        elapsed = self._record(started, response=response)
+        if usage is not None:
+            usage.update({
+                'prompt_tokens': response.get('prompt_eval_count') or 0,
+                'completion_tokens': response.get('eval_count') or 0,
+                'latency_ms': round(elapsed, 2)
+            })
+        content = response['message']['content']
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    def stream_chat(self, messages, options=None, use_cache=True):
+        """
+        Goi chat o che do streaming, yield tung token ngay khi Ollama tra ve
+
+        Cache hit tra ve ca cau tra loi trong mot lan yield; cau tra loi
+        chi duoc cache khi stream ket thuc tron ven.
+
+        Args:
+            messages (list): Danh sach message {'role', 'content'}
+            options (dict): Options cua Ollama
+            use_cache (bool): Doc / ghi cache cau tra loi
+
+        Yields:
+            str: Tung doan text (token) cua cau tra loi
+        """
+        cache_key = self._cache_key(messages, options) if use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.perf_counter()
+        first_token = True
+        tokens = []
+        try:
+            stream = self._get_client().chat(
+                model=self.model,
+                messages=messages,
+                options=options,
+                stream=True,
+                keep_alive=self.keep_alive
+            )
+            for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    if first_token:
+                        first_token = False
+                        self.first_token_ms = (time.perf_counter() - started) * 1000
+                    tokens.append(content)
+                    yield content
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started)
+        if cache_key is not None:
+            self.cache.put(cache_key, ''.join(tokens))
+
+    async def astream_chat(self, messages, options=None, use_cache=True):
+        """Ban async cua stream_chat() (async generator)"""
+        cache_key = self._cache_key(messages, options) if use_cache else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.perf_counter()
+        first_token = True
+        tokens = []
+        try:
+            stream = await self._get_async_client().chat(
+                model=self.model,
+                messages=messages,
+                options=options,
+                stream=True,
+                keep_alive=self.keep_alive
+            )
+            async for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    if first_token:
+                        first_token = False
+                        self.first_token_ms = (time.perf_counter() - started) * 1000
+                    tokens.append(content)
+                    yield content
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started)
+        if cache_key is not None:
+            self.cache.put(cache_key, ''.join(tokens))
+
+    def embed(self, texts, model=None):
+        """
+        Tinh embedding cho mot batch text (mot request)
+
+        Args:
+            texts (list): Danh sach text
+            model (str): Model embedding (mac dinh config.OLLAMA_EMBED_MODEL)
+
+        Returns:
+            list: Mot vector (list float) cho moi text
+        """
+        started = time.perf_counter()
+        try:
+            response = self._get_client().embed(
+                model=model or config.OLLAMA_EMBED_MODEL,
+                input=list(texts),
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started)
+        return response['embeddings']
+
+    async def aembed(self, texts, model=None):
+        """Ban async cua embed()"""
+        started = time.perf_counter()
+        try:
+            response = await self._get_async_client().embed(
+                model=model or config.OLLAMA_EMBED_MODEL,
+                input=list(texts),
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            self._record(started, error=e)
+            raise
+        self._record(started)
+        return response['embeddings']
+
+    # =========================================================================
+    # WARM-UP / HEALTH
+    # =========================================================================
+
+    def preload(self, background=False):
+        """
+        Nap model vao memory cua Ollama va giu lai theo keep_alive
+
+        Generate voi prompt rong chi load model, khong sinh token.
+
+        Args:
+            background (bool): Chay tren daemon thread (khong chan startup)
+
+        Returns:
+            bool: True neu preload thanh cong (luon True khi background)
+        """
+        if background:
+            threading.Thread(target=self.preload, name='llm-preload', daemon=True).start()
+            return True
+
+        started = time.perf_counter()
+        try:
+            self._get_client().generate(
+                model=self.model,
+                prompt='',
+                keep_alive=self.keep_alive
+            )
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[LLMClient] Preload of {self.model} failed: {str(e)}")
+            return False
+        self.preload_ms = (time.perf_counter() - started) * 1000
+        self.preloaded = True
+        print(f"[LLMClient] Model {self.model} loaded in {self.preload_ms:.0f}ms "
+              f"(keep_alive={self.keep_alive})")
+        return True
+
+    def health(self):
+        """
+        Kiem tra Ollama con song va model co dang nam trong memory khong
+
+        Returns:
+            dict: status, model_loaded, latency_ms va stats
+        """
+        started = time.perf_counter()
+        try:
+            running = self._get_client().ps()
+        except Exception as e:
+            return self._health_error(e)
+        return self._health_ok(running, started)
+
+    async def ahealth(self):
+        """Ban async cua health()"""
+        started = time.perf_counter()
+        try:
+            running = await self._get_async_client().ps()
+        except Exception as e:
+            return self._health_error(e)
+        return self._health_ok(running, started)
+
+    def _health_error(self, error):
+        return {
+            'status': 'error',
+            'host': self.host,
+            'model': self.model,
+            'error': str(error),
+            'stats': self.stats()
+        }
+
+    def _health_ok(self, running, started):
+        model_loaded = any(
+            self.model in (m.get('model'), m.get('name')) for m in running.get('models') or []
+        )
+        return {
+            'status': 'ok',
+            'host': self.host,
+            'model': self.model,
+            'model_loaded': model_loaded,
+            'keep_alive': self.keep_alive,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            'stats': self.stats(),
+            'cache': self.cache.stats() if self.cache is not None else None
+        }
+
+    def stats(self):
+        """Thong ke request va latency (ms)"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            requests = self.requests
+            errors = self.errors
+            prompt_tokens = self.prompt_tokens
+            completion_tokens = self.completion_tokens
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+        return {
+            'requests': requests,
+            'errors': errors,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'avg_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'last_ms': round(self.last_latency_ms, 2) if self.last_latency_ms is not None else None,
+            'first_token_ms': round(self.first_token_ms, 2) if self.first_token_ms is not None else None,
+            'preloaded': self.preloaded,
+            'preload_ms': round(self.preload_ms, 2) if self.preload_ms is not None else None,
+            'last_error': self.last_error
+        }
+
+    def _cache_key(self, messages, options=None, format=None):
+        """Key cache cho request (None neu client khong co cache)"""
+        if self.cache is None:
+            return None
+        return make_cache_key(self.model, messages, options, format)
+
+    def _record(self, started, error=None, response=None):
+        """Ghi nhan latency (va so token neu co response) cua mot request"""
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self.requests += 1
+            self.last_latency_ms = elapsed
+            if error is not None:
+                self.errors += 1
+                self.last_error = str(error)
+            else:
+                self._latencies.append(elapsed)
+            if response is not None:
+                self.prompt_tokens += response.get('prompt_eval_count') or 0
+                self.completion_tokens += response.get('eval_count') or 0
+        return elapsed
+
+    def close(self):
+        """Dong pool HTTP"""
+        with self._client_lock:
+            transport, self._transport = self._transport, None
+            self._client = None
+        if transport is not None:
+            transport.close()
+
+    async def aclose(self):
+        """Dong pool HTTP async (goi tren event loop da dung no)"""
+        with self._client_lock:
+            transport, self._async_transport = self._async_transport, None
+            self._async_client = None
+        if transport is not None:
+            await transport.aclose()
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Lay LLMClient dung chung (mot pool keep-alive cho ca process)
+
+    Returns:
+        LLMClient: Client dung chung
+    """
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient(cache=get_llm_cache())
+    return _llm_client
@@ -0,0 +1,573 @@
+"""
+llm_dispatcher.py - Dieu phoi cac request LLM dong thoi
+
+Ollama chay mot model cuc bo va chi xu ly OLLAMA_NUM_PARALLEL request cung
+luc; cac request con lai xep hang ben trong Ollama theo thu tu den. Dispatcher
+giu hang doi o phia backend de:
+- Gop cac prompt giong nhau dang chay (single-flight): chi mot request toi
+  Ollama, cac caller khac nhan chung ket qua.
+- Gioi han so request dong thoi bang OLLAMA_NUM_PARALLEL.
+- Uu tien lane urgent (session nghi ngo nang) truoc lane routine.
+- Tu choi som (DispatcherBusyError) khi hang doi day thay vi treo request:
+  so request dang chay + dang cho toi da num_parallel + queue_size, kiem tra
+  ngay luc submit (hang doi noi bo cua thread pool khong co gioi han).
+Request chay tren thread pool rieng nen timeout cua caller la strict: caller
+khong cho qua timeout, con request van chay tiep va ghi ket qua vao cache.
+
+achat / astream_chat la ban async (ASGI): request chay thanh task tren event
+loop bang client async, cho slot bang future thay vi giu thread. Hai ban
+dung chung hang doi, slot va single-flight.
+"""
+
+import asyncio
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import config
+from services.llm_cache import make_cache_key
+from services.llm_client import get_llm_client
+
+# Lane uu tien (so nho hon duoc phuc vu truoc)
+PRIORITY_URGENT = 0
+PRIORITY_ROUTINE = 1
+
+LANES = {
+    PRIORITY_URGENT: 'urgent',
+    PRIORITY_ROUTINE: 'routine',
+}
+
+
+# Danh dau stream da ket thuc (queue giua thread doc stream va caller)
+_END_OF_STREAM = object()
+
+
+class DispatcherBusyError(Exception):
+    """Hang doi LLM da day"""
+    pass
+
+
+class DispatchTimeoutError(Exception):
+    """Cho slot LLM (hoac ket qua cua request dang chay) qua lau"""
+    pass
+
+
+class _Flight:
+    """Mot request dang chay; cac caller cung prompt cho tren event (hoac future)"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ticket = None
+        self.usage = {}
+        self.result = None
+        self.error = None
+        self._waiters = []
+        self._lock = threading.Lock()
+
+    def wait_async(self):
+        """Future tren event loop hien tai, xong khi request ket thuc"""
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self.event.is_set():
+                future.set_result(None)
+            else:
+                self._waiters.append(future)
+        return future
+
+    def finish(self):
+        """Bao ket qua cho moi caller dang cho (thread va event loop)"""
+        with self._lock:
+            self.event.set()
+            waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            _wake(future)
+
+
+def _wake(future):
+    """Danh thuc future tu bat ky thread nao"""
+    def resolve():
+        if not future.done():
+            future.set_result(None)
+    future.get_loop().call_soon_threadsafe(resolve)
+
+
+class LLMDispatcher:
+    """
+    Hang doi uu tien co gioi han + single-flight truoc LLMClient
+    """
+
+    def __init__(self, client=None, num_parallel=None, queue_size=None, queue_timeout=None):
+        """
+        Args:
+            client (LLMClient): Client goi Ollama (mac dinh client dung chung)
+            num_parallel (int): So request dong thoi toi Ollama
+            queue_size (int): So request toi da dang cho slot
+            queue_timeout (float): Thoi gian cho slot mac dinh (giay)
+        """
+        self.client = client or get_llm_client()
+        self.num_parallel = num_parallel or config.OLLAMA_NUM_PARALLEL
+        self.queue_size = queue_size or config.LLM_QUEUE_SIZE
+        self.queue_timeout = queue_timeout if queue_timeout is not None else config.LLM_QUEUE_TIMEOUT
+
+        self._cond = threading.Condition()
+        self._waiting = []          # heap cua ticket [priority, seq]
+        self._seq = itertools.count()
+        self._active = 0
+        self._async_waiters = []    # future cua caller async dang cho slot
+        self._tasks = set()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._executor = None
+        # Moi request (leader) giu mot phan cho tu luc submit den khi xong
+        self._capacity = threading.BoundedSemaphore(self.num_parallel + self.queue_size)
+        self._stats_lock = threading.Lock()
+
+        # Stats
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._wait_ms = {lane: [0, 0.0, 0.0] for lane in LANES.values()}  # count, total, max
+
+    # =========================================================================
+    # PUBLIC API
+    # =========================================================================
+
+    def chat(self, messages, options=None, format=None, priority=PRIORITY_ROUTINE,
+             timeout=None, use_cache=True, usage=None):
+        """
+        Goi chat qua hang doi; prompt giong mot request dang chay se doi ket qua do
+
+        Args:
+            messages (list): Danh sach message {'role', 'content'}
+            options (dict): Options cua Ollama
+            format: '' / 'json' / JSON schema cho structured output
+            priority (int): PRIORITY_URGENT hoac PRIORITY_ROUTINE
+            timeout (float): Thoi gian cho toi da, tinh ca thoi gian generate
+                (mac dinh queue_timeout)
+            use_cache (bool): Doc / ghi cache cau tra loi cua client
+            usage (dict): Neu co, duoc dien so token / latency cua request toi
+                Ollama (xem LLMClient.chat); cache hit de trong
+
+        Returns:
+            str: Noi dung cau tra loi
+
+        Raises:
+            DispatcherBusyError: Hang doi day
+            DispatchTimeoutError: Cho qua timeout
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        key = make_cache_key(self.client.model, messages, options, format)
+        cache = self.client.cache if use_cache else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        flight, leader = self._join_flight(key, priority)
+        if leader and self._reserve(key, flight):
+            self._get_executor().submit(
+                self._run_flight, key, flight, messages, options, format, cache
+            )
+
+        # Caller het thoi gian van de request chay tiep: ket qua vao cache cho lan sau
+        if not flight.event.wait(timeout):
+            self._count('timeouts')
+            raise DispatchTimeoutError(f"LLM request did not finish within {timeout}s")
+        return self._flight_result(flight, usage)
+
+    async def achat(self, messages, options=None, format=None, priority=PRIORITY_ROUTINE,
+                    timeout=None, use_cache=True, usage=None):
+        """Ban async cua chat(): request chay thanh task tren event loop"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        key = make_cache_key(self.client.model, messages, options, format)
+        cache = self.client.cache if use_cache else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        flight, leader = self._join_flight(key, priority)
+        if leader and self._reserve(key, flight):
+            task = asyncio.get_running_loop().create_task(
+                self._arun_flight(key, flight, messages, options, format, cache)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(flight.wait_async()), timeout)
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            raise DispatchTimeoutError(f"LLM request did not finish within {timeout}s")
+        return self._flight_result(flight, usage)
+
+    def stream_chat(self, messages, options=None, priority=PRIORITY_ROUTINE,
+                    timeout=None, use_cache=True):
+        """
+        Goi chat streaming qua hang doi; slot duoc giu den khi stream ket thuc
+
+        Stream khong duoc gop (moi caller can token rieng), nhung cau tra loi
+        da cache duoc tra ve ngay ma khong chiem slot.
+
+        Args:
+            timeout (float): Thoi gian toi da cho ca stream, tinh ca thoi gian
+                cho slot (mac dinh queue_timeout); qua han thi stream dung
+                ngay ca khi Ollama dang treo giua chung
+
+        Yields:
+            str: Tung doan text (token) cua cau tra loi
+
+        Raises:
+            DispatchTimeoutError: Stream chua xong khi het timeout
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        cache = self.client.cache if use_cache else None
+        key = make_cache_key(self.client.model, messages, options) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        self._count('submitted')
+        tokens = []
+        with self._slot([priority, next(self._seq)], timeout):
+            stream = self.client.stream_chat(messages, options=options, use_cache=False)
+            for token in self._stream_until(stream, deadline, timeout):
+                tokens.append(token)
+                yield token
+        if cache is not None:
+            cache.put(key, ''.join(tokens))
+
+    async def astream_chat(self, messages, options=None, priority=PRIORITY_ROUTINE,
+                           timeout=None, use_cache=True):
+        """Ban async cua stream_chat() (async generator)"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        cache = self.client.cache if use_cache else None
+        key = make_cache_key(self.client.model, messages, options) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        self._count('submitted')
+        tokens = []
+        async with self._aslot([priority, next(self._seq)], timeout):
+            stream = self.client.astream_chat(messages, options=options, use_cache=False)
+            try:
+                while True:
+                    try:
+                        token = await asyncio.wait_for(
+                            stream.__anext__(), max(0.0, deadline - time.monotonic())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self._count('timeouts')
+                        raise DispatchTimeoutError(f"LLM stream did not finish within {timeout}s")
+                    tokens.append(token)
+                    yield token
+            finally:
+                await stream.aclose()
+        if cache is not None:
+            cache.put(key, ''.join(tokens))
+
+    def stats(self):
+        """Thong ke hang doi (thoi gian cho slot theo lane, ms)"""
+        with self._cond:
+            waiting = {lane: 0 for lane in LANES.values()}
+            for ticket in self._waiting:
+                waiting[LANES.get(ticket[0], 'routine')] += 1
+            active = self._active
+            wait_ms = {
+                lane: {
+                    'avg': round(total / count, 2) if count else None,
+                    'max': round(worst, 2)
+                }
+                for lane, (count, total, worst) in self._wait_ms.items()
+            }
+        with self._stats_lock:
+            counters = {
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts
+            }
+        return {
+            'num_parallel': self.num_parallel,
+            'active': active,
+            'waiting': waiting,
+            'queue_size': self.queue_size,
+            **counters,
+            'wait_ms': wait_ms
+        }
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _get_executor(self):
+        """Thread pool chay cac request LLM (du cho moi slot va moi cho trong queue)"""
+        if self._executor is None:
+            with self._inflight_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.num_parallel + self.queue_size,
+                        thread_name_prefix='llm-dispatch'
+                    )
+        return self._executor
+
+    def _stream_until(self, stream, deadline, timeout):
+        """
+        Doc stream tren thread rieng de caller dung dung luc deadline (ke ca
+        khi Ollama treo giua chung); thread do dong stream o token ke tiep
+        """
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def pump():
+            try:
+                for token in stream:
+                    chunks.put(token)
+                    if stop.is_set():
+                        break
+                chunks.put(_END_OF_STREAM)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                stream.close()
+
+        threading.Thread(target=pump, name='llm-stream', daemon=True).start()
+        try:
+            while True:
+                try:
+                    chunk = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self._count('timeouts')
+                    raise DispatchTimeoutError(f"LLM stream did not finish within {timeout}s")
+                if chunk is _END_OF_STREAM:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stop.set()
+
+    def _count(self, name):
+        """Tang mot counter thong ke (goi tu nhieu thread / event loop)"""
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _reserve(self, key, flight):
+        """
+        Giu cho cho mot request moi truoc khi submit; het cho thi request
+        (va cac caller da gop vao) nhan DispatcherBusyError ngay
+
+        Returns:
+            bool: True neu duoc submit
+        """
+        if self._capacity.acquire(blocking=False):
+            return True
+        self._count('rejected')
+        flight.error = DispatcherBusyError(
+            f"LLM queue is full ({self.num_parallel + self.queue_size} in flight)"
+        )
+        self._end_flight(key, flight)
+        return False
+
+    def _join_flight(self, key, priority):
+        """Lay request dang chay cung prompt, hoac tao moi; tra ve (flight, leader)"""
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                flight.ticket = [priority, next(self._seq)]
+                self._inflight[key] = flight
+        self._count('submitted')
+        if not leader:
+            self._count('coalesced')
+            # Request urgent gop vao request routine: day request do len lane urgent
+            self._promote(flight.ticket, priority)
+        return flight, leader
+
+    @staticmethod
+    def _flight_result(flight, usage):
+        if flight.error is not None:
+            raise flight.error
+        if usage is not None:
+            usage.update(flight.usage)
+        return flight.result
+
+    def _run_flight(self, key, flight, messages, options, format, cache):
+        """Chay mot request (tren executor) va bao ket qua cho moi caller dang cho"""
+        try:
+            with self._slot(flight.ticket, self.queue_timeout):
+                flight.result = self.client.chat(
+                    messages, options=options, format=format, use_cache=False,
+                    usage=flight.usage
+                )
+            if cache is not None:
+                cache.put(key, flight.result)
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._end_flight(key, flight)
+            self._capacity.release()
+
+    async def _arun_flight(self, key, flight, messages, options, format, cache):
+        """Ban async cua _run_flight (task tren event loop)"""
+        try:
+            async with self._aslot(flight.ticket, self.queue_timeout):
+                flight.result = await self.client.achat(
+                    messages, options=options, format=format, use_cache=False,
+                    usage=flight.usage
+                )
+            if cache is not None:
+                cache.put(key, flight.result)
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._end_flight(key, flight)
+            self._capacity.release()
+
+    def _end_flight(self, key, flight):
+        with self._inflight_lock:
+            del self._inflight[key]
+        flight.finish()
+
+    @contextmanager
+    def _slot(self, ticket, timeout):
+        """Giu mot trong num_parallel slot; ticket [priority, seq] quyet dinh thu tu"""
+        self._acquire(ticket, timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def _aslot(self, ticket, timeout):
+        """Ban async cua _slot: cho bang future, khong giu thread"""
+        await self._aacquire(ticket, timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._notify()
+
+    def _acquire(self, ticket, timeout):
+        """Cho den khi ticket dung dau heap va con slot trong"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._enqueue(ticket)
+            while not self._try_take(ticket, started):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(ticket, timeout)
+                self._cond.wait(remaining)
+
+    async def _aacquire(self, ticket, timeout):
+        """Ban async cua _acquire: moi lan slot thay doi, future duoc danh thuc"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            self._enqueue(ticket)
+        try:
+            while True:
+                with self._cond:
+                    if self._try_take(ticket, started):
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._give_up(ticket, timeout)
+                    future = loop.create_future()
+                    self._async_waiters.append(future)
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._notify()
+            raise
+
+    def _enqueue(self, ticket):
+        """Dua ticket vao heap (goi khi giu _cond); tu choi khi hang doi day"""
+        if len(self._waiting) >= self.queue_size:
+            self._count('rejected')
+            raise DispatcherBusyError(f"LLM queue is full ({self.queue_size} waiting)")
+        heapq.heappush(self._waiting, ticket)
+
+    def _try_take(self, ticket, started):
+        """Lay slot neu ticket dung dau heap va con slot trong (goi khi giu _cond)"""
+        if not (self._active < self.num_parallel and self._waiting[0] is ticket):
+            return False
+        heapq.heappop(self._waiting)
+        self._active += 1
+
+        waited = (time.perf_counter() - started) * 1000
+        stats = self._wait_ms[LANES.get(ticket[0], 'routine')]
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+        return True
+
+    def _give_up(self, ticket, timeout):
+        """Bo ticket khoi heap khi het thoi gian cho (goi khi giu _cond)"""
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._notify()
+        self._count('timeouts')
+        raise DispatchTimeoutError(f"No LLM slot within {timeout}s")
+
+    def _notify(self):
+        """Danh thuc moi caller dang cho slot (goi khi giu _cond)"""
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for future in waiters:
+            _wake(future)
+
+    def _promote(self, ticket, priority):
+        """Nang uu tien cua ticket dang cho (khi caller uu tien cao hon gop vao)"""
+        with self._cond:
+            if priority >= ticket[0]:
+                return
+            ticket[0] = priority
+            heapq.heapify(self._waiting)
+            self._notify()
+
+
+_llm_dispatcher = None
+_llm_dispatcher_lock = threading.Lock()
+
+
+def get_llm_dispatcher():
+    """
+    Lay LLMDispatcher dung chung
+
+    Returns:
+        LLMDispatcher: Dispatcher boc LLMClient dung chung
+    """
+    global _llm_dispatcher
+    if _llm_dispatcher is None:
+        with _llm_dispatcher_lock:
+            if _llm_dispatcher is None:
+                _llm_dispatcher = LLMDispatcher()
+    return _llm_dispatcher
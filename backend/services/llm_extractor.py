@@ -0,0 +1,346 @@
+"""
+llm_extractor.py - Trich trieu chung bang LLM (JSON co rang buoc)
+
+Keyword matching bo sot cac cach dien dat khac ("co hong rat rat", "nuot
+dau"). Stage nay chi gui tin nhan hien tai (khong gui ca hoi thoai) va bat
+model tra ve JSON theo schema cua Ollama (format), trong do moi trieu chung
+phai la mot keyword cua symptom_rules (enum). Prompt va enum khong chua ca
+vocabulary: KeywordShortlist chi giu cac keyword co chung am tiet voi tin
+nhan (am tiet hiem xep truoc), cat theo LLM_PROMPT_TOKEN_BUDGET; khong co
+ung vien thi khong goi LLM. Ket qua duoc map lai ve keyword vocabulary va
+cache theo tin nhan da chuan hoa + version cua rule.
+So token (num_predict) va thoi gian (timeout) moi lan goi bi gioi han va
+duoc thong ke de uoc luong phan cung; timeout con bi gioi han boi deadline
+cua request (utils/deadline.py), het thoi gian thi bo qua buoc nay.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+
+import config
+from services.context_builder import CHARS_PER_TOKEN, estimate_tokens
+from services.llm_cache import LLMResponseCache
+from services.io_steps import Step, run_steps
+from services.llm_dispatcher import PRIORITY_ROUTINE, get_llm_dispatcher
+from utils.circuit_breaker import CircuitBreaker
+from utils.deadline import stage_budget
+from utils.text_normalizer import normalize_text
+
+SYSTEM_PROMPT = (
+    'Ban trich xuat trieu chung tu tin nhan cua benh nhan. Chi chon cac trieu '
+    'chung co trong danh sach cho phep va thuc su duoc nhac den trong tin nhan. '
+    'Neu khong co, tra ve danh sach rong. Chi tra ve JSON.'
+)
+
+
+class KeywordShortlist:
+    """
+    Index am tiet -> keyword cua mot snapshot, chon ung vien cho prompt
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords (list): [(keyword, keyword da normalize)] cua snapshot
+        """
+        self.keywords = [kw for kw, _ in keywords]
+        self.index = {}
+        for order, (_, norm_kw) in enumerate(keywords):
+            for token in set((norm_kw or '').split()):
+                self.index.setdefault(token, []).append(order)
+
+        # Am tiet xuat hien trong it keyword co trong so cao hon ("hong" > "dau")
+        total = len(self.keywords)
+        self.weights = {
+            token: math.log(1 + total / len(orders)) for token, orders in self.index.items()
+        }
+
+    def candidates(self, norm_message):
+        """
+        Keyword co chung am tiet voi tin nhan, diem cao truoc
+
+        Args:
+            norm_message (str): Tin nhan da normalize
+
+        Returns:
+            list: Cac keyword (giu thu tu vocabulary khi bang diem)
+        """
+        scores = {}
+        for token in set(norm_message.split()):
+            weight = self.weights.get(token)
+            if weight is None:
+                continue
+            for order in self.index[token]:
+                scores[order] = scores.get(order, 0.0) + weight
+        ranked = sorted(scores, key=lambda order: (-scores[order], order))
+        return [self.keywords[order] for order in ranked]
+
+
+class LLMSymptomExtractor:
+    """
+    Trich trieu chung bang LLM, map ve keyword vocabulary cua symptom_rules
+    """
+
+    def __init__(self, dispatcher=None, breaker=None, timeout=None, num_predict=None,
+                 cache_size=None, token_budget=None):
+        """
+        Args:
+            dispatcher (LLMDispatcher): Hang doi LLM (mac dinh dispatcher dung chung)
+            breaker (CircuitBreaker): Circuit breaker cho Ollama
+            timeout (float): Thoi gian toi da cho mot lan goi LLM (giay)
+            num_predict (int): So token toi da LLM duoc sinh moi lan goi
+            cache_size (int): So tin nhan toi da giu ket qua trong cache
+            token_budget (int): So token toi da cua prompt (danh sach ung vien + tin nhan)
+        """
+        self.dispatcher = dispatcher or get_llm_dispatcher()
+        self.breaker = breaker or CircuitBreaker(
+            config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_TIMEOUT
+        )
+        self.timeout = timeout if timeout is not None else config.LLM_EXTRACTION_TIMEOUT
+        self.num_predict = num_predict or config.LLM_EXTRACTION_NUM_PREDICT
+        self.token_budget = token_budget or config.LLM_PROMPT_TOKEN_BUDGET
+        self.cache = LLMResponseCache(
+            max_entries=cache_size or config.LLM_EXTRACTION_CACHE_SIZE,
+            ttl=config.LLM_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+        self._shortlist = (None, None)
+
+        # Stats
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.skipped_deadline = 0
+        self.skipped_no_candidates = 0
+        self.candidates = 0
+        self.symptoms_found = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.max_completion_tokens = 0
+
+    def extract(self, norm_message, snapshot, priority=PRIORITY_ROUTINE):
+        """
+        Trich trieu chung tu mot tin nhan da normalize
+
+        Args:
+            norm_message (str): Tin nhan da normalize (normalize_text)
+            snapshot (RuleSnapshot): Snapshot rule hien tai (vocabulary)
+            priority (int): Lane cua dispatcher
+
+        Returns:
+            list: Cac keyword cua symptom_rules (rong neu khong co / LLM loi)
+        """
+        return run_steps(self.extract_steps(norm_message, snapshot, priority))
+
+    def extract_steps(self, norm_message, snapshot, priority=PRIORITY_ROUTINE):
+        """extract() duoi dang generator Step (xem services/io_steps.py)"""
+        norm_message = ' '.join(norm_message.split())
+        if not norm_message or not snapshot.keywords:
+            return []
+
+        cache_key = hashlib.sha1(
+            f'{snapshot.version}\x00{norm_message}'.encode('utf-8')
+        ).hexdigest()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        # Truoc breaker.allow(): khong ton request thu (half-open) cho tin nhan
+        # khong co ung vien
+        norm_message, vocabulary = self._shortlist_for(norm_message, snapshot)
+        if not vocabulary:
+            with self._lock:
+                self.skipped_no_candidates += 1
+            self.cache.put(cache_key, json.dumps([]))
+            return []
+
+        timeout = stage_budget(
+            'llm_extraction', self.timeout, config.DEADLINE_RESERVE,
+            config.DEADLINE_LLM_MIN_REMAINING
+        )
+        if timeout is None:
+            with self._lock:
+                self.skipped_deadline += 1
+            return []
+
+        if not self.breaker.allow():
+            with self._lock:
+                self.skipped += 1
+            return []
+
+        usage = {}
+        started = time.perf_counter()
+        settled = False
+        try:
+            content = yield Step(
+                self.dispatcher.chat, self.dispatcher.achat,
+                self._build_messages(norm_message, vocabulary),
+                options={'temperature': 0, 'num_predict': self.num_predict},
+                format=self._schema(vocabulary),
+                priority=priority,
+                timeout=timeout,
+                usage=usage
+            )
+            symptoms = self._map_to_vocabulary(json.loads(content).get('symptoms') or [], snapshot)
+            settled = True
+        except Exception as e:
+            settled = True
+            self.breaker.record_failure()
+            with self._lock:
+                self.failures += 1
+            print(f"[LLMExtractor] Extraction failed: {str(e)}")
+            return []
+        finally:
+            self._record(started, usage, len(vocabulary))
+            if not settled:
+                # Bi huy (CancelledError / GeneratorExit): tra lai luot thu cua breaker
+                self.breaker.release()
+
+        self.breaker.record_success()
+        self.cache.put(cache_key, json.dumps(symptoms, ensure_ascii=False))
+        with self._lock:
+            self.symptoms_found += len(symptoms)
+        print(f"[LLMExtractor] Extracted symptoms: {symptoms}")
+        return symptoms
+
+    def stats(self):
+        """Thong ke extraction: budget cau hinh va muc dung thuc te moi lan goi"""
+        with self._lock:
+            calls = self.calls
+            return {
+                'budget': {
+                    'num_predict': self.num_predict,
+                    'timeout_ms': round(self.timeout * 1000),
+                    'prompt_tokens': self.token_budget
+                },
+                'calls': calls,
+                'failures': self.failures,
+                'skipped_breaker_open': self.skipped,
+                'skipped_deadline': self.skipped_deadline,
+                'skipped_no_candidates': self.skipped_no_candidates,
+                'avg_candidates': round(self.candidates / calls, 1) if calls else None,
+                'symptoms_found': self.symptoms_found,
+                'avg_latency_ms': round(self.total_latency_ms / calls, 2) if calls else None,
+                'max_latency_ms': round(self.max_latency_ms, 2),
+                'avg_prompt_tokens': round(self.prompt_tokens / calls, 1) if calls else None,
+                'avg_completion_tokens': round(self.completion_tokens / calls, 1) if calls else None,
+                'max_completion_tokens': self.max_completion_tokens,
+                'cache': self.cache.stats(),
+                'breaker': self.breaker.stats()
+            }
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _shortlist_for(self, norm_message, snapshot):
+        """
+        Ung vien cho prompt va enum, vua LLM_PROMPT_TOKEN_BUDGET
+
+        Index cua snapshot duoc dung lai den khi rule doi version.
+
+        Returns:
+            tuple: (tin nhan, co the bi cat; danh sach keyword ung vien)
+        """
+        with self._lock:
+            version, shortlist = self._shortlist
+            if version != snapshot.version:
+                shortlist = KeywordShortlist(snapshot.keywords)
+                self._shortlist = (snapshot.version, shortlist)
+
+        remaining = self.token_budget - estimate_tokens(
+            ''.join(m['content'] for m in self._build_messages('', []))
+        )
+        if estimate_tokens(norm_message) > max(remaining, 0):
+            norm_message = norm_message[:max(remaining, 0) * CHARS_PER_TOKEN]
+        remaining -= estimate_tokens(norm_message)
+
+        vocabulary = []
+        for kw in shortlist.candidates(norm_message):
+            cost = estimate_tokens(kw) + 1
+            if cost > remaining:
+                break
+            vocabulary.append(kw)
+            remaining -= cost
+        return norm_message, vocabulary
+
+    def _build_messages(self, norm_message, vocabulary):
+        """Prompt: danh sach trieu chung cho phep + tin nhan hien tai"""
+        return [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {
+                'role': 'user',
+                'content': f'Trieu chung cho phep: {", ".join(vocabulary)}\nTin nhan: {norm_message}'
+            }
+        ]
+
+    def _schema(self, vocabulary):
+        """JSON schema: symptoms la danh sach cac keyword (enum) cua symptom_rules"""
+        return {
+            'type': 'object',
+            'properties': {
+                'symptoms': {
+                    'type': 'array',
+                    'items': {'type': 'string', 'enum': vocabulary}
+                }
+            },
+            'required': ['symptoms']
+        }
+
+    def _map_to_vocabulary(self, phrases, snapshot):
+        """
+        Map tung cum tu LLM tra ve ve keyword cua symptom_rules
+
+        Khop chinh xac (sau normalize) truoc; neu khong, tim keyword nam
+        trong cum tu bang automaton cua snapshot. Cum tu khong khop bi bo.
+        """
+        by_norm = {norm_kw: kw for kw, norm_kw in snapshot.keywords}
+        symptoms = []
+        for phrase in phrases:
+            norm_phrase = ' '.join(normalize_text(str(phrase)).split())
+            matched = [by_norm[norm_phrase]] if norm_phrase in by_norm else [
+                kw for _, _, kw in snapshot.find_keyword_matches(norm_phrase)
+            ]
+            for kw in matched:
+                if kw not in symptoms:
+                    symptoms.append(kw)
+        return symptoms
+
+    def _record(self, started, usage, candidates):
+        """Ghi nhan latency, so token va so ung vien cua mot lan goi"""
+        elapsed = (time.perf_counter() - started) * 1000
+        completion_tokens = usage.get('completion_tokens', 0)
+        with self._lock:
+            self.calls += 1
+            self.candidates += candidates
+            self.total_latency_ms += elapsed
+            self.max_latency_ms = max(self.max_latency_ms, elapsed)
+            self.prompt_tokens += usage.get('prompt_tokens', 0)
+            self.completion_tokens += completion_tokens
+            self.max_completion_tokens = max(self.max_completion_tokens, completion_tokens)
+
+
+_llm_extractor = None
+_llm_extractor_lock = threading.Lock()
+
+
+def get_llm_extractor():
+    """
+    Lay LLMSymptomExtractor dung chung (None neu LLM extraction bi tat)
+
+    Returns:
+        LLMSymptomExtractor: Extractor dung chung
+    """
+    global _llm_extractor
+    if not config.LLM_EXTRACTION_ENABLED:
+        return None
+    if _llm_extractor is None:
+        with _llm_extractor_lock:
+            if _llm_extractor is None:
+                _llm_extractor = LLMSymptomExtractor()
+    return _llm_extractor
@@ -0,0 +1,242 @@
+"""
+llm_triage.py - LLM fallback cho rule engine (hybrid triage)
+
+Rule engine (keyword) tra loi truoc. LLM chi duoc goi o hai diem quyet dinh:
+- Khong trich duoc trieu chung nao tu tin nhan mo ta trieu chung.
+- Da den luc quyet dinh (du thong tin hoac het luot) nhung best_score < THRESHOLD.
+Moi lan goi co timeout ngan (LLM_TRIAGE_TIMEOUT) va di qua circuit breaker:
+khi Ollama loi / cham lien tiep, cac turn sau bo qua LLM ngay va dung ket
+qua cua rule engine. Khi request sap het deadline (utils/deadline.py), LLM
+bi bo qua va timeout khong vuot qua thoi gian con lai cua request.
+Ty le turn phai goi LLM (escalation rate) duoc thong ke; mot turn goi LLM
+hai lan chi tinh la mot escalation.
+Prompt duoc dung boi ContextBuilder: tom tat session + vai tin nhan gan nhat,
+gioi han theo LLM_PROMPT_TOKEN_BUDGET.
+"""
+
+import json
+import threading
+import time
+
+import config
+from services.context_builder import ContextBuilder
+from services.io_steps import Step, run_steps
+from services.llm_dispatcher import PRIORITY_ROUTINE, get_llm_dispatcher
+from utils.circuit_breaker import CircuitBreaker
+from utils.deadline import stage_budget
+
+# JSON schema cho structured output (Ollama format)
+TRIAGE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'department_id': {'type': ['integer', 'null']},
+        'confidence': {'type': 'number'},
+        'symptoms': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['department_id', 'confidence', 'symptoms']
+}
+
+SYSTEM_PROMPT = (
+    'Ban la dieu duong tiep don cua benh vien. Dua vao mo ta cua benh nhan, '
+    'chon MOT khoa kham phu hop nhat trong danh sach (department_id) va liet ke '
+    'cac trieu chung ngan gon bang tieng Viet khong dau. Neu khong du thong tin, '
+    'tra ve department_id = null. confidence tu 0 den 1. Chi tra ve JSON.'
+)
+
+
+class LLMTriage:
+    """
+    Phan loai khoa kham bang LLM khi rule engine khong du tu tin
+    """
+
+    def __init__(self, dispatcher=None, breaker=None, timeout=None, min_confidence=None,
+                 num_predict=None, context_builder=None):
+        """
+        Args:
+            dispatcher (LLMDispatcher): Hang doi LLM (mac dinh dispatcher dung chung)
+            breaker (CircuitBreaker): Circuit breaker cho Ollama
+            timeout (float): Thoi gian toi da cho mot lan goi LLM (giay)
+            min_confidence (float): Nguong confidence de chap nhan khoa LLM chon
+            num_predict (int): So token toi da LLM duoc sinh
+            context_builder (ContextBuilder): Dung prompt trong gioi han token
+        """
+        self.dispatcher = dispatcher or get_llm_dispatcher()
+        self.breaker = breaker or CircuitBreaker(
+            config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_TIMEOUT
+        )
+        self.timeout = timeout if timeout is not None else config.LLM_TRIAGE_TIMEOUT
+        self.min_confidence = (
+            min_confidence if min_confidence is not None else config.LLM_TRIAGE_MIN_CONFIDENCE
+        )
+        self.num_predict = num_predict or config.LLM_TRIAGE_NUM_PREDICT
+        self.context_builder = context_builder or ContextBuilder()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.turns = 0
+        self.escalations = 0
+        self.calls = 0
+        self.answered = 0
+        self.failures = 0
+        self.skipped = 0
+        self.skipped_deadline = 0
+        self.total_latency_ms = 0.0
+
+    def record_turn(self):
+        """Dem mot turn da qua rule engine (mau so cua escalation rate)"""
+        with self._lock:
+            self.turns += 1
+
+    def classify(self, user_message, symptoms, context, departments, priority=PRIORITY_ROUTINE,
+                 history=None, escalated=False):
+        """
+        Hoi LLM khoa kham phu hop
+
+        Args:
+            user_message (str): Tin nhan hien tai cua benh nhan
+            symptoms (list): Trieu chung da thu thap
+            context (dict): Thong tin benh nhan (age, gender, severity...)
+            departments (dict): Cac khoa duoc phep {id: name_vi}
+            priority (int): Lane cua dispatcher
+            history (list): Cac tin nhan truoc cua benh nhan (cu -> moi)
+            escalated (bool): Turn nay da goi LLM mot lan (khong dem escalation lan nua)
+
+        Returns:
+            dict: {'department_id', 'confidence', 'symptoms'} hoac None neu
+                  LLM khong duoc goi / loi / timeout / khong du tu tin
+        """
+        return run_steps(self.classify_steps(
+            user_message, symptoms, context, departments, priority, history, escalated
+        ))
+
+    def classify_steps(self, user_message, symptoms, context, departments,
+                       priority=PRIORITY_ROUTINE, history=None, escalated=False):
+        """classify() duoi dang generator Step (xem services/io_steps.py)"""
+        if not departments:
+            return None
+
+        with self._lock:
+            self.calls += 1
+            if not escalated:
+                self.escalations += 1
+
+        # Request khong con du thoi gian: chi tra loi bang rule
+        timeout = stage_budget(
+            'llm_triage', self.timeout, config.DEADLINE_RESERVE, config.DEADLINE_LLM_MIN_REMAINING
+        )
+        if timeout is None:
+            with self._lock:
+                self.skipped_deadline += 1
+            return None
+
+        if not self.breaker.allow():
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        started = time.perf_counter()
+        settled = False
+        try:
+            content = yield Step(
+                self.dispatcher.chat, self.dispatcher.achat,
+                self._build_messages(user_message, symptoms, context, departments, history),
+                options={'temperature': 0, 'num_predict': self.num_predict},
+                format=TRIAGE_SCHEMA,
+                priority=priority,
+                timeout=timeout
+            )
+            result = self._parse(content, departments)
+            settled = True
+        except Exception as e:
+            settled = True
+            self.breaker.record_failure()
+            with self._lock:
+                self.failures += 1
+            print(f"[LLMTriage] LLM fallback failed: {str(e)}")
+            return None
+        finally:
+            with self._lock:
+                self.total_latency_ms += (time.perf_counter() - started) * 1000
+            if not settled:
+                # Bi huy (CancelledError / GeneratorExit): tra lai luot thu cua breaker
+                self.breaker.release()
+
+        self.breaker.record_success()
+        print(f"[LLMTriage] LLM result: {result}")
+        if result['department_id'] is not None and result['confidence'] < self.min_confidence:
+            result['department_id'] = None
+        if result['department_id'] is not None:
+            with self._lock:
+                self.answered += 1
+        return result
+
+    def stats(self):
+        """Thong ke hybrid triage"""
+        with self._lock:
+            called = self.calls - self.skipped - self.skipped_deadline
+            return {
+                'turns': self.turns,
+                'escalations': self.escalations,
+                'calls': self.calls,
+                'escalation_rate': round(self.escalations / self.turns, 4) if self.turns else 0.0,
+                'answered': self.answered,
+                'failures': self.failures,
+                'skipped_breaker_open': self.skipped,
+                'skipped_deadline': self.skipped_deadline,
+                'avg_latency_ms': round(self.total_latency_ms / called, 2) if called else None,
+                'prompt': self.context_builder.stats(),
+                'breaker': self.breaker.stats()
+            }
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _build_messages(self, user_message, symptoms, context, departments, history=None):
+        """
+        Prompt: system prompt + danh sach khoa (on dinh giua cac turn, Ollama
+        dung lai KV cache), roi tom tat session va tin nhan hien tai
+        """
+        department_lines = '\n'.join(f'{dept_id}: {name}' for dept_id, name in departments.items())
+        return self.context_builder.build(
+            f'{SYSTEM_PROMPT}\nDanh sach khoa:\n{department_lines}',
+            user_message, symptoms, context, history
+        )
+
+    def _parse(self, content, departments):
+        """Doc JSON cua LLM; khoa khong nam trong danh sach duoc coi la null"""
+        data = json.loads(content)
+        department_id = data.get('department_id')
+        if department_id not in departments:
+            department_id = None
+        try:
+            confidence = float(data.get('confidence') or 0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        symptoms = [str(s).strip() for s in data.get('symptoms') or [] if str(s).strip()]
+        return {
+            'department_id': department_id,
+            'confidence': max(0.0, min(confidence, 1.0)),
+            'symptoms': symptoms
+        }
+
+
+_llm_triage = None
+_llm_triage_lock = threading.Lock()
+
+
+def get_llm_triage():
+    """
+    Lay LLMTriage dung chung (None neu hybrid triage bi tat)
+
+    Returns:
+        LLMTriage: Triage dung chung
+    """
+    global _llm_triage
+    if not config.LLM_TRIAGE_ENABLED:
+        return None
+    if _llm_triage is None:
+        with _llm_triage_lock:
+            if _llm_triage is None:
+                _llm_triage = LLMTriage()
+    return _llm_triage
@@ -0,0 +1,71 @@
+"""
+red_flag_matcher.py - Compile red_flags thanh mot matcher duy nhat
+
+Tat ca primary/secondary keyword cua moi red flag duoc gop vao mot
+Aho-Corasick automaton. Moi turn chi can duyet message + symptoms mot lan,
+chi phi khong tang theo so luong red flag.
+"""
+
+from utils.keyword_matcher import KeywordAutomaton
+
+PRIMARY = 'primary'
+SECONDARY = 'secondary'
+
+
+class RedFlagMatcher:
+    """
+    Matcher cho red flags da sap xep theo do uu tien (esi_level ASC)
+    """
+
+    def __init__(self, red_flags):
+        """
+        Args:
+            red_flags (list): Red flags da sap xep theo uu tien, moi flag co
+                'primary_keywords' va 'secondary_keywords' da normalize
+        """
+        self.red_flags = red_flags
+        self.automaton = KeywordAutomaton()
+        for index, flag in enumerate(red_flags):
+            for kw in flag['primary_keywords']:
+                if kw:
+                    self.automaton.add(kw, (index, PRIMARY))
+            for kw in flag['secondary_keywords']:
+                if kw:
+                    self.automaton.add(kw, (index, SECONDARY))
+        self.automaton.build()
+
+    def __len__(self):
+        return len(self.red_flags)
+
+    def match(self, message, symptoms=()):
+        """
+        Tim red flag co do uu tien cao nhat trong message + symptoms
+
+        Quy tac (giong check_red_flags truoc day):
+        - ESI 1: chi can match mot primary keyword
+        - ESI 2: can match ca primary va secondary keyword
+
+        Args:
+            message (str): Message da normalize
+            symptoms (iterable): Cac symptom da normalize
+
+        Returns:
+            dict: Red flag match co uu tien cao nhat, hoac None
+        """
+        primary_hits = set()
+        secondary_hits = set()
+        for _, _, _, payloads in self.automaton.find_all_in([message, *symptoms]):
+            for index, kind in payloads:
+                if kind == PRIMARY:
+                    primary_hits.add(index)
+                else:
+                    secondary_hits.add(index)
+
+        # Index nho hon = uu tien cao hon (red_flags da sap xep san)
+        for index in sorted(primary_hits):
+            flag = self.red_flags[index]
+            if flag['esi_level'] == 1:
+                return flag
+            if flag['esi_level'] == 2 and index in secondary_hits:
+                return flag
+        return None
@@ -0,0 +1,344 @@
+"""
+retention.py - Chuyen hoi thoai cu ra khoi bang nong (conversations, sessions)
+
+Session da ket thuc (conversation_status trong RETENTION_STATUSES) va khong
+cap nhat trong RETENTION_DAYS ngay duoc chuyen theo batch sang kho luu tru:
+- 'table': bang conversations_archive / sessions_archive (SQL Server:
+  DELETE ... OUTPUT INTO, chuyen va xoa trong cung mot cau lenh).
+- 'jsonl': file JSONL.gz trong RETENTION_ARCHIVE_DIR, moi dong mot session
+  kem tat ca cac turn. File duoc ghi va fsync truoc khi xoa khoi bang nong.
+
+Du lieu khong bao gio bi xoa ma khong duoc luu truoc. Moi batch la mot
+transaction: cac row sessions duoc khoa ngay tu dau (UPDLOCK tren SQL Server,
+BEGIN IMMEDIATE tren SQLite) nen turn moi cua cung session (upsert sessions
+trong _save_turn) phai cho batch xong, khong the roi vao giua luc doc va luc
+xoa.
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+
+import config
+from models.database import Database
+from models.session import SESSION_COLUMNS
+
+# Tat ca cac cot cua conversations (ke ca cot trang thai cu) de luu tru day du
+ARCHIVE_TURN_COLUMNS = (
+    'id', 'session_id', 'turn_number', 'user_message', 'bot_response',
+    'extracted_symptoms', 'current_esi_level', 'matched_red_flags',
+    'recommended_department_id', 'conversation_status', 'patient_age',
+    'patient_gender', 'timestamp', 'created_at', 'current_score',
+    'is_pregnant', 'is_pediatric', 'is_severe', 'collected_duration',
+    'collected_severity', 'collected_location', 'last_question_type'
+)
+
+ARCHIVE_SESSION_COLUMNS = SESSION_COLUMNS + ('created_at', 'updated_at')
+
+# Dinh nghia cot cua bang luu tru ({text}, {now}: kieu theo dialect)
+CONVERSATIONS_ARCHIVE_DDL = """
+    id INT NOT NULL,
+    session_id NVARCHAR(100) NOT NULL,
+    turn_number INT NOT NULL,
+    user_message {text},
+    bot_response {text},
+    extracted_symptoms {text},
+    current_esi_level INT,
+    matched_red_flags {text},
+    recommended_department_id INT,
+    conversation_status NVARCHAR(50),
+    patient_age INT,
+    patient_gender NVARCHAR(20),
+    timestamp DATETIME,
+    created_at DATETIME,
+    current_score FLOAT,
+    is_pregnant BIT,
+    is_pediatric BIT,
+    is_severe BIT,
+    collected_duration NVARCHAR(100),
+    collected_severity INT,
+    collected_location NVARCHAR(100),
+    last_question_type NVARCHAR(50),
+    archived_at DATETIME DEFAULT {now}
+"""
+
+SESSIONS_ARCHIVE_DDL = """
+    session_id NVARCHAR(100) NOT NULL,
+    turn_count INT,
+    extracted_symptoms {text},
+    patient_age INT,
+    patient_gender NVARCHAR(20),
+    collected_duration NVARCHAR(100),
+    collected_severity INT,
+    is_pregnant BIT,
+    is_pediatric BIT,
+    is_severe BIT,
+    current_score FLOAT,
+    current_esi_level INT,
+    recommended_department_id INT,
+    conversation_status NVARCHAR(50),
+    last_question_type NVARCHAR(50),
+    created_at DATETIME,
+    updated_at DATETIME,
+    archived_at DATETIME DEFAULT {now}
+"""
+
+
+class RetentionJob:
+    """
+    Chuyen cac session het han sang kho luu tru theo batch
+    """
+
+    MODES = ('table', 'jsonl')
+
+    def __init__(self, days=None, batch_size=None, mode=None, archive_dir=None,
+                 statuses=None, pause=None):
+        """
+        Args:
+            days (int): Chi chuyen session khong cap nhat trong so ngay nay
+            batch_size (int): So session moi transaction
+            mode (str): 'table' hoac 'jsonl'
+            archive_dir (str): Thu muc chua file JSONL.gz (mode 'jsonl')
+            statuses (tuple): Cac conversation_status duoc coi la da ket thuc
+            pause (float): Nghi giua cac batch (giay) de nhuong khoa cho request
+        """
+        self.days = days if days is not None else config.RETENTION_DAYS
+        self.batch_size = batch_size or config.RETENTION_BATCH_SIZE
+        self.mode = mode or config.RETENTION_ARCHIVE_MODE
+        self.archive_dir = archive_dir or config.RETENTION_ARCHIVE_DIR
+        self.statuses = tuple(statuses or config.RETENTION_STATUSES)
+        self.pause = pause if pause is not None else config.RETENTION_BATCH_PAUSE
+
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown archive mode '{self.mode}', expected one of {self.MODES}")
+        if self.days < 0:
+            raise ValueError("days must be >= 0")
+        if not self.statuses:
+            raise ValueError("At least one conversation status is required")
+        # SQL Server cho phep toi da 2100 tham so moi cau lenh
+        if not 0 < self.batch_size <= 1000:
+            raise ValueError("batch_size must be between 1 and 1000")
+
+    def _eligible_filter(self):
+        """Dieu kien WHERE (va params) chon session het han"""
+        placeholders = ', '.join('?' * len(self.statuses))
+        where = (
+            f"conversation_status IN ({placeholders}) "
+            f"AND {Database.dialect().older_than_days('updated_at')}"
+        )
+        return where, self.statuses + (self.days,)
+
+    def ensure_archive_tables(self):
+        """Tao bang luu tru neu chua co (mode 'table')"""
+        dialect = Database.dialect()
+        for table, columns in (('conversations_archive', CONVERSATIONS_ARCHIVE_DDL),
+                               ('sessions_archive', SESSIONS_ARCHIVE_DDL)):
+            columns = columns.strip('\n').format(text=dialect.text_type, now=dialect.now_default)
+            Database.execute_update(dialect.create_table(table, columns))
+        Database.execute_update(dialect.create_index(
+            'idx_conversations_archive_session', 'conversations_archive', 'session_id, turn_number'
+        ))
+        Database.execute_update(dialect.create_index(
+            'idx_sessions_archive_session', 'sessions_archive', 'session_id'
+        ))
+
+    def count_eligible(self):
+        """
+        Dem so session (va turn) se duoc chuyen
+
+        Returns:
+            dict: {'sessions': int, 'turns': int}
+        """
+        where, params = self._eligible_filter()
+        row = Database.execute_query(f"""
+            SELECT COUNT(*) AS sessions, COALESCE(SUM(turn_count), 0) AS turns
+            FROM sessions
+            WHERE {where}
+        """, params, fetch_one=True)
+        return {'sessions': row['sessions'], 'turns': row['turns']} if row else {'sessions': 0, 'turns': 0}
+
+    def run(self, max_batches=None):
+        """
+        Chuyen cac session het han cho den khi het hoac dat max_batches
+
+        Args:
+            max_batches (int): So batch toi da (None = chay den het)
+
+        Returns:
+            dict: Ket qua (so batch, session, turn, file, thoi gian)
+        """
+        started = time.monotonic()
+        result = {
+            'mode': self.mode,
+            'days': self.days,
+            'statuses': list(self.statuses),
+            'batches': 0,
+            'sessions': 0,
+            'turns': 0,
+            'files': []
+        }
+
+        if self.mode == 'table':
+            self.ensure_archive_tables()
+        else:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        # Ten file cua lan chay nay: hai lan chay khong ghi de file cua nhau
+        self._run_stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+        while max_batches is None or result['batches'] < max_batches:
+            moved = self._archive_batch(result['batches'] + 1)
+            if moved is None:
+                break
+            sessions, turns, path = moved
+            result['batches'] += 1
+            result['sessions'] += sessions
+            result['turns'] += turns
+            if path:
+                result['files'].append(path)
+            print(f"[Retention] Batch {result['batches']}: {sessions} sessions, {turns} turns archived")
+            if sessions < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+
+        result['elapsed_s'] = round(time.monotonic() - started, 2)
+        return result
+
+    def _archive_batch(self, batch_number):
+        """
+        Chuyen mot batch session trong mot transaction
+
+        Returns:
+            tuple: (so session, so turn, duong dan file hoac None), None neu het
+        """
+        dialect = Database.dialect()
+        where, params = self._eligible_filter()
+        with Database.unit_of_work(write=True):
+            # Khoa cac row sessions den het transaction: turn moi phai cho
+            query, params = dialect.limit(f"""
+                SELECT {', '.join(ARCHIVE_SESSION_COLUMNS)}
+                FROM sessions{dialect.lock_hint}
+                WHERE {where}
+                ORDER BY updated_at
+            """, params, self.batch_size)
+            sessions = Database.execute_query(query, params)
+            if not sessions:
+                return None
+
+            session_ids = tuple(row['session_id'] for row in sessions)
+            in_list = ', '.join('?' * len(session_ids))
+
+            if self.mode == 'table':
+                path = None
+                turns = self._move_rows(
+                    'conversations', 'conversations_archive', ARCHIVE_TURN_COLUMNS, in_list, session_ids
+                )
+                self._move_rows(
+                    'sessions', 'sessions_archive', ARCHIVE_SESSION_COLUMNS, in_list, session_ids
+                )
+            else:
+                rows = Database.execute_query(f"""
+                    SELECT {', '.join(ARCHIVE_TURN_COLUMNS)}
+                    FROM conversations
+                    WHERE session_id IN ({in_list})
+                    ORDER BY session_id, turn_number
+                """, session_ids)
+                path = self._write_archive_file(batch_number, sessions, rows)
+                turns = Database.execute_update(
+                    f"DELETE FROM conversations WHERE session_id IN ({in_list})", session_ids
+                )
+                Database.execute_update(
+                    f"DELETE FROM sessions WHERE session_id IN ({in_list})", session_ids
+                )
+
+        return len(sessions), turns, path
+
+    @staticmethod
+    def _move_rows(source, target, columns, in_list, session_ids):
+        """Chuyen cac row cua session_ids sang bang luu tru, tra ve so row"""
+        moved = 0
+        for statement in Database.dialect().move_rows(source, target, columns, f"session_id IN ({in_list})"):
+            moved = Database.execute_update(statement, session_ids)
+        return moved
+
+    def _write_archive_file(self, batch_number, sessions, rows):
+        """
+        Ghi mot batch ra file JSONL.gz (ghi ra file tam, fsync roi doi ten)
+
+        Returns:
+            str: Duong dan file
+        """
+        turns_by_session = {}
+        for row in rows:
+            turns_by_session.setdefault(row['session_id'], []).append(row)
+
+        path = os.path.join(
+            self.archive_dir, f'conversations-{self._run_stamp}-{batch_number:04d}.jsonl.gz'
+        )
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for session in sessions:
+                    line = json.dumps({
+                        'session': session,
+                        'turns': turns_by_session.get(session['session_id'], [])
+                    }, ensure_ascii=False, default=str)
+                    f.write((line + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def report(self):
+        """
+        Thong ke bang nong va kho luu tru
+
+        Returns:
+            dict: So row, turn cu nhat, so session se duoc chuyen, kich thuoc kho
+        """
+        dialect = Database.dialect()
+
+        def row_count(table):
+            if not Database.execute_query(*dialect.table_exists(table), fetch_one=True):
+                return None
+            row = Database.execute_query(*dialect.row_count(table), fetch_one=True)
+            return row['row_count'] if row and row['row_count'] is not None else None
+
+        oldest = Database.execute_query(
+            "SELECT MIN(timestamp) AS oldest FROM conversations", fetch_one=True
+        )
+        report = {
+            'hot': {
+                'conversations': row_count('conversations'),
+                'sessions': row_count('sessions'),
+                'oldest_turn': oldest['oldest'] if oldest else None
+            },
+            'eligible': self.count_eligible(),
+            'policy': {
+                'days': self.days,
+                'statuses': list(self.statuses),
+                'mode': self.mode
+            }
+        }
+
+        if self.mode == 'table':
+            report['archive'] = {
+                'conversations': row_count('conversations_archive'),
+                'sessions': row_count('sessions_archive')
+            }
+        else:
+            files = []
+            if os.path.isdir(self.archive_dir):
+                files = [
+                    os.path.join(self.archive_dir, name)
+                    for name in sorted(os.listdir(self.archive_dir))
+                    if name.endswith('.jsonl.gz')
+                ]
+            report['archive'] = {
+                'dir': self.archive_dir,
+                'files': len(files),
+                'bytes': sum(os.path.getsize(path) for path in files)
+            }
+        return report
@@ -0,0 +1,353 @@
+"""
+rule_cache.py - In-process cache cho cac bang rule (symptom_rules, red_flags,
+departments, quick_reply_rules)
+
+Cac bang rule gan nhu khong doi, nen duoc load mot lan thanh mot snapshot
+da parse JSON va da normalize keyword. Mot background thread poll chu ky
+(signature) cua cac bang va chi reload khi co thay doi. Moi lan import rule
+(services/rule_import.py) tang phien ban trong rule_versions, nen signature
+luon doi sau mot lan import.
+"""
+
+import json
+import threading
+import time
+
+import config
+from models.database import Database
+from services.department_index import DepartmentKeywordIndex
+from services.red_flag_matcher import RedFlagMatcher
+from utils.keyword_matcher import KeywordAutomaton
+
+
+class RuleSnapshot:
+    """
+    Mot phien ban bat bien (immutable) cua toan bo rule da compile
+
+    Khong bao gio sua snapshot sau khi tao - khi rule thay doi, RuleCache
+    tao snapshot moi va thay the reference (atomic swap).
+    """
+
+    def __init__(self, version, signature, departments, symptom_rules,
+                 red_flags, quick_replies, normalize):
+        """
+        Args:
+            version (int): So thu tu snapshot trong process
+            signature (tuple): Chu ky cua cac bang rule luc load ((cot, gia tri), ...)
+            departments (list): Cac row cua bang departments
+            symptom_rules (list): Cac row cua bang symptom_rules (is_active = 1)
+            red_flags (list): Cac row cua bang red_flags (is_active = 1)
+            quick_replies (list): Cac row cua bang quick_reply_rules (is_active = 1)
+            normalize (callable): Ham normalize text (bo dau tieng Viet)
+        """
+        self.version = version
+        self.signature = signature
+        self.loaded_at = time.time()
+
+        # Phien ban rule (id cua lan import gan nhat trong rule_versions)
+        rule_version = dict(signature).get('rule_version')
+        self.rule_version = int(rule_version) if rule_version not in (None, 'None') else None
+
+        # Departments (chi giu khoa dang hoat dong)
+        self.departments = {}
+        for dept in departments:
+            if dept.get('is_active') in (None, 1, True):
+                self.departments[dept['id']] = dept
+
+        # Symptom rules: parse keyword JSON va normalize mot lan
+        self.symptom_rules = []
+        for rule in symptom_rules:
+            keywords = self._load_json(rule.get('symptom_keywords'), [])
+            follow_ups = self._load_json(rule.get('follow_up_questions'), [])
+            self.symptom_rules.append({
+                'id': rule['id'],
+                'department_id': rule['department_id'],
+                'keywords': [(kw, normalize(kw)) for kw in keywords],
+                'follow_up_questions': follow_ups,
+                'description': ' - '.join(
+                    text for text in (rule.get('rule_name'), rule.get('additional_notes')) if text
+                )
+            })
+
+        # Danh sach keyword duy nhat dung cho extraction (giu thu tu rule)
+        self.keywords = []
+        seen = set()
+        for rule in self.symptom_rules:
+            for kw, norm_kw in rule['keywords']:
+                if kw not in seen:
+                    seen.add(kw)
+                    self.keywords.append((kw, norm_kw))
+
+        # Automaton tim tat ca keyword trong mot lan duyet message
+        # Payload: (thu tu keyword, keyword goc) de giu thu tu nhu danh sach
+        self.keyword_automaton = KeywordAutomaton()
+        for order, (kw, norm_kw) in enumerate(self.keywords):
+            if norm_kw:
+                self.keyword_automaton.add(norm_kw, (order, kw))
+        self.keyword_automaton.build()
+
+        # Rules dung cho scoring: chi rule thuoc khoa dang hoat dong
+        self.scoring_rules = []
+        for rule in self.symptom_rules:
+            dept = self.departments.get(rule['department_id'])
+            if not dept:
+                continue
+            self.scoring_rules.append({
+                'department_id': rule['department_id'],
+                'name_vi': dept['name_vi'],
+                'name_en': dept.get('name_en') or '',
+                'keywords': rule['keywords'],
+                'description': rule['description']
+            })
+        self.department_index = DepartmentKeywordIndex(self.scoring_rules)
+
+        # Follow-up question dau tien cua moi khoa
+        self.follow_up_questions = {}
+        for rule in self.symptom_rules:
+            dept_id = rule['department_id']
+            if dept_id not in self.follow_up_questions and rule['follow_up_questions']:
+                self.follow_up_questions[dept_id] = rule['follow_up_questions'][0]
+
+        # Red flags: da sap xep theo esi_level ASC, keyword da normalize
+        self.red_flags = []
+        for flag in red_flags:
+            pattern = self._load_json(flag.get('symptom_pattern'), {})
+            compiled = dict(flag)
+            compiled['primary_keywords'] = [normalize(kw) for kw in pattern.get('primary', [])]
+            compiled['secondary_keywords'] = [normalize(kw) for kw in pattern.get('secondary', [])]
+            self.red_flags.append(compiled)
+        self.red_flag_matcher = RedFlagMatcher(self.red_flags)
+
+        # Quick replies: (trigger_type, trigger_value) -> replies cua rule co priority cao nhat
+        self.quick_replies = {}
+        for rule in quick_replies:
+            key = (rule['trigger_type'], rule['trigger_value'])
+            if key in self.quick_replies:
+                continue
+            replies = self._load_json(rule.get('replies_json'), None)
+            if replies is not None:
+                self.quick_replies[key] = replies
+
+    @staticmethod
+    def _load_json(value, default):
+        """Parse JSON column, tra ve default neu rong hoac loi"""
+        if not value:
+            return default
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            return default
+
+    def find_keyword_matches(self, message):
+        """
+        Tim tat ca symptom keyword trong message da normalize (mot lan duyet)
+
+        Args:
+            message (str): Message da normalize
+
+        Returns:
+            list: Danh sach (start, end, keyword) theo thu tu keyword trong rule
+        """
+        matches = []
+        for start, end, _, payloads in self.keyword_automaton.find_all(message):
+            for order, kw in payloads:
+                matches.append((order, start, end, kw))
+        matches.sort()
+        return [(start, end, kw) for _, start, end, kw in matches]
+
+    def get_department(self, department_id):
+        """Lay thong tin khoa dang hoat dong theo ID"""
+        return self.departments.get(department_id)
+
+    def get_quick_replies(self, trigger_type, trigger_value):
+        """Lay quick replies theo trigger"""
+        return self.quick_replies.get((trigger_type, trigger_value), [])
+
+    def get_follow_up_question(self, department_id):
+        """Lay follow-up question dau tien cua khoa"""
+        return self.follow_up_questions.get(department_id)
+
+
+class RuleCache:
+    """
+    Cache snapshot cua cac bang rule, tu dong refresh khi bang thay doi
+    """
+
+    SIGNATURE_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM symptom_rules) AS symptom_rules_count,
+        (SELECT SUM(CAST(is_active AS INT)) FROM symptom_rules) AS symptom_rules_active,
+        (SELECT MAX(updated_at) FROM symptom_rules) AS symptom_rules_updated,
+        (SELECT COUNT(*) FROM red_flags) AS red_flags_count,
+        (SELECT SUM(CAST(is_active AS INT)) FROM red_flags) AS red_flags_active,
+        (SELECT MAX(updated_at) FROM red_flags) AS red_flags_updated,
+        (SELECT COUNT(*) FROM departments) AS departments_count,
+        (SELECT SUM(CAST(is_active AS INT)) FROM departments) AS departments_active,
+        (SELECT MAX(updated_at) FROM departments) AS departments_updated,
+        (SELECT COUNT(*) FROM quick_reply_rules) AS quick_reply_rules_count,
+        (SELECT SUM(CAST(is_active AS INT)) FROM quick_reply_rules) AS quick_reply_rules_active,
+        (SELECT MAX(created_at) FROM quick_reply_rules) AS quick_reply_rules_updated,
+        (SELECT MAX(id) FROM rule_versions) AS rule_version
+    """
+
+    # Database chua chay migrate_db.py (chua co bang rule_versions): phien ban 0
+    LEGACY_SIGNATURE_QUERY = SIGNATURE_QUERY.replace('(SELECT MAX(id) FROM rule_versions)', '0')
+
+    def __init__(self, normalize, refresh_interval=None):
+        """
+        Args:
+            normalize (callable): Ham normalize text dung cho keyword
+            refresh_interval (int): So giay giua cac lan poll signature
+        """
+        self.normalize = normalize
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else config.RULE_CACHE_REFRESH_INTERVAL
+        )
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._legacy_signature = False
+
+    # =========================================================================
+    # PUBLIC API
+    # =========================================================================
+
+    def get_snapshot(self):
+        """
+        Lay snapshot hien tai. Lan goi dau tien se load dong bo tu database
+        va khoi dong background refresh thread.
+
+        Returns:
+            RuleSnapshot: Snapshot rule hien tai
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._load(self._fetch_signature())
+                self._start_refresh_thread()
+            return self._snapshot
+
+    def refresh(self, force=False):
+        """
+        Reload snapshot neu signature cua cac bang rule da thay doi
+
+        Args:
+            force (bool): Reload ke ca khi signature khong doi
+
+        Returns:
+            bool: True neu snapshot da duoc thay the
+        """
+        signature = self._fetch_signature()
+        current = self._snapshot
+        if not force and current is not None and current.signature == signature:
+            return False
+
+        with self._lock:
+            self._snapshot = self._load(signature)
+        print(f"[RuleCache] Loaded rule snapshot v{self._snapshot.version}")
+        return True
+
+    def stop(self):
+        """Dung background refresh thread"""
+        self._stop_event.set()
+
+    # =========================================================================
+    # INTERNALS
+    # =========================================================================
+
+    def _fetch_signature(self):
+        """Lay chu ky cua cac bang rule (count, so row active, updated_at, phien ban)"""
+        try:
+            row = Database.execute_query(self.SIGNATURE_QUERY, fetch_one=True)
+            self._legacy_signature = False
+        except Exception as e:
+            # Loi khac (mat ket noi...) thi query legacy cung loi va nem ra
+            row = Database.execute_query(self.LEGACY_SIGNATURE_QUERY, fetch_one=True)
+            if not self._legacy_signature:
+                print(f"[RuleCache] rule_versions is not readable ({str(e)}), using rule version 0")
+                self._legacy_signature = True
+        return tuple((key, str(value)) for key, value in (row or {}).items())
+
+    def _load(self, signature):
+        """Load toan bo rule tu database va compile thanh snapshot moi"""
+        with Database.unit_of_work():
+            return self._load_tables(signature)
+
+    def _load_tables(self, signature):
+        """Doc 4 bang rule tren cung mot connection"""
+        departments = Database.execute_query("""
+        SELECT id, name_vi, name_en, room_number, floor, building,
+               doctor_name, description, working_hours, is_active
+        FROM departments
+        """)
+        symptom_rules = Database.execute_query("""
+        SELECT id, rule_name, department_id, symptom_keywords, follow_up_questions,
+               additional_notes
+        FROM symptom_rules
+        WHERE is_active = 1
+        ORDER BY id
+        """)
+        red_flags = Database.execute_query("""
+        SELECT id, flag_name, symptom_pattern, esi_level, warning_message,
+               recommended_department
+        FROM red_flags
+        WHERE is_active = 1
+        ORDER BY esi_level ASC, id ASC
+        """)
+        quick_replies = Database.execute_query("""
+        SELECT trigger_type, trigger_value, replies_json
+        FROM quick_reply_rules
+        WHERE is_active = 1
+        ORDER BY priority DESC, id ASC
+        """)
+
+        self._version += 1
+        return RuleSnapshot(
+            self._version, signature, departments, symptom_rules,
+            red_flags, quick_replies, self.normalize
+        )
+
+    def _start_refresh_thread(self):
+        """Khoi dong daemon thread poll signature cua cac bang rule"""
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+        self._thread = threading.Thread(
+            target=self._refresh_loop, name='rule-cache-refresh', daemon=True
+        )
+        self._thread.start()
+
+    def _refresh_loop(self):
+        """Vong lap refresh; loi khi poll chi log, giu nguyen snapshot cu"""
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[RuleCache] Refresh failed, keeping v{self._snapshot.version}: {str(e)}")
+
+
+_rule_cache = None
+_rule_cache_lock = threading.Lock()
+
+
+def get_rule_cache(normalize):
+    """
+    Lay RuleCache dung chung cho toan process (tao lazily o lan goi dau)
+
+    Args:
+        normalize (callable): Ham normalize text dung cho keyword
+
+    Returns:
+        RuleCache: Cache dung chung
+    """
+    global _rule_cache
+    if _rule_cache is None:
+        with _rule_cache_lock:
+            if _rule_cache is None:
+                _rule_cache = RuleCache(normalize)
+    return _rule_cache
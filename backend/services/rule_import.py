@@ -0,0 +1,379 @@
+"""
+rule_import.py - Import hang loat rule (symptom_rules, red_flags, quick_reply_rules)
+
+Rule set duoc doc tu JSON hoac CSV, kiem tra toan bo truoc khi ghi, roi ghi
+trong mot transaction: moi bang la mot executemany (fast_executemany tren
+SQL Server). Cung transaction them mot row vao rule_versions; id cua row do
+la phien ban rule moi va nam trong signature cua RuleCache, nen moi worker
+dang chay se load snapshot moi o lan poll ke tiep (atomic swap, khong can
+restart). Chi cac bang rule bi thay doi - conversations va sessions giu nguyen.
+"""
+
+import csv
+import io
+import json
+
+from models.database import Database
+
+
+class RuleImportError(ValueError):
+    """Rule set khong hop le; errors chua tung loi theo row"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__(f"{len(self.errors)} invalid rule(s): " + '; '.join(self.errors[:5]))
+
+
+# Cot duoc ghi cua moi bang rule, theo thu tu params
+RULE_COLUMNS = {
+    'symptom_rules': (
+        'rule_name', 'department_id', 'symptom_keywords', 'priority',
+        'min_symptoms_match', 'esi_level_default', 'follow_up_questions',
+        'additional_notes', 'is_active'
+    ),
+    'red_flags': (
+        'flag_name', 'symptom_pattern', 'esi_level', 'action', 'warning_message',
+        'recommended_department', 'age_constraint', 'description', 'is_active'
+    ),
+    'quick_reply_rules': (
+        'trigger_type', 'trigger_value', 'replies_json', 'priority', 'is_active'
+    ),
+}
+
+RULE_TABLES = tuple(RULE_COLUMNS)
+
+# Moi lan import la mot row; id = phien ban rule ({pk}, {now}: theo dialect)
+RULE_VERSIONS_DDL = """
+    id {pk},
+    tables NVARCHAR(200) NOT NULL,
+    row_count INT NOT NULL,
+    mode NVARCHAR(20) NOT NULL,
+    source NVARCHAR(200),
+    imported_at DATETIME DEFAULT {now}
+"""
+
+# So loi toi da giu lai trong RuleImportError
+MAX_ERRORS = 50
+
+
+def parse_rules(text, fmt, table=None):
+    """
+    Doc rule set tu noi dung file JSON hoac CSV
+
+    JSON: {"symptom_rules": [...], "red_flags": [...], ...} hoac mot list row
+    (can table). CSV: moi file mot bang (can table), dong dau la ten cot, cot
+    JSON (symptom_keywords, replies_json, ...) viet duoi dang chuoi JSON.
+
+    Args:
+        text (str): Noi dung file
+        fmt (str): 'json' hoac 'csv'
+        table (str): Bang dich khi file chi chua row cua mot bang
+
+    Returns:
+        dict: {table: [row dict, ...]}
+
+    Raises:
+        RuleImportError: Neu file khong doc duoc hoac ten bang khong hop le
+    """
+    if table is not None and table not in RULE_TABLES:
+        raise RuleImportError([f"Unknown rule table '{table}', expected one of {RULE_TABLES}"])
+
+    if fmt == 'json':
+        try:
+            payload = json.loads(text)
+        except ValueError as e:
+            raise RuleImportError([f"Invalid JSON: {e}"])
+        if isinstance(payload, list):
+            if table is None:
+                raise RuleImportError(["A JSON list of rows needs a target table"])
+            payload = {table: payload}
+        if not isinstance(payload, dict):
+            raise RuleImportError(["JSON must be an object keyed by table or a list of rows"])
+        unknown = [name for name in payload if name not in RULE_TABLES]
+        if unknown:
+            raise RuleImportError([f"Unknown rule table '{name}'" for name in unknown])
+        if table is not None:
+            payload = {table: payload.get(table)}
+        return payload
+
+    if fmt == 'csv':
+        if table is None:
+            raise RuleImportError(["A CSV file needs a target table"])
+        reader = csv.DictReader(io.StringIO(text))
+        # O trong = NULL (cot co gia tri mac dinh)
+        return {table: [{key: (value if value != '' else None) for key, value in row.items()}
+                        for row in reader]}
+
+    raise RuleImportError([f"Unknown format '{fmt}', expected 'json' or 'csv'"])
+
+
+def _text(row, field, required=True, max_length=None):
+    value = row.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    value = value.strip()
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _int(row, field, default=None, choices=None, minimum=None):
+    value = row.get(field)
+    if value is None:
+        if default is None:
+            raise ValueError(f"{field} is required")
+        return default
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+    if choices is not None and value not in choices:
+        raise ValueError(f"{field} must be one of {sorted(choices)}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{field} must be >= {minimum}")
+    return value
+
+
+def _bool(row, field, default=True):
+    value = row.get(field)
+    if value is None:
+        return int(default)
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('1', 'true', 'yes'):
+            return 1
+        if value in ('0', 'false', 'no'):
+            return 0
+        raise ValueError(f"{field} must be true/false")
+    if value in (0, 1):
+        return int(value)
+    raise ValueError(f"{field} must be true/false")
+
+
+def _json(row, field, kind, required=True):
+    """Cot JSON: nhan gia tri da parse (JSON) hoac chuoi JSON (CSV)"""
+    value = row.get(field)
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError(f"{field} is not valid JSON")
+    if value is None:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if not isinstance(value, kind):
+        raise ValueError(f"{field} must be a JSON {'list' if kind is list else 'object'}")
+    return value
+
+
+def _strings(values, field, required=True):
+    if required and not values:
+        raise ValueError(f"{field} must not be empty")
+    if not all(isinstance(value, str) and value.strip() for value in values):
+        raise ValueError(f"{field} must only contain non-empty strings")
+    return values
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False) if value is not None else None
+
+
+def _symptom_rule(row, department_ids):
+    department_id = _int(row, 'department_id')
+    if department_id not in department_ids:
+        raise ValueError(f"department_id {department_id} does not exist")
+    keywords = _strings(_json(row, 'symptom_keywords', list), 'symptom_keywords')
+    follow_ups = _json(row, 'follow_up_questions', list, required=False) or []
+    _strings(follow_ups, 'follow_up_questions', required=False)
+    return (
+        _text(row, 'rule_name', max_length=200),
+        department_id,
+        _dump(keywords),
+        _int(row, 'priority', default=5),
+        _int(row, 'min_symptoms_match', default=1, minimum=1),
+        _int(row, 'esi_level_default', default=4, choices={1, 2, 3, 4, 5}),
+        _dump(follow_ups),
+        _text(row, 'additional_notes', required=False),
+        _bool(row, 'is_active'),
+    )
+
+
+def _red_flag(row, department_ids):
+    pattern = _json(row, 'symptom_pattern', dict)
+    _strings(pattern.get('primary') or [], 'symptom_pattern.primary')
+    _strings(pattern.get('secondary') or [], 'symptom_pattern.secondary', required=False)
+    return (
+        _text(row, 'flag_name', max_length=200),
+        _dump(pattern),
+        _int(row, 'esi_level', choices={1, 2}),
+        _text(row, 'action', max_length=100),
+        _text(row, 'warning_message'),
+        _text(row, 'recommended_department', required=False, max_length=200),
+        _dump(_json(row, 'age_constraint', dict, required=False)),
+        _text(row, 'description', required=False),
+        _bool(row, 'is_active'),
+    )
+
+
+def _quick_reply_rule(row, department_ids):
+    replies = _json(row, 'replies_json', list)
+    if not replies:
+        raise ValueError("replies_json must not be empty")
+    for reply in replies:
+        if not isinstance(reply, dict) or not all(
+                isinstance(reply.get(key), str) and reply[key] for key in ('id', 'label', 'value')):
+            raise ValueError("every reply needs string id, label and value")
+    return (
+        _text(row, 'trigger_type', max_length=50),
+        _text(row, 'trigger_value', max_length=100),
+        _dump(replies),
+        _int(row, 'priority', default=5),
+        _bool(row, 'is_active'),
+    )
+
+
+_VALIDATORS = {
+    'symptom_rules': _symptom_rule,
+    'red_flags': _red_flag,
+    'quick_reply_rules': _quick_reply_rule,
+}
+
+
+def ensure_rule_versions_table():
+    """Tao bang rule_versions neu chua co"""
+    dialect = Database.dialect()
+    columns = RULE_VERSIONS_DDL.strip('\n').format(
+        pk=dialect.identity_pk, now=dialect.now_default
+    )
+    Database.execute_update(dialect.create_table('rule_versions', columns))
+
+
+def get_rule_version():
+    """
+    Lan import rule gan nhat
+
+    Returns:
+        dict: Row cua rule_versions (None neu chua import lan nao)
+    """
+    query, params = Database.dialect().limit("""
+        SELECT id AS version, tables, row_count, mode, source, imported_at
+        FROM rule_versions
+        ORDER BY id DESC
+    """, (), 1)
+    return Database.execute_query(query, params, fetch_one=True)
+
+
+class RuleImporter:
+    """
+    Kiem tra va ghi mot rule set trong mot transaction, roi tang phien ban rule
+    """
+
+    MODES = ('replace', 'append')
+
+    def __init__(self, mode='replace', rule_cache=None):
+        """
+        Args:
+            mode (str): 'replace' (rule set thay toan bo bang) hoac 'append'
+            rule_cache (RuleCache): Cache cua process nay, duoc refresh ngay
+                sau khi commit (None = cho lan poll ke tiep)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown import mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.rule_cache = rule_cache
+
+    def validate(self, rules):
+        """
+        Kiem tra toan bo rule set (khong ghi gi)
+
+        Args:
+            rules (dict): {table: [row dict, ...]} tu parse_rules()
+
+        Returns:
+            dict: {table: [params tuple, ...]} theo RULE_COLUMNS
+
+        Raises:
+            RuleImportError: Danh sach loi cua tat ca cac row khong hop le
+        """
+        errors = []
+        if not rules:
+            raise RuleImportError(["Rule set is empty"])
+
+        department_ids = set()
+        if 'symptom_rules' in rules:
+            department_ids = {row['id'] for row in Database.execute_query("SELECT id FROM departments")}
+
+        prepared = {}
+        for table, rows in rules.items():
+            if table not in _VALIDATORS:
+                errors.append(f"Unknown rule table '{table}'")
+                continue
+            if not isinstance(rows, list) or not rows:
+                # Mot bang rule rong se tat toan bo triage cua bang do
+                errors.append(f"{table}: at least one row is required")
+                continue
+            prepared[table] = []
+            for index, row in enumerate(rows, 1):
+                try:
+                    if not isinstance(row, dict):
+                        raise ValueError("row must be an object")
+                    prepared[table].append(_VALIDATORS[table](row, department_ids))
+                except ValueError as e:
+                    errors.append(f"{table}[{index}]: {e}")
+
+        if errors:
+            raise RuleImportError(errors[:MAX_ERRORS])
+        return prepared
+
+    def run(self, rules, source=None, dry_run=False):
+        """
+        Import rule set va tang phien ban rule
+
+        Args:
+            rules (dict): {table: [row dict, ...]}
+            source (str): Ghi chu nguon (ten file, nguoi import) luu trong rule_versions
+            dry_run (bool): Chi kiem tra, khong ghi
+
+        Returns:
+            dict: {'mode', 'tables': {table: so row}, 'version', 'dry_run'}
+
+        Raises:
+            RuleImportError: Neu rule set khong hop le (khong co gi duoc ghi)
+        """
+        prepared = self.validate(rules)
+        result = {
+            'mode': self.mode,
+            'tables': {table: len(rows) for table, rows in prepared.items()},
+            'version': None,
+            'dry_run': dry_run
+        }
+        if dry_run:
+            return result
+
+        ensure_rule_versions_table()
+        with Database.unit_of_work(write=True):
+            for table, rows in prepared.items():
+                if self.mode == 'replace':
+                    Database.execute_update(f"DELETE FROM {table}")
+                columns = RULE_COLUMNS[table]
+                Database.execute_many(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    rows
+                )
+            result['version'] = Database.execute_insert("""
+                INSERT INTO rule_versions (tables, row_count, mode, source)
+                VALUES (?, ?, ?, ?)
+            """, (','.join(prepared), sum(result['tables'].values()), self.mode, (source or '')[:200]))
+
+        print(f"[RuleImport] Rule version {result['version']}: {result['tables']} ({self.mode})")
+        if self.rule_cache is not None:
+            self.rule_cache.refresh()
+        return result
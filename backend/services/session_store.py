@@ -0,0 +1,152 @@
+"""
+session_store.py - Cache trang thai session trong memory (read-through)
+
+Luu context cua benh nhan (age, gender, duration, severity, flags,
+last_question_type...) theo session_id de moi turn khong phai query lai
+turn cuoi cung tu database. Gioi han bang TTL (SESSION_TIMEOUT) va so
+session toi da (LRU).
+
+Cache nam rieng trong tung process: khi nhieu worker cung phuc vu mot
+session, caller truyen validate de kiem tra entry voi database (vd: so turn
+trong bang sessions) truoc khi dung.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class SessionStateStore:
+    """
+    Cache LRU + TTL cho trang thai session, doc xuyen xuong DB khi miss
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        """
+        Args:
+            ttl (float): So giay mot session het han ke tu lan truy cap cuoi
+            max_entries (int): So session toi da giu trong memory
+        """
+        self.ttl = ttl if ttl is not None else config.SESSION_TIMEOUT
+        self.max_entries = max_entries if max_entries is not None else config.SESSION_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, session_id, loader=None, validate=None):
+        """
+        Lay trang thai session; neu khong co trong cache thi goi loader
+
+        Args:
+            session_id (str): ID cua session
+            loader (callable): Ham doc trang thai tu DB, nhan session_id
+            validate (callable): Kiem tra entry con dung khong, nhan
+                (session_id, state); False = entry cu, doc lai bang loader
+
+        Returns:
+            dict: Ban sao trang thai session, hoac None neu session chua co
+        """
+        now = time.monotonic()
+        cached = None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                state, last_access = entry
+                if now - last_access <= self.ttl:
+                    self._entries[session_id] = (state, now)
+                    self._entries.move_to_end(session_id)
+                    cached = copy.deepcopy(state)
+                else:
+                    del self._entries[session_id]
+
+        if cached is not None:
+            if validate is None or validate(session_id, cached):
+                self.hits += 1
+                return cached
+            self.stale += 1
+            self.invalidate(session_id)
+        self.misses += 1
+
+        if loader is None:
+            return None
+
+        state = loader(session_id)
+        if state is not None:
+            self.put(session_id, state)
+        return copy.deepcopy(state)
+
+    def put(self, session_id, state):
+        """
+        Luu trang thai moi nhat cua session
+
+        Args:
+            session_id (str): ID cua session
+            state (dict): Trang thai session
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._entries[session_id] = (copy.deepcopy(state), now)
+            self._entries.move_to_end(session_id)
+            self._evict(now)
+
+    def invalidate(self, session_id):
+        """Xoa session khoi cache (vd: khi reset hoac khi transaction loi)"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        """Xoa toan bo cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Thong ke cache"""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def _evict(self, now):
+        """Loai session het han (o dau LRU) va session vuot qua max_entries"""
+        while self._entries:
+            session_id, (_, last_access) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_entries or now - last_access > self.ttl:
+                del self._entries[session_id]
+                self.evictions += 1
+            else:
+                break
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    Lay SessionStateStore dung chung cho toan process
+
+    Returns:
+        SessionStateStore: Store dung chung
+    """
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStateStore()
+    return _session_store
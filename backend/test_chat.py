@@ -1,8 +1,10 @@
 # test_chat.py - Comprehensive test for chatbot service
-# Tests: 3-turn simple symptoms + 1 red flag case
+# Tests: 3-turn simple symptoms + 1 red flag case, history paging, retention,
+# bulk rule import
 
 import sys
 import os
+from datetime import datetime, timedelta
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
@@ -11,7 +13,10 @@ if sys.platform == 'win32':
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from models.database import Database
 from services.chatbot_service import ChatbotService
+from services.retention import RetentionJob
+from services.rule_import import RuleImportError, RuleImporter
 
 
 def print_separator(title=""):
@@ -262,6 +267,165 @@ def test_question_rotation():
     return True
 
 
+def test_history_pagination():
+    """
+    Test Case 5: History pages (keyset cursor) and ETag changes
+    """
+    print_separator("TEST CASE 5: History Pagination")
+
+    service = ChatbotService()
+    session_id = "test-history-001"
+
+    service.reset_conversation(session_id)
+
+    try:
+        service.process_message("Toi bi dau dau", session_id)
+        service.process_message("30 tuoi", session_id)
+
+        etag1, page1 = service.get_history_page(session_id, limit=1)
+        assert [m['type'] for m in page1['history']] == ['user', 'bot'], "Page 1 should hold turn 1"
+        assert page1['nextCursor'] == 1, "There should be a second page"
+        print("  [OK] First page has one turn and a cursor")
+
+        _, page2 = service.get_history_page(session_id, after_turn=page1['nextCursor'], limit=1)
+        assert page2['history'][0]['text'] == "30 tuoi", "Page 2 should hold turn 2"
+        assert page2['nextCursor'] is None, "Page 2 should be the last page"
+        print("  [OK] Second page continues after the cursor")
+
+        etag_all, _ = service.get_history_page(session_id)
+        assert service.get_history_page(session_id)[0] == etag_all, "Unchanged history, same ETag"
+        service.process_message("nam", session_id)
+        assert service.get_history_page(session_id)[0] != etag_all, "New turn must change the ETag"
+        assert service.get_history_page(session_id, limit=1)[0] == etag1, "Old pages keep their ETag"
+        print("  [OK] ETag changes only when the page changes")
+
+        service.reset_conversation(session_id)
+        assert service.get_history_page(session_id)[1]['history'] == [], "Reset should clear history"
+        print("  [OK] Reset clears the cached history")
+
+        print("\n" + "-" * 40)
+        print("TEST CASE 5: PASSED")
+
+    except Exception as e:
+        print(f"\n[FAILED] Error: {str(e)}")
+        return False
+
+    finally:
+        service.reset_conversation(session_id)
+
+    return True
+
+
+def test_retention_archive():
+    """
+    Test Case 6: An old completed session moves to the archive tables
+    """
+    print_separator("TEST CASE 6: Retention Archive")
+
+    service = ChatbotService()
+    session_id = "test-retention-001"
+    job = RetentionJob(days=1, mode='table', statuses=('test_retention',), pause=0)
+
+    service.reset_conversation(session_id)
+    job.ensure_archive_tables()
+
+    try:
+        service.process_message("Toi bi dau dau", session_id)
+        service.process_message("30 tuoi", session_id)
+        if service.turn_writer:
+            service.turn_writer.flush()
+
+        # Age the session so it falls outside the retention window; a status
+        # of its own keeps the job away from other sessions in the database
+        Database.execute_update("""
+            UPDATE sessions SET conversation_status = 'test_retention', updated_at = ?
+            WHERE session_id = ?
+        """, (datetime.now() - timedelta(days=2), session_id))
+
+        result = job.run()
+        assert result['sessions'] == 1, "The aged session should be archived"
+        print(f"  [OK] Archived {result['sessions']} sessions, {result['turns']} turns")
+
+        hot = Database.execute_query(
+            "SELECT COUNT(*) AS count FROM conversations WHERE session_id = ?", (session_id,), fetch_one=True
+        )
+        archived = Database.execute_query(
+            "SELECT COUNT(*) AS count FROM conversations_archive WHERE session_id = ?", (session_id,), fetch_one=True
+        )
+        assert hot['count'] == 0, "Archived turns should leave the hot table"
+        assert archived['count'] == 2, "Both turns should be kept in the archive"
+        assert Database.execute_query(
+            "SELECT session_id FROM sessions_archive WHERE session_id = ?", (session_id,), fetch_one=True
+        ), "The session row should be kept in the archive"
+        print("  [OK] Turns and session row kept in the archive tables")
+
+        print("\n" + "-" * 40)
+        print("TEST CASE 6: PASSED")
+
+    except Exception as e:
+        print(f"\n[FAILED] Error: {str(e)}")
+        return False
+
+    finally:
+        service.reset_conversation(session_id)
+        for table in ('conversations_archive', 'sessions_archive'):
+            Database.execute_update(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+    return True
+
+
+def test_rule_import():
+    """
+    Test Case 7: Bulk rule import validates everything, bumps the rule
+    version and swaps the rule snapshot without a restart
+    """
+    print_separator("TEST CASE 7: Rule Import")
+
+    service = ChatbotService()
+    importer = RuleImporter('replace', rule_cache=service.rule_cache)
+
+    try:
+        # Invalid rows are all reported and nothing is written
+        try:
+            importer.run({
+                'quick_reply_rules': [
+                    {'trigger_type': 'default', 'trigger_value': 'initial', 'replies_json': []},
+                    {'trigger_type': 'symptom', 'replies_json': '[{"id": "x"}]'}
+                ]
+            })
+            raise AssertionError("Invalid rules should be rejected")
+        except RuleImportError as e:
+            assert len(e.errors) == 2, f"Both rows should be reported: {e.errors}"
+        print("  [OK] Invalid rule set rejected with one error per row")
+
+        # Re-import the current quick replies: same rules, new version
+        before = service.rule_cache.get_snapshot()
+        rows = Database.execute_query("""
+            SELECT trigger_type, trigger_value, replies_json, priority, is_active
+            FROM quick_reply_rules
+            ORDER BY id
+        """)
+        result = importer.run({'quick_reply_rules': rows}, source='test_chat.py')
+        assert result['tables'] == {'quick_reply_rules': len(rows)}
+        assert result['version'], "The import should create a rule version"
+        print(f"  [OK] Imported {len(rows)} quick reply rules as version {result['version']}")
+
+        after = service.rule_cache.get_snapshot()
+        assert after is not before, "The rule snapshot should be swapped"
+        assert after.rule_version == result['version'], "The snapshot should carry the new version"
+        assert service.get_quick_replies('default', 'initial') == before.get_quick_replies('default', 'initial')
+        print(f"  [OK] Snapshot v{before.version} -> v{after.version} without a restart")
+
+        print("\n" + "-" * 40)
+        print("TEST CASE 7: PASSED")
+
+    except Exception as e:
+        print(f"\n[FAILED] Error: {str(e)}")
+        return False
+
+    return True
+
+
 def run_all_tests():
     """Run all test cases"""
     print("\n")
@@ -283,6 +447,15 @@ def run_all_tests():
     # Test 4: Question rotation (no loop)
     results.append(("Question Rotation", test_question_rotation()))
 
+    # Test 5: History pagination and ETag
+    results.append(("History Pagination", test_history_pagination()))
+
+    # Test 6: Retention moves old sessions to the archive
+    results.append(("Retention Archive", test_retention_archive()))
+
+    # Test 7: Bulk rule import and hot reload
+    results.append(("Rule Import", test_rule_import()))
+
     # Summary
     print_separator("TEST SUMMARY")
     passed = 0
@@ -0,0 +1,658 @@
+# test_llm_client.py - Test LLMClient against a local Ollama stub server
+# Tests: keep-alive connection reuse, keep_alive forwarding, preload, health, streaming,
+#        response cache (accent-insensitive keys, TTL, on-disk tier),
+#        dispatcher (single-flight, urgent lane first),
+#        hybrid triage fallback (JSON parsing, confidence, circuit breaker),
+#        symptom extraction (vocabulary mapping, per-message cache, token stats),
+#        prompt context builder (history cap, token budget, stable prefix),
+#        request deadline (bounded LLM wait and stream, skipped stage, stage accounting)
+
+import sys
+import os
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from services.context_builder import ContextBuilder, append_history, estimate_tokens
+from services.io_steps import arun_steps
+from services.llm_cache import LLMResponseCache
+from services.llm_client import LLMClient
+from services.llm_dispatcher import (
+    DispatchTimeoutError, DispatcherBusyError, LLMDispatcher, PRIORITY_ROUTINE, PRIORITY_URGENT
+)
+from services.llm_extractor import LLMSymptomExtractor
+from services.llm_triage import LLMTriage
+from utils.circuit_breaker import CircuitBreaker
+from utils.deadline import DeadlineExceeded, deadline_scope, remaining_timeout, stage
+from utils.keyword_matcher import KeywordAutomaton
+
+
+MODEL = 'stub-model:latest'
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Minimal Ollama API: /api/chat, /api/generate, /api/ps"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, lines):
+        body = ''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/ps':
+            models = [{'name': MODEL, 'model': MODEL}] if self.server.loaded else []
+            self._send_json([{'models': models}])
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, payload))
+
+        if self.path == '/api/generate':
+            self.server.loaded = True
+            self._send_json([{'model': MODEL, 'response': '', 'done': True, 'context': [1, 2, 3]}])
+        elif self.path == '/api/chat':
+            self.server.loaded = True
+            tokens = ['Xin ', 'chào']
+            if payload.get('stream'):
+                lines = [
+                    {'model': MODEL, 'message': {'role': 'assistant', 'content': t}, 'done': False}
+                    for t in tokens
+                ]
+                lines.append({'model': MODEL, 'message': {'role': 'assistant', 'content': ''}, 'done': True})
+                self._send_json(lines)
+            else:
+                self._send_json([{
+                    'model': MODEL,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'done': True
+                }])
+        else:
+            self.send_error(404)
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+    server.connections = 0
+    server.requests = []
+    server.loaded = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_client(server, **kwargs):
+    host = f'http://127.0.0.1:{server.server_address[1]}'
+    return LLMClient(host=host, model=MODEL, keep_alive='-1', timeout=5, **kwargs)
+
+
+def test_connection_reuse():
+    """Sequential requests reuse one keep-alive connection"""
+    server = start_stub_server()
+    try:
+        client = make_client(server)
+        for _ in range(5):
+            assert client.chat([{'role': 'user', 'content': 'hi'}]) == 'Xin chào'
+        assert server.connections == 1, f"Expected 1 connection, got {server.connections}"
+        assert all(p['keep_alive'] == -1 for _, p in server.requests), "keep_alive not forwarded"
+        stats = client.stats()
+        assert stats['requests'] == 5 and stats['errors'] == 0
+        assert stats['p95_ms'] is not None
+        client.close()
+        assert client.chat([{'role': 'user', 'content': 'hi'}], use_cache=False) == 'Xin chào'
+        assert server.connections == 2, "close() should drop the pooled connection"
+        client.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_preload_and_health():
+    """Preload loads the model, health reports it as loaded"""
+    server = start_stub_server()
+    try:
+        client = make_client(server)
+        assert client.health()['model_loaded'] is False
+        assert client.preload() is True
+        path, payload = server.requests[-1]
+        assert path == '/api/generate' and payload['prompt'] == ''
+        health = client.health()
+        assert health['status'] == 'ok' and health['model_loaded'] is True
+        assert health['stats']['preloaded'] is True
+        client.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_streaming():
+    """stream_chat yields tokens and records time to first token"""
+    server = start_stub_server()
+    try:
+        client = make_client(server)
+        tokens = list(client.stream_chat([{'role': 'user', 'content': 'hi'}]))
+        assert tokens == ['Xin ', 'chào'], f"Unexpected tokens: {tokens}"
+        assert client.stats()['first_token_ms'] is not None
+        client.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_async_client():
+    """Async chat, stream and health share the dispatcher with the sync path"""
+    server = start_stub_server()
+    client = make_client(server, cache=LLMResponseCache(max_entries=10))
+    dispatcher = LLMDispatcher(client=client, num_parallel=1, queue_size=10)
+
+    async def run():
+        messages = [{'role': 'user', 'content': 'hi'}]
+        first, duplicate = await asyncio.gather(
+            dispatcher.achat(messages, use_cache=False), dispatcher.achat(messages, use_cache=False)
+        )
+        tokens = [t async for t in dispatcher.astream_chat([{'role': 'user', 'content': 'x'}])]
+        health = await client.ahealth()
+        await client.aclose()
+        return first, duplicate, tokens, health
+
+    try:
+        first, duplicate, tokens, health = asyncio.run(run())
+        assert first == duplicate == 'Xin chào', f"Unexpected replies: {first!r}, {duplicate!r}"
+        assert dispatcher.stats()['coalesced'] == 1
+        assert tokens == ['Xin ', 'chào'], f"Unexpected tokens: {tokens}"
+        assert health['status'] == 'ok', f"Unexpected health: {health}"
+        assert dispatcher.chat([{'role': 'user', 'content': 'hi'}]) == 'Xin chào'
+        client.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_unreachable_server():
+    """Errors are counted and health reports the failure"""
+    client = LLMClient(host='http://127.0.0.1:1', model=MODEL, timeout=1)
+    try:
+        client.chat([{'role': 'user', 'content': 'hi'}])
+        print("  [X] Expected connection error")
+        return False
+    except Exception:
+        pass
+    try:
+        assert client.stats()['errors'] == 1
+        assert client.health()['status'] == 'error'
+        assert client.preload() is False
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def test_response_cache():
+    """Accented / unaccented prompts share one cached answer"""
+    server = start_stub_server()
+    try:
+        cache = LLMResponseCache(max_entries=10, ttl=60)
+        client = make_client(server, cache=cache)
+        assert client.chat([{'role': 'user', 'content': 'Tôi bị đau họng'}]) == 'Xin chào'
+        assert client.chat([{'role': 'user', 'content': 'toi  bi DAU hong'}]) == 'Xin chào'
+        assert list(client.stream_chat([{'role': 'user', 'content': 'toi bi dau hong'}])) == ['Xin chào']
+        assert len(server.requests) == 1, f"Expected 1 backend call, got {len(server.requests)}"
+        client.chat([{'role': 'user', 'content': 'toi bi dau hong'}], options={'temperature': 0})
+        assert len(server.requests) == 2, "Different options must not share a cache entry"
+        stats = cache.stats()
+        assert stats['hits'] == 2 and stats['misses'] == 2 and stats['hit_rate'] == 0.5
+        client.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_cache_eviction_and_disk_tier():
+    """LRU / TTL eviction in memory, disk tier survives a new cache instance"""
+    try:
+        cache = LLMResponseCache(max_entries=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, key.upper())
+        assert cache.get('a') is None and cache.get('c') == 'C'
+        assert cache.stats()['evictions'] == 1
+
+        short = LLMResponseCache(max_entries=2, ttl=0.05)
+        short.put('a', 'A')
+        time.sleep(0.1)
+        assert short.get('a') is None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'llm_cache.sqlite3')
+            cache = LLMResponseCache(max_entries=2, ttl=60, disk_path=path)
+            cache.put('a', 'A')
+            cache.close()
+            reopened = LLMResponseCache(max_entries=2, ttl=60, disk_path=path)
+            assert reopened.get('a') == 'A'
+            assert reopened.stats()['disk_hits'] == 1
+            assert reopened.get('a') == 'A' and reopened.stats()['hits'] == 1
+            reopened.close()
+
+            # Disk tier keeps at most disk_max_entries rows, oldest go first
+            capped = LLMResponseCache(max_entries=2, ttl=60, disk_path=path, disk_max_entries=10)
+            for i in range(12):
+                capped.put(f'k{i}', str(i))
+            rows = capped._disk.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            assert rows <= 10 and capped.stats()['disk_evictions'] > 0, f"{rows} rows on disk"
+            assert capped.get('k11') == '11' and capped.get('a') is None
+            capped.close()
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def test_dispatcher():
+    """Identical in-flight prompts share one call; urgent requests go first"""
+    order = []
+    release = threading.Event()
+
+    class SlowBackend:
+        model = MODEL
+        cache = None
+        calls = 0
+
+        def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+            SlowBackend.calls += 1
+            order.append(messages[0]['content'])
+            release.wait(5)
+            return messages[0]['content'].upper()
+
+    try:
+        dispatcher = LLMDispatcher(client=SlowBackend(), num_parallel=1, queue_size=10)
+        results = {}
+
+        def call(name, content, priority):
+            results[name] = dispatcher.chat([{'role': 'user', 'content': content}], priority=priority)
+
+        threads = [threading.Thread(target=call, args=('first', 'a', PRIORITY_ROUTINE))]
+        threads[0].start()
+        time.sleep(0.05)
+        for args in (('routine', 'b', PRIORITY_ROUTINE), ('urgent', 'c', PRIORITY_URGENT),
+                     ('duplicate', 'b', PRIORITY_ROUTINE)):
+            threads.append(threading.Thread(target=call, args=args))
+            threads[-1].start()
+            time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert order == ['a', 'c', 'b'], f"Unexpected order: {order}"
+        assert results == {'first': 'A', 'routine': 'B', 'urgent': 'C', 'duplicate': 'B'}
+        assert SlowBackend.calls == 3 and dispatcher.stats()['coalesced'] == 1
+
+        # Running + queued requests are capped at submit time
+        release.clear()
+        small = LLMDispatcher(client=SlowBackend(), num_parallel=1, queue_size=1)
+        threads = [threading.Thread(target=small.chat, args=([{'role': 'user', 'content': c}],))
+                   for c in ('d', 'e')]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        try:
+            small.chat([{'role': 'user', 'content': 'f'}], timeout=2)
+            raise AssertionError("A third request should be rejected")
+        except DispatcherBusyError:
+            assert time.perf_counter() - started < 0.5, "Rejection must not wait for a slot"
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert small.stats()['rejected'] == 1
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def test_llm_triage():
+    """LLM fallback parses JSON, enforces confidence and trips the breaker"""
+    class ScriptedBackend:
+        model = MODEL
+        cache = None
+
+        def __init__(self, replies):
+            self.replies = list(replies)
+            self.calls = 0
+
+        def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+            self.calls += 1
+            reply = self.replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return json.dumps(reply)
+
+    departments = {1: 'Khoa Noi', 2: 'Khoa Tai Mui Hong'}
+    context = {'age': 30, 'gender': 'nam'}
+    try:
+        backend = ScriptedBackend([
+            {'department_id': 2, 'confidence': 0.9, 'symptoms': ['nghet mui']},
+            {'department_id': 1, 'confidence': 0.3, 'symptoms': []},
+            {'department_id': 99, 'confidence': 0.9, 'symptoms': []},
+            ConnectionError('down'), ConnectionError('down'),
+        ])
+        triage = LLMTriage(
+            dispatcher=LLMDispatcher(client=backend, num_parallel=1),
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+            timeout=2, min_confidence=0.6
+        )
+        for message in ('bi nghet mui', 'met moi', 'khong ro', 'loi 1', 'loi 2', 'bi chan'):
+            triage.record_turn()
+            result = triage.classify(message, [], context, departments)
+            if message == 'bi nghet mui':
+                assert result == {'department_id': 2, 'confidence': 0.9, 'symptoms': ['nghet mui']}
+            else:
+                assert result is None or result['department_id'] is None, result
+
+        stats = triage.stats()
+        assert backend.calls == 5, f"Breaker should block the 6th call, got {backend.calls} calls"
+        assert stats['answered'] == 1 and stats['failures'] == 2 and stats['skipped_breaker_open'] == 1
+        assert stats['escalation_rate'] == 1.0 and stats['breaker']['state'] == 'open'
+
+        # A turn that asks the LLM twice is one escalation
+        twice = LLMTriage(
+            dispatcher=LLMDispatcher(client=ScriptedBackend([
+                {'department_id': 1, 'confidence': 0.3, 'symptoms': []},
+                {'department_id': 1, 'confidence': 0.3, 'symptoms': []},
+            ]), num_parallel=1),
+            timeout=2, min_confidence=0.6
+        )
+        twice.record_turn()
+        twice.classify('met moi', [], context, departments)
+        twice.classify('met moi lam', [], context, departments, escalated=True)
+        stats = twice.stats()
+        assert stats['calls'] == 2 and stats['escalations'] == 1, stats
+        assert stats['escalation_rate'] == 1.0
+
+        # A cancelled half-open probe (client disconnect) hands the probe back
+        class HangingBackend:
+            model = MODEL
+            cache = None
+
+            async def achat(self, messages, options=None, format=None, use_cache=True, usage=None):
+                await asyncio.sleep(60)
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        hanging = LLMTriage(
+            dispatcher=LLMDispatcher(client=HangingBackend(), num_parallel=1),
+            breaker=breaker, timeout=5
+        )
+
+        async def cancel_probe():
+            task = asyncio.ensure_future(
+                arun_steps(hanging.classify_steps('bi ho', [], context, departments))
+            )
+            await asyncio.sleep(0.05)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(cancel_probe())
+        assert breaker.allow(), "The cancelled probe must not block the breaker"
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+class KeywordSnapshot:
+    """The parts of RuleSnapshot the extractor uses: version, keywords, matcher"""
+
+    version = 1
+
+    def __init__(self, keywords):
+        self.keywords = [(kw, kw) for kw in keywords]
+        self.automaton = KeywordAutomaton()
+        for order, kw in enumerate(keywords):
+            self.automaton.add(kw, (order, kw))
+        self.automaton.build()
+
+    def find_keyword_matches(self, message):
+        return [(start, end, payloads[0][1])
+                for start, end, _, payloads in self.automaton.find_all(message)]
+
+
+def test_llm_extractor():
+    """Extraction shortlists the vocabulary, maps replies back to it and caches per message"""
+    class ExtractionBackend:
+        model = MODEL
+        cache = None
+        calls = 0
+
+        def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+            ExtractionBackend.calls += 1
+            assert format['properties']['symptoms']['items']['enum'] == ['dau hong', 'sot']
+            assert 'ho,' not in messages[1]['content']
+            assert options == {'temperature': 0, 'num_predict': 32}
+            if usage is not None:
+                usage.update({'prompt_tokens': 80, 'completion_tokens': 12, 'latency_ms': 5})
+            return json.dumps({'symptoms': ['Đau họng', 'sot cao', 'met moi']})
+
+    try:
+        snapshot = KeywordSnapshot(['dau hong', 'sot', 'ho'])
+        extractor = LLMSymptomExtractor(
+            dispatcher=LLMDispatcher(client=ExtractionBackend(), num_parallel=1),
+            timeout=2, num_predict=32, cache_size=10
+        )
+        assert extractor.extract('nuot  dau hong, nguoi sot', snapshot) == ['dau hong', 'sot']
+        assert extractor.extract('nuot dau hong, nguoi sot', snapshot) == ['dau hong', 'sot']
+        assert ExtractionBackend.calls == 1, "Same normalized message must hit the cache"
+        assert extractor.extract('met moi qua', snapshot) == []
+        assert ExtractionBackend.calls == 1, "No candidate keyword, the LLM must not be called"
+
+        stats = extractor.stats()
+        assert stats['calls'] == 1 and stats['cache']['hits'] == 1
+        assert stats['skipped_no_candidates'] == 1 and stats['avg_candidates'] == 2
+        assert stats['avg_completion_tokens'] == 12 and stats['max_completion_tokens'] == 12
+        assert stats['budget'] == {'num_predict': 32, 'timeout_ms': 2000, 'prompt_tokens': 768}
+
+        # A message without candidates must not spend the half-open probe
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        probing = LLMSymptomExtractor(
+            dispatcher=LLMDispatcher(client=ExtractionBackend(), num_parallel=1),
+            breaker=breaker, timeout=2, num_predict=32, cache_size=10
+        )
+        assert probing.extract('xin chao', snapshot) == []
+        assert probing.extract('dau hong va sot', snapshot) == ['dau hong', 'sot']
+        assert breaker.state == 'closed', f"Probe was lost, breaker is {breaker.state}"
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def test_context_builder():
+    """Prompts keep a stable prefix, cap the history and fit the token budget"""
+    try:
+        history = []
+        for i in range(15):
+            history = append_history(history, f'tin nhan so {i}', max_history=4)
+        assert history == [f'tin nhan so {i}' for i in range(11, 15)], history
+
+        builder = ContextBuilder(max_history=4, token_budget=120)
+        system = 'He thong\nDanh sach khoa:\n1: Khoa Noi'
+        context = {'age': 30, 'gender': 'nu', 'severity': 8, 'is_pregnant': True, 'is_severe': True}
+        first = builder.build(system, 'toi bi dau bung', ['dau bung'], context, ['toi bi dau bung'])
+        second = builder.build(system, history[-1], ['dau bung', 'sot'], context, history)
+        assert first[0] == second[0], "The system prefix must not change between turns"
+        assert 'Tin nhan truoc' not in first[1]['content']
+        assert 'Muc do dau: 8/10' in second[1]['content']
+        assert 'dang mang thai' in second[1]['content']
+        assert second[1]['content'].endswith(f'Tin nhan: {history[-1]}')
+
+        # A long transcript is cut oldest-first to stay within the budget
+        long_history = [f'tin nhan rat dai so {i} ' + 'x' * 60 for i in range(4)]
+        messages = builder.build(system, 'con dau', [], context, long_history)
+        tokens = sum(estimate_tokens(m['content']) for m in messages)
+        assert tokens <= 120, f"Prompt is {tokens} tokens"
+        assert long_history[-1] in messages[1]['content']
+        assert long_history[0] not in messages[1]['content']
+
+        stats = builder.stats()
+        assert stats['prompts'] == 3 and stats['history_dropped'] >= 2 and stats['max_tokens'] <= 120
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def test_request_deadline():
+    """LLM stages are bounded by the request deadline, or skipped when it is nearly spent"""
+    class SlowBackend:
+        model = MODEL
+        cache = None
+
+        def chat(self, messages, options=None, format=None, use_cache=True, usage=None):
+            time.sleep(1.5)
+            return json.dumps({'department_id': 1, 'confidence': 0.9, 'symptoms': []})
+
+        def stream_chat(self, messages, options=None, use_cache=True):
+            yield 'Xin '
+            time.sleep(1.5)
+            yield 'chào'
+
+        async def astream_chat(self, messages, options=None, use_cache=True):
+            yield 'Xin '
+            await asyncio.sleep(1.5)
+            yield 'chào'
+
+    triage = LLMTriage(
+        dispatcher=LLMDispatcher(client=SlowBackend(), num_parallel=1),
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=60),
+        timeout=10
+    )
+    departments = {1: 'Khoa Noi'}
+    try:
+        assert remaining_timeout(5) == 5, "No deadline: the stage keeps its own timeout"
+
+        # Enough to run the LLM stage, not enough for the slow reply
+        budget = config.DEADLINE_RESERVE + config.DEADLINE_LLM_MIN_REMAINING + 0.2
+        with deadline_scope(budget) as deadline:
+            started = time.perf_counter()
+            with stage('llm_triage'):
+                result = triage.classify('met moi', [], {}, departments)
+            elapsed = time.perf_counter() - started
+            assert result is None
+            assert elapsed < budget, f"LLM wait of {elapsed:.2f}s overran the {budget}s deadline"
+
+        # Less than DEADLINE_LLM_MIN_REMAINING left: skipped without calling the LLM
+        with deadline_scope(0.3) as deadline:
+            started = time.perf_counter()
+            assert triage.classify('met moi', [], {}, departments) is None
+            assert time.perf_counter() - started < 0.05
+            assert deadline.skipped == ['llm_triage']
+            time.sleep(0.35)
+            try:
+                remaining_timeout(5, 'db_query')
+                raise AssertionError("An expired deadline must raise DeadlineExceeded")
+            except DeadlineExceeded as e:
+                assert e.stage == 'db_query' and deadline.exhausted_by == 'db_query'
+
+        stats = triage.stats()
+        assert stats['skipped_deadline'] == 1 and stats['failures'] == 1
+
+        # A stream stalled mid-answer stops at its timeout, not at the next token
+        dispatcher = LLMDispatcher(client=SlowBackend(), num_parallel=1)
+        messages = [{'role': 'user', 'content': 'hi'}]
+        tokens = []
+
+        async def astream():
+            async for token in dispatcher.astream_chat(messages, timeout=0.3):
+                tokens.append(token)
+
+        for consume in (lambda: tokens.extend(dispatcher.stream_chat(messages, timeout=0.3)),
+                        lambda: asyncio.run(astream())):
+            tokens.clear()
+            started = time.perf_counter()
+            try:
+                consume()
+                raise AssertionError("A stalled stream must raise DispatchTimeoutError")
+            except DispatchTimeoutError:
+                elapsed = time.perf_counter() - started
+            assert tokens == ['Xin '], f"Unexpected tokens: {tokens}"
+            assert elapsed < 0.6, f"Stream ran {elapsed:.2f}s past its 0.3s budget"
+        assert dispatcher.stats()['timeouts'] == 2
+        return True
+    except AssertionError as e:
+        print(f"  [X] {e}")
+        return False
+
+
+def run_all_tests():
+    """Run all test cases"""
+    tests = [
+        ("Connection reuse", test_connection_reuse),
+        ("Preload and health", test_preload_and_health),
+        ("Streaming", test_streaming),
+        ("Async client", test_async_client),
+        ("Unreachable server", test_unreachable_server),
+        ("Response cache", test_response_cache),
+        ("Cache eviction and disk tier", test_cache_eviction_and_disk_tier),
+        ("Dispatcher", test_dispatcher),
+        ("LLM triage fallback", test_llm_triage),
+        ("LLM symptom extraction", test_llm_extractor),
+        ("Prompt context builder", test_context_builder),
+        ("Request deadline", test_request_deadline),
+    ]
+
+    passed = 0
+    for name, test in tests:
+        result = test()
+        icon = "[OK]" if result else "[X]"
+        print(f"  {icon} {name}: {'PASSED' if result else 'FAILED'}")
+        if result:
+            passed += 1
+
+    print(f"\n  Total: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
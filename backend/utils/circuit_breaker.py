@@ -0,0 +1,101 @@
+"""
+circuit_breaker.py - Circuit breaker cho cac dich vu ngoai (Ollama)
+
+Sau failure_threshold lan loi lien tiep, breaker mo (open) va tu choi ngay
+moi request trong reset_timeout giay thay vi de tung turn cho timeout. Het
+thoi gian do, mot request thu (half-open) duoc cho qua: thanh cong thi dong
+lai, loi thi mo tiep. Request thu bi huy giua chung (client ngat ket noi)
+phai goi release() de request sau duoc thu lai.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker dem loi lien tiep (thread-safe)
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        """
+        Args:
+            failure_threshold (int): So loi lien tiep de mo breaker
+            reset_timeout (float): Thoi gian mo truoc khi thu lai (giay)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        # Stats
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        """Trang thai hien tai: closed / open / half_open"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """
+        Kiem tra request co duoc goi khong
+
+        Returns:
+            bool: False neu breaker dang mo (hoac dang co request thu)
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Goi thanh cong: dong breaker"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Goi loi: mo breaker khi du so loi lien tiep (hoac request thu bi loi)"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self):
+        """
+        Request da qua allow() ket thuc ma khong co ket qua (bi huy): tra lai
+        luot thu cua half-open, trang thai giu nguyen
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        """Thong ke breaker"""
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'trips': self.trips,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,232 @@
+"""
+deadline.py - Deadline cho moi request chat (lan truyen qua contextvars)
+
+Moi request mo mot deadline_scope(budget). Cac tang ben duoi (DB, LLM) doc
+deadline hien tai qua ContextVar - khong phai truyen tham so - va tu gioi han
+timeout cua minh theo thoi gian con lai:
+- Database: cho connection trong pool, timeout cua cau SQL.
+- LLM: bo qua buoc LLM (extraction, triage, streaming) neu con qua it thoi
+  gian, neu khong thi timeout = thoi gian con lai.
+
+Moi buoc duoc do bang stage(name); buoc dang chay khi het budget duoc ghi lai
+(exhausted_by) va thong ke theo ten buoc de biet buoc nao lam vuot SLO.
+run_blocking (services/db_executor.py) copy context sang thread worker nen
+route async cung mang deadline theo.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Deadline cua request hien tai (None = khong gioi han)
+_current = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage is started after the request deadline has passed"""
+
+    def __init__(self, stage, budget):
+        self.stage = stage
+        self.budget = budget
+        super().__init__(f"Request deadline of {budget}s exceeded at stage '{stage}'")
+
+
+class Deadline:
+    """
+    Thoi diem het han cua mot request va thoi gian da dung theo tung buoc
+    """
+
+    def __init__(self, budget):
+        """
+        Args:
+            budget (float): Tong thoi gian cho request (giay)
+        """
+        self.budget = budget
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget
+        self.stages = []
+        self.skipped = []
+        self.exhausted_by = None
+        self._current_stage = None
+
+    def remaining(self):
+        """So giay con lai (am neu da qua han)"""
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap=None, stage=None):
+        """
+        Timeout cho mot thao tac: thoi gian con lai, khong qua cap
+
+        Args:
+            cap (float): Timeout toi da cua thao tac (None / 0 = khong gioi han)
+            stage (str): Ten thao tac (ghi vao DeadlineExceeded)
+
+        Returns:
+            float: So giay thao tac duoc phep chay
+
+        Raises:
+            DeadlineExceeded: Neu da het thoi gian
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            stage = stage or self._current_stage or 'unknown'
+            if self.exhausted_by is None:
+                self.exhausted_by = stage
+            raise DeadlineExceeded(stage, self.budget)
+        return min(remaining, cap) if cap else remaining
+
+    @contextmanager
+    def stage(self, name):
+        """Do thoi gian mot buoc; ghi lai neu buoc nay lam het budget"""
+        previous, self._current_stage = self._current_stage, name
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.stages.append((name, (time.monotonic() - started) * 1000))
+            self._current_stage = previous
+            if self.exhausted_by is None and self.expired():
+                self.exhausted_by = name
+
+    def skip(self, name):
+        """Ghi nhan mot buoc tuy chon bi bo qua vi khong du thoi gian"""
+        self.skipped.append(name)
+
+    def server_timing(self):
+        """Gia tri header Server-Timing (vd: 'session;dur=1.2, llm_triage;dur=812.0')"""
+        return ', '.join(f'{name};dur={elapsed:.1f}' for name, elapsed in self.stages)
+
+    def summary(self):
+        """Thong tin deadline cua request (dung cho log / response loi)"""
+        stages = {}
+        for name, elapsed in self.stages:
+            stages[name] = stages.get(name, 0.0) + elapsed
+        return {
+            'budget_ms': round(self.budget * 1000),
+            'elapsed_ms': round((time.monotonic() - self.started) * 1000, 1),
+            'exhausted_by': self.exhausted_by,
+            'skipped': list(self.skipped),
+            'stages': {name: round(elapsed, 1) for name, elapsed in stages.items()}
+        }
+
+
+# Thong ke cho ca process
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'exceeded': 0, 'exhausted_by': {}, 'skipped': {}}
+
+
+def current_deadline():
+    """Deadline cua request hien tai (None neu khong co)"""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(budget):
+    """
+    Dat deadline cho khoi lenh; scope long nhau dung lai deadline ben ngoai
+
+    Args:
+        budget (float): Tong thoi gian (giay); None / 0 = khong gioi han
+
+    Yields:
+        Deadline: Deadline dang ap dung (None neu khong gioi han)
+    """
+    outer = _current.get()
+    if outer is not None or not budget:
+        yield outer
+        return
+
+    deadline = Deadline(budget)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Scope giu qua cac yield cua mot generator (SSE) bi dong tu
+            # context khac (vd: finalizer cua async generator)
+            pass
+        _record(deadline)
+
+
+def remaining_timeout(cap=None, stage=None):
+    """
+    Timeout cho mot thao tac blocking theo deadline hien tai
+
+    Args:
+        cap (float): Timeout mac dinh cua thao tac (None / 0 = khong gioi han)
+        stage (str): Ten thao tac
+
+    Returns:
+        float: cap neu khong co deadline, neu khong min(cap, thoi gian con lai)
+
+    Raises:
+        DeadlineExceeded: Neu deadline da qua
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap, stage)
+
+
+def stage_budget(name, cap=None, reserve=0.0, minimum=0.0):
+    """
+    Thoi gian cho mot buoc tuy chon (LLM...), chua lai reserve cho cac buoc sau
+
+    Args:
+        name (str): Ten buoc
+        cap (float): Timeout mac dinh cua buoc
+        reserve (float): So giay giu lai cho cac buoc bat buoc phia sau
+        minimum (float): Bo qua buoc neu khong con it nhat chung nay giay
+
+    Returns:
+        float: Timeout cho buoc (cap neu khong co deadline), hoac None neu
+               phai bo qua buoc (da ghi nhan vao deadline.skipped)
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    available = deadline.remaining() - reserve
+    if available <= 0 or available < minimum:
+        deadline.skip(name)
+        return None
+    return min(available, cap) if cap else available
+
+
+@contextmanager
+def stage(name):
+    """Do thoi gian mot buoc cua request hien tai (khong lam gi neu khong co deadline)"""
+    deadline = _current.get()
+    if deadline is None:
+        yield None
+        return
+    with deadline.stage(name):
+        yield deadline
+
+
+def _record(deadline):
+    """Cong don thong ke khi request ket thuc"""
+    with _stats_lock:
+        _stats['requests'] += 1
+        if deadline.exhausted_by is not None:
+            _stats['exceeded'] += 1
+            by_stage = _stats['exhausted_by']
+            by_stage[deadline.exhausted_by] = by_stage.get(deadline.exhausted_by, 0) + 1
+        for name in deadline.skipped:
+            _stats['skipped'][name] = _stats['skipped'].get(name, 0) + 1
+
+
+def deadline_stats():
+    """Thong ke deadline: so request, so lan vuot, buoc lam vuot, buoc bi bo qua"""
+    with _stats_lock:
+        return {
+            'requests': _stats['requests'],
+            'exceeded': _stats['exceeded'],
+            'exhausted_by': dict(_stats['exhausted_by']),
+            'skipped': dict(_stats['skipped'])
+        }
@@ -2,6 +2,7 @@
 helpers.py - Các hàm helper tiện ích
 """
 
+import json
 import uuid
 from datetime import datetime
 
@@ -28,6 +29,64 @@ def format_timestamp(dt=None):
         dt = datetime.now()
     return dt.strftime('%Y-%m-%d %H:%M:%S')
 
+def deadline_error(deadline, error):
+    """
+    Body cua response khi request vuot deadline (HTTP 503)
+
+    Args:
+        deadline (Deadline): Deadline cua request (utils/deadline.py)
+        error (Exception): Loi cua buoc bi cat ngang
+
+    Returns:
+        dict: error, message, stage (buoc lam het budget) va thoi gian tung buoc
+    """
+    return {
+        'error': 'Request deadline exceeded',
+        'message': str(error),
+        'stage': deadline.exhausted_by,
+        'deadline': deadline.summary()
+    }
+
+def format_history(history):
+    """
+    Chuyen cac turn trong database thanh danh sach tin nhan cho frontend
+
+    Args:
+        history (list): Cac turn (user_message, bot_response, timestamp)
+
+    Returns:
+        list: Tin nhan dang {'type', 'text', 'timestamp'}
+    """
+    formatted_history = []
+    for turn in history:
+        if turn['user_message']:
+            formatted_history.append({
+                'type': 'user',
+                'text': turn['user_message'],
+                'timestamp': turn['timestamp']
+            })
+        if turn['bot_response']:
+            formatted_history.append({
+                'type': 'bot',
+                'text': turn['bot_response'],
+                'timestamp': turn['timestamp']
+            })
+    return formatted_history
+
+def format_sse(event, data):
+    """
+    Dong goi mot Server-Sent Event
+
+    Args:
+        event (str): Ten event
+        data (dict): Du lieu (JSON)
+
+    Returns:
+        str: Chuoi SSE ket thuc bang dong trong
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
 def clean_text(text):
     """
     Làm sạch text input từ người dùng
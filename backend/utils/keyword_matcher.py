@@ -0,0 +1,170 @@
+"""
+keyword_matcher.py - Aho-Corasick automaton de tim nhieu keyword cung luc
+
+Build mot lan tu danh sach keyword, sau do moi lan tim chi duyet text
+mot lan duy nhat: chi phi phu thuoc vao do dai text (va so match), khong
+phu thuoc vao so luong keyword.
+"""
+
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton cho substring matching nhieu keyword
+
+    Moi keyword co the gan kem mot hoac nhieu payload (vd: keyword goc chua
+    normalize, ID cua rule...). Ket qua match tra ve vi tri va payload.
+    """
+
+    def __init__(self):
+        # Node i: goto[i] (dict ky tu -> node), fail[i], output[i] (list keyword id)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._keywords = []
+        self._payloads = []
+        self._index = {}
+        self._built = False
+
+    def __len__(self):
+        return len(self._keywords)
+
+    def add(self, keyword, payload=None):
+        """
+        Them mot keyword vao automaton (truoc khi build)
+
+        Args:
+            keyword (str): Keyword da normalize
+            payload: Du lieu gan kem, tra ve khi keyword match
+
+        Returns:
+            int: ID cua keyword trong automaton
+        """
+        if self._built:
+            raise RuntimeError("Cannot add keywords after build()")
+        if not keyword:
+            raise ValueError("Keyword must not be empty")
+
+        keyword_id = self._index.get(keyword)
+        if keyword_id is None:
+            keyword_id = len(self._keywords)
+            self._index[keyword] = keyword_id
+            self._keywords.append(keyword)
+            self._payloads.append([])
+
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            self._output[node].append(keyword_id)
+
+        if payload is not None:
+            self._payloads[keyword_id].append(payload)
+        return keyword_id
+
+    def build(self):
+        """Tinh failure links (BFS) va gop output theo failure chain"""
+        queue = deque()
+        for next_node in self._goto[0].values():
+            self._fail[next_node] = 0
+            queue.append(next_node)
+
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(char, 0)
+                # Keyword ket thuc o failure node cung ket thuc o node nay
+                self._output[next_node] = (
+                    self._output[next_node] + self._output[self._fail[next_node]]
+                )
+
+        self._built = True
+        return self
+
+    def _step(self, node, char):
+        """Chuyen trang thai theo mot ky tu"""
+        goto = self._goto
+        while node and char not in goto[node]:
+            node = self._fail[node]
+        return goto[node].get(char, 0)
+
+    def _scan(self, text, node, offset, matches):
+        """
+        Duyet text tu trang thai node, them cac match vao list
+
+        Returns:
+            int: Trang thai sau khi doc het text
+        """
+        if not self._built:
+            raise RuntimeError("build() must be called before matching")
+
+        output = self._output
+        keywords = self._keywords
+        payloads = self._payloads
+        for i, char in enumerate(text):
+            node = self._step(node, char)
+            for keyword_id in output[node]:
+                keyword = keywords[keyword_id]
+                end = offset + i + 1
+                matches.append((end - len(keyword), end, keyword, payloads[keyword_id]))
+        return node
+
+    def find_all(self, text):
+        """
+        Tim tat ca keyword xuat hien trong text (ke ca chong lan nhau)
+
+        Args:
+            text (str): Text da normalize
+
+        Returns:
+            list: Danh sach (start, end, keyword, payloads) theo thu tu end
+        """
+        matches = []
+        self._scan(text, 0, 0, matches)
+        return matches
+
+    def find_all_in(self, segments, separator=' '):
+        """
+        Tim keyword trong nhieu doan text nhu the chung duoc noi bang separator,
+        nhung khong can tao chuoi noi.
+
+        Args:
+            segments (iterable): Cac doan text da normalize
+            separator (str): Chuoi noi giua cac doan
+
+        Returns:
+            list: Danh sach (start, end, keyword, payloads); vi tri tinh tren chuoi noi
+        """
+        matches = []
+        node = 0
+        offset = 0
+        for i, segment in enumerate(segments):
+            if i > 0 and separator:
+                node = self._scan(separator, node, offset, matches)
+                offset += len(separator)
+            node = self._scan(segment, node, offset, matches)
+            offset += len(segment)
+        return matches
+
+    def matched_keywords(self, text):
+        """
+        Tap keyword xuat hien trong text
+
+        Args:
+            text (str): Text da normalize
+
+        Returns:
+            set: Cac keyword da match
+        """
+        return {match[2] for match in self.find_all(text)}
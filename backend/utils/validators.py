@@ -2,6 +2,7 @@
 validators.py - Các hàm validation
 """
 
+import hmac
 import re
 
 def is_valid_session_id(session_id):
@@ -38,3 +39,67 @@ def sanitize_input(user_input):
     sanitized = re.sub(r'[<>{}[\]\\]', '', user_input)
 
     return sanitized.strip()
+
+def parse_history_page(args, max_limit):
+    """
+    Đọc tham số phân trang lịch sử (keyset theo turn_number)
+
+    Args:
+        args (dict): Query string (?after=<turn_number>&limit=<n>)
+        max_limit (int): Số turn tối đa mỗi trang
+
+    Returns:
+        tuple: (after_turn, limit) - limit None nếu client không truyền
+
+    Raises:
+        ValueError: Nếu tham số không phải số nguyên hợp lệ
+    """
+    try:
+        after_turn = int(args.get('after', 0))
+        limit = int(args['limit']) if args.get('limit') else None
+    except (TypeError, ValueError):
+        raise ValueError('after and limit must be integers')
+
+    if after_turn < 0:
+        raise ValueError('after must be >= 0')
+    if limit is not None and not 1 <= limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    return after_turn, limit
+
+def is_admin_request(headers, token):
+    """
+    Kiểm tra header X-Admin-Token của request admin
+
+    Args:
+        headers (dict): Header của request
+        token (str): ADMIN_API_TOKEN ('' = admin API bị tắt)
+
+    Returns:
+        bool: True nếu token khớp
+    """
+    if not token:
+        return False
+    supplied = headers.get('X-Admin-Token') or ''
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+def parse_rule_import(args, content_type):
+    """
+    Đọc tham số import rule từ query string và Content-Type
+
+    Args:
+        args (dict): Query string (?table=&mode=replace|append&dryRun=true)
+        content_type (str): Content-Type của body (text/csv hoặc application/json)
+
+    Returns:
+        tuple: (fmt, table, mode, dry_run)
+
+    Raises:
+        ValueError: Nếu tham số không hợp lệ
+    """
+    fmt = 'csv' if 'csv' in (content_type or '').lower() else 'json'
+    table = args.get('table') or None
+    mode = args.get('mode', 'replace')
+    if mode not in ('replace', 'append'):
+        raise ValueError("mode must be 'replace' or 'append'")
+    dry_run = str(args.get('dryRun', '')).lower() in ('1', 'true', 'yes')
+    return fmt, table, mode, dry_run
@@ -1,9 +1,16 @@
 """
-init_db.py - Database Initialization for Medical Triage Chatbot (SQL Server)
-Tables: departments, symptom_rules, red_flags, conversations, quick_reply_rules
+init_db.py - Database Initialization for Medical Triage Chatbot (SQL Server or SQLite)
+Tables: departments, symptom_rules, red_flags, conversations, sessions, quick_reply_rules, rule_versions
+
+    python init_db.py                  # SQL Server (CONNECTION_STRING)
+    python init_db.py --sqlite         # SQLite file database/chatbot.db (DB_BACKEND=sqlite)
+
+--reseed clears conversations that reference departments. To change only the
+rules, use backend/import_rules.py (bulk import, keeps conversations).
 """
 
-import pyodbc
+import os
+import sqlite3
 import sys
 import argparse
 
@@ -18,99 +25,136 @@ CONNECTION_STRING = (
 )
 
 
-def get_connection():
-    """Get database connection."""
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatbot.db')
+
+# Column types and defaults that differ between engines
+DIALECTS = {
+    'sqlserver': {'pk': 'INT PRIMARY KEY IDENTITY(1,1)', 'text': 'NVARCHAR(MAX)', 'now': 'GETDATE()'},
+    'sqlite': {'pk': 'INTEGER PRIMARY KEY AUTOINCREMENT', 'text': 'TEXT', 'now': "(datetime('now', 'localtime'))"},
+}
+DIALECT = 'sqlserver'
+DB_ERROR = Exception
+
+
+def get_connection(sqlite_path=None):
+    """Get database connection (SQLite when sqlite_path is given)."""
+    global DIALECT, DB_ERROR
+    if sqlite_path:
+        DIALECT, DB_ERROR = 'sqlite', sqlite3.Error
+        conn = sqlite3.connect(sqlite_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    import pyodbc
+    DIALECT, DB_ERROR = 'sqlserver', pyodbc.Error
     conn = pyodbc.connect(CONNECTION_STRING)
     conn.autocommit = False
     return conn
 
 
+def create_table(cursor, table_name, columns):
+    """Create a table if it does not exist ({pk}, {text}, {now} follow the dialect)."""
+    columns = columns.format(**DIALECTS[DIALECT])
+    if DIALECT == 'sqlite':
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns})")
+    else:
+        cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{table_name}' AND xtype='U')
+        CREATE TABLE {table_name} ({columns})
+        """)
+
+
+def reset_identity(cursor, table_name):
+    """Restart the identity column of a table at 1."""
+    if DIALECT == 'sqlite':
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
+    else:
+        cursor.execute(f"DBCC CHECKIDENT ('{table_name}', RESEED, 0)")
+
+
+def insert_many(cursor, query, rows):
+    """Insert all rows with one executemany (bulk parameter arrays on SQL Server)."""
+    if DIALECT == 'sqlserver':
+        cursor.fast_executemany = True
+    cursor.executemany(query, rows)
+
+
 def create_departments_table(cursor):
     """Create departments table."""
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='departments' AND xtype='U')
-        CREATE TABLE departments (
-            id INT PRIMARY KEY IDENTITY(1,1),
+    create_table(cursor, 'departments', """
+            id {pk},
             name_vi NVARCHAR(200) NOT NULL,
             name_en NVARCHAR(200),
             room_number NVARCHAR(50) NOT NULL,
             floor NVARCHAR(50),
             building NVARCHAR(100),
             doctor_name NVARCHAR(200),
-            description NVARCHAR(MAX),
+            description {text},
             working_hours NVARCHAR(200),
             is_active BIT DEFAULT 1,
-            created_at DATETIME DEFAULT GETDATE(),
-            updated_at DATETIME DEFAULT GETDATE()
-        )
+            created_at DATETIME DEFAULT {now},
+            updated_at DATETIME DEFAULT {now}
     """)
     print("  [OK] Table 'departments' created")
 
 
 def create_symptom_rules_table(cursor):
     """Create symptom_rules table for symptom-to-department mapping."""
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='symptom_rules' AND xtype='U')
-        CREATE TABLE symptom_rules (
-            id INT PRIMARY KEY IDENTITY(1,1),
+    create_table(cursor, 'symptom_rules', """
+            id {pk},
             rule_name NVARCHAR(200) NOT NULL,
             department_id INT NOT NULL,
-            symptom_keywords NVARCHAR(MAX) NOT NULL,
+            symptom_keywords {text} NOT NULL,
             priority INT DEFAULT 5,
             min_symptoms_match INT DEFAULT 1,
             esi_level_default INT DEFAULT 4,
-            follow_up_questions NVARCHAR(MAX),
-            additional_notes NVARCHAR(MAX),
+            follow_up_questions {text},
+            additional_notes {text},
             is_active BIT DEFAULT 1,
-            created_at DATETIME DEFAULT GETDATE(),
-            updated_at DATETIME DEFAULT GETDATE(),
+            created_at DATETIME DEFAULT {now},
+            updated_at DATETIME DEFAULT {now},
             FOREIGN KEY (department_id) REFERENCES departments(id)
-        )
     """)
     print("  [OK] Table 'symptom_rules' created")
 
 
 def create_red_flags_table(cursor):
     """Create red_flags table for critical/emergency symptoms."""
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='red_flags' AND xtype='U')
-        CREATE TABLE red_flags (
-            id INT PRIMARY KEY IDENTITY(1,1),
+    create_table(cursor, 'red_flags', """
+            id {pk},
             flag_name NVARCHAR(200) NOT NULL,
-            symptom_pattern NVARCHAR(MAX) NOT NULL,
+            symptom_pattern {text} NOT NULL,
             esi_level INT NOT NULL CHECK(esi_level IN (1, 2)),
             action NVARCHAR(100) NOT NULL,
-            warning_message NVARCHAR(MAX) NOT NULL,
+            warning_message {text} NOT NULL,
             recommended_department NVARCHAR(200),
-            age_constraint NVARCHAR(MAX),
-            description NVARCHAR(MAX),
+            age_constraint {text},
+            description {text},
             is_active BIT DEFAULT 1,
-            created_at DATETIME DEFAULT GETDATE(),
-            updated_at DATETIME DEFAULT GETDATE()
-        )
+            created_at DATETIME DEFAULT {now},
+            updated_at DATETIME DEFAULT {now}
     """)
     print("  [OK] Table 'red_flags' created")
 
 
 def create_conversations_table(cursor):
     """Create conversations table for chat history."""
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversations' AND xtype='U')
-        CREATE TABLE conversations (
-            id INT PRIMARY KEY IDENTITY(1,1),
+    create_table(cursor, 'conversations', """
+            id {pk},
             session_id NVARCHAR(100) NOT NULL,
             turn_number INT NOT NULL,
-            user_message NVARCHAR(MAX),
-            bot_response NVARCHAR(MAX),
-            extracted_symptoms NVARCHAR(MAX),
+            user_message {text},
+            bot_response {text},
+            extracted_symptoms {text},
             current_esi_level INT,
-            matched_red_flags NVARCHAR(MAX),
+            matched_red_flags {text},
             recommended_department_id INT,
             conversation_status NVARCHAR(50) DEFAULT 'in_progress',
             patient_age INT,
             patient_gender NVARCHAR(20),
-            timestamp DATETIME DEFAULT GETDATE(),
-            created_at DATETIME DEFAULT GETDATE(),
+            timestamp DATETIME DEFAULT {now},
+            created_at DATETIME DEFAULT {now},
             
             -- New columns for scoring system
             current_score FLOAT DEFAULT 0,
@@ -123,34 +167,70 @@ def create_conversations_table(cursor):
             last_question_type NVARCHAR(50),
             
             FOREIGN KEY (recommended_department_id) REFERENCES departments(id)
-        )
     """)
     print("  [OK] Table 'conversations' created")
 
 
+def create_sessions_table(cursor):
+    """Create sessions table: one row per session with the current patient state."""
+    create_table(cursor, 'sessions', """
+            session_id NVARCHAR(100) PRIMARY KEY,
+            turn_count INT NOT NULL DEFAULT 0,
+            extracted_symptoms {text},
+            patient_age INT,
+            patient_gender NVARCHAR(20),
+            collected_duration NVARCHAR(100),
+            collected_severity INT,
+            is_pregnant BIT DEFAULT 0,
+            is_pediatric BIT DEFAULT 0,
+            is_severe BIT DEFAULT 0,
+            current_score FLOAT DEFAULT 0,
+            current_esi_level INT,
+            recommended_department_id INT,
+            conversation_status NVARCHAR(50) DEFAULT 'in_progress',
+            last_question_type NVARCHAR(50),
+            created_at DATETIME DEFAULT {now},
+            updated_at DATETIME DEFAULT {now},
+
+            FOREIGN KEY (recommended_department_id) REFERENCES departments(id)
+    """)
+    print("  [OK] Table 'sessions' created")
+
+
 def create_quick_reply_rules_table(cursor):
     """Create quick_reply_rules table for dynamic quick replies."""
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='quick_reply_rules' AND xtype='U')
-        CREATE TABLE quick_reply_rules (
-            id INT PRIMARY KEY IDENTITY(1,1),
+    create_table(cursor, 'quick_reply_rules', """
+            id {pk},
             trigger_type NVARCHAR(50) NOT NULL,
             trigger_value NVARCHAR(100) NOT NULL,
-            replies_json NVARCHAR(MAX) NOT NULL,
+            replies_json {text} NOT NULL,
             priority INT DEFAULT 5,
             is_active BIT DEFAULT 1,
-            created_at DATETIME DEFAULT GETDATE()
-        )
+            created_at DATETIME DEFAULT {now}
     """)
     print("  [OK] Table 'quick_reply_rules' created")
 
 
+def create_rule_versions_table(cursor):
+    """Create rule_versions table (one row per rule import, id = rule version)."""
+    create_table(cursor, 'rule_versions', """
+            id {pk},
+            tables NVARCHAR(200) NOT NULL,
+            row_count INT NOT NULL,
+            mode NVARCHAR(20) NOT NULL,
+            source NVARCHAR(200),
+            imported_at DATETIME DEFAULT {now}
+    """)
+    print("  [OK] Table 'rule_versions' created")
+
+
 def create_indexes(cursor):
     """Create indexes for performance optimization."""
     indexes = [
         ("idx_conversations_session", "conversations", "session_id, turn_number"),
         ("idx_conversations_timestamp", "conversations", "timestamp"),
         ("idx_conversations_status", "conversations", "conversation_status"),
+        ("idx_sessions_status", "sessions", "conversation_status, updated_at"),
         ("idx_symptom_rules_department", "symptom_rules", "department_id"),
         ("idx_symptom_rules_priority", "symptom_rules", "priority DESC"),
         ("idx_quick_reply_trigger", "quick_reply_rules", "trigger_type, trigger_value, is_active"),
@@ -158,12 +238,15 @@ def create_indexes(cursor):
     
     for index_name, table_name, columns in indexes:
         try:
-            cursor.execute(f"""
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{index_name}')
-                CREATE INDEX {index_name} ON {table_name}({columns})
-            """)
+            if DIALECT == 'sqlite':
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({columns})")
+            else:
+                cursor.execute(f"""
+                    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{index_name}')
+                    CREATE INDEX {index_name} ON {table_name}({columns})
+                """)
             print(f"  [OK] Index '{index_name}' created")
-        except pyodbc.Error as e:
+        except DB_ERROR as e:
             print(f"  [WARN] Index '{index_name}': {e}")
 
 
@@ -173,9 +256,10 @@ def seed_departments(cursor, force_reseed=False):
         # Delete child records first (FK constraint)
         cursor.execute("DELETE FROM symptom_rules")
         cursor.execute("DELETE FROM conversations WHERE recommended_department_id IS NOT NULL")
+        cursor.execute("DELETE FROM sessions WHERE recommended_department_id IS NOT NULL")
         cursor.execute("DELETE FROM departments")
         # Reset identity to start from 1
-        cursor.execute("DBCC CHECKIDENT ('departments', RESEED, 0)")
+        reset_identity(cursor, 'departments')
         print("  [OK] Cleared existing departments data")
     else:
         # Check if data already exists
@@ -190,11 +274,10 @@ def seed_departments(cursor, force_reseed=False):
         ("Khoa Nhi", "Pediatrics Department", "P303", "3", "C", "BS. L. Messi", "Kham va dieu tri benh cho tre em duoi 15 tuoi", "7:00 - 17:00"),
     ]
     
-    for dept in departments:
-        cursor.execute("""
+    insert_many(cursor, """
             INSERT INTO departments (name_vi, name_en, room_number, floor, building, doctor_name, description, working_hours)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, dept)
+        """, departments)
     
     print(f"  [OK] Inserted {len(departments)} departments")
 
@@ -203,7 +286,7 @@ def seed_symptom_rules(cursor, force_reseed=False):
     """Insert symptom rules for 3 departments."""
     if force_reseed:
         cursor.execute("DELETE FROM symptom_rules")
-        cursor.execute("DBCC CHECKIDENT ('symptom_rules', RESEED, 0)")
+        reset_identity(cursor, 'symptom_rules')
         print("  [OK] Cleared existing symptom_rules data")
     else:
         cursor.execute("SELECT COUNT(*) FROM symptom_rules")
@@ -246,11 +329,10 @@ def seed_symptom_rules(cursor, force_reseed=False):
          '["Be may tuoi?", "Da bo an/bu bao lau?", "Co sot hoac tieu chay kem khong?"]'),
     ]
     
-    for rule in rules:
-        cursor.execute("""
+    insert_many(cursor, """
             INSERT INTO symptom_rules (rule_name, department_id, symptom_keywords, priority, min_symptoms_match, esi_level_default, follow_up_questions)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, rule)
+        """, rules)
     
     print(f"  [OK] Inserted {len(rules)} symptom rules")
 
@@ -259,7 +341,7 @@ def seed_red_flags(cursor, force_reseed=False):
     """Insert critical red flag patterns for emergencies."""
     if force_reseed:
         cursor.execute("DELETE FROM red_flags")
-        cursor.execute("DBCC CHECKIDENT ('red_flags', RESEED, 0)")
+        reset_identity(cursor, 'red_flags')
         print("  [OK] Cleared existing red_flags data")
     else:
         cursor.execute("SELECT COUNT(*) FROM red_flags")
@@ -300,11 +382,10 @@ def seed_red_flags(cursor, force_reseed=False):
          "Cap cuu", None, "Sung hong/kho tho - nguy co tac duong tho"),
     ]
     
-    for flag in red_flags:
-        cursor.execute("""
+    insert_many(cursor, """
             INSERT INTO red_flags (flag_name, symptom_pattern, esi_level, action, warning_message, recommended_department, age_constraint, description)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, flag)
+        """, red_flags)
     
     print(f"  [OK] Inserted {len(red_flags)} red flags")
 
@@ -313,7 +394,7 @@ def seed_quick_reply_rules(cursor, force_reseed=False):
     """Insert quick reply rules for dynamic quick replies."""
     if force_reseed:
         cursor.execute("DELETE FROM quick_reply_rules")
-        cursor.execute("DBCC CHECKIDENT ('quick_reply_rules', RESEED, 0)")
+        reset_identity(cursor, 'quick_reply_rules')
         print("  [OK] Cleared existing quick_reply_rules data")
     else:
         cursor.execute("SELECT COUNT(*) FROM quick_reply_rules")
@@ -343,21 +424,26 @@ def seed_quick_reply_rules(cursor, force_reseed=False):
         ('default', 'initial', '[{"id": "init_1", "label": "Tai Mui Hong", "value": "Toi bi van de ve tai, mui hoac hong"}, {"id": "init_2", "label": "San Phu Khoa", "value": "Toi co van de phu khoa hoac mang thai"}, {"id": "init_3", "label": "Benh tre em", "value": "Con toi bi benh, can kham Nhi khoa"}, {"id": "init_4", "label": "Khac", "value": "Toi co trieu chung khac"}]', 1),
     ]
     
-    for rule in rules:
-        cursor.execute("""
+    insert_many(cursor, """
             INSERT INTO quick_reply_rules (trigger_type, trigger_value, replies_json, priority)
             VALUES (?, ?, ?, ?)
-        """, rule)
+        """, rules)
     
     print(f"  [OK] Inserted {len(rules)} quick reply rules")
 
 
 def verify_tables(cursor):
     """Verify all tables and show row counts."""
-    cursor.execute("""
-        SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
-        WHERE TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME
-    """)
+    if DIALECT == 'sqlite':
+        cursor.execute("""
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name
+        """)
+    else:
+        cursor.execute("""
+            SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME
+        """)
     tables = cursor.fetchall()
     print("\n" + "=" * 50)
     print("DATABASE TABLES:")
@@ -371,6 +457,8 @@ def main():
     """Initialize database. Use --reseed to clear and re-insert data."""
     parser = argparse.ArgumentParser(description='Initialize Medical Triage Database')
     parser.add_argument('--reseed', action='store_true', help='Force reseed data')
+    parser.add_argument('--sqlite', nargs='?', const=DEFAULT_SQLITE_PATH, metavar='PATH',
+                        help=f'Use a SQLite file instead of SQL Server (default: {DEFAULT_SQLITE_PATH})')
     args = parser.parse_args()
 
     print("\n" + "=" * 50)
@@ -380,7 +468,7 @@ def main():
     conn = None
     try:
         print("\n[1] Connecting...")
-        conn = get_connection()
+        conn = get_connection(args.sqlite)
         cursor = conn.cursor()
         print("  [OK] Connected")
 
@@ -389,7 +477,9 @@ def main():
         create_symptom_rules_table(cursor)
         create_red_flags_table(cursor)
         create_conversations_table(cursor)
+        create_sessions_table(cursor)
         create_quick_reply_rules_table(cursor)
+        create_rule_versions_table(cursor)
 
         print("\n[3] Creating indexes...")
         create_indexes(cursor)